@@ -1,27 +1,48 @@
-from PySide6.QtCore import Qt
+import importlib
+
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtWidgets import *
 
-from app.utils.logger import log
-from app.ui.home import HomePage
-from app.ui.stats import StatsPage
-from app.ui.annotate import AnnotatePage
-from app.ui.projects import ProjectsPage
-from app.ui.settings import SettingsPage
+from app.utils.logger import debug, log
+from app.utils.meta_store import open_meta_store
+from app.utils.repository import ProjectRepository
+from app.utils.theme import ThemeManager
+from app.utils.tracing import instant, span, traced
+
+
+PAGES = {
+    "home": ("app.ui.home", "HomePage", ()),
+    "projects": ("app.ui.projects", "ProjectsPage", ("repository",)),
+    "markup": ("app.ui.annotate", "AnnotatePage", ("repository",)),
+    "stats": ("app.ui.stats", "StatsPage", ("repository",)),
+    "settings": ("app.ui.settings", "SettingsPage", ("theme",))
+}
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, theme=None):
         super().__init__()
         log("INIT", "Initializing MainWindow")
         self.setWindowTitle("DeepTag")
 
+        self.theme = theme if theme is not None else ThemeManager(parent=self)
         self.stacked_widget = QStackedWidget()
+        self.repository = ProjectRepository(open_meta_store(), parent=self)
         self.pages = {}
         self.nav_buttons = {}
+        self._painted = False
 
         self.setup_ui()
+        QTimer.singleShot(0, self.start_background_services)
         log("INIT", "MainWindow initialization completed")
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            instant("first_paint", "startup")
+
+    @traced("MainWindow.setup_ui", "startup")
     def setup_ui(self):
         log("UI", "Starting main UI setup")
         main_widget = QWidget()
@@ -68,7 +89,7 @@ class MainWindow(QMainWindow):
 
             self.nav_buttons[page_id] = btn
             nav_layout.addWidget(btn)
-            log("UI", f"Added button: {text} (ID: {page_id})")
+            debug("UI", "Added button: %s (ID: %s)", text, page_id)
 
         if "settings" in self.nav_buttons:
             nav_layout.insertStretch(nav_layout.count() - 1, 1)
@@ -78,35 +99,43 @@ class MainWindow(QMainWindow):
         return nav_bar
 
     def setup_pages(self):
-        log("PAGES", "Initializing application pages")
-        self.pages = {
-            "home": HomePage(),
-            "projects": ProjectsPage(),
-            "markup": AnnotatePage(),
-            "stats": StatsPage(),
-            "settings": SettingsPage()
-        }
-
-        for page_id, page in self.pages.items():
-            self.stacked_widget.addWidget(page)
-            log("PAGES", f"Added page to stack: {page_id} ({type(page).__name__})")
-
+        log("PAGES", f"Registered {len(PAGES)} pages, constructing on first use")
         self.switch_page("home")
         log("NAV", "Initial page set to: home")
 
+    def start_background_services(self):
+        from app.utils.watcher import ChangeTracker
+
+        with span("start_background_services", "startup"):
+            self.repository.attach_tracker(ChangeTracker(parent=self))
+            self.repository.preload()
+        log("INIT", "Background services started")
+
+    def get_page(self, page_id):
+        page = self.pages.get(page_id)
+        if page is None:
+            module_name, class_name, dependencies = PAGES[page_id]
+            with span("page.create", "ui", page=page_id):
+                page_class = getattr(importlib.import_module(module_name), class_name)
+                page = page_class(*(getattr(self, name) for name in dependencies))
+
+            self.pages[page_id] = page
+            self.stacked_widget.addWidget(page)
+            debug("PAGES", "Created page on demand: %s (%s)", page_id, class_name)
+        return page
+
     def switch_page(self, page_id):
         old_page = self.stacked_widget.currentWidget()
-        old_page_name = type(old_page).__name__ if old_page else "None"
-
-        log("NAV", f"Switching page from {old_page_name} to {page_id}")
-        self.stacked_widget.setCurrentWidget(self.pages[page_id])
+        debug("NAV", "Switching page from %s to %s", type(old_page).__name__ if old_page else "None", page_id)
+        with span("page.switch", "action", page=page_id):
+            page = self.get_page(page_id)
+            self.stacked_widget.setCurrentWidget(page)
 
         for btn_id, btn in self.nav_buttons.items():
             prev_state = btn.isChecked()
             new_state = btn_id == page_id
             btn.setChecked(new_state)
             if prev_state != new_state:
-                log("NAV", f"Button {btn_id} state changed: {prev_state} → {new_state}")
+                debug("NAV", "Button %s state changed: %s → %s", btn_id, prev_state, new_state)
 
-        current_page = type(self.pages[page_id]).__name__
-        log("NAV", f"Navigation completed. Current page: {current_page}")
+        log("NAV", "Navigation completed. Current page: %s", type(page).__name__)
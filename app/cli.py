@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import argparse
+import threading
+
+from app.utils import logger
+from app.utils.annotations import AnnotationStore
+from app.utils.exporter import EXPORT_FORMATS, EXPORT_IMAGE_MODES, EXPORT_WORKERS, YOLO_NEEDS_IMAGES, ExportJob
+from app.utils.image_index import ImageIndex
+from app.utils.importer import IMPORT_MODES, IMPORT_WORKERS, ImportJob, archive_name
+from app.utils.meta_store import DATA_DIR, open_meta_store
+from app.utils.phash import (DUPLICATE_DISTANCE, HASH_METHOD, HASH_METHODS, HASH_WORKERS, DuplicateJob,
+                             duplicates_to_drop, hashing_available, move_duplicates)
+from app.utils.stats import SubprojectStats, annotation_stamp, merge_snapshots
+from app.utils.workspace import Workspace
+
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_CANCELLED = 130
+
+
+class CommandError(Exception):
+    pass
+
+
+def _workspace(args) -> Workspace:
+    return Workspace(open_meta_store(args.data))
+
+
+def _subproject(workspace, project_name, subproject_name) -> str:
+    if workspace.project(project_name) is None:
+        raise CommandError(f"Project {project_name} does not exist")
+    path = workspace.subproject_path(project_name, subproject_name)
+    if not any(sub['name'] == subproject_name and sub['exists'] for sub in workspace.subprojects(project_name)):
+        raise CommandError(f"Subproject {project_name}/{subproject_name} does not exist")
+    return path
+
+
+def _progress(args, label):
+    if args.quiet or not sys.stderr.isatty():
+        return None
+
+    def report(stage, done, total, nbytes):
+        counts = f" {done}/{total}" if total else ""
+        sys.stderr.write(f"\r{label}: {stage}{counts} ({nbytes / (1024 * 1024):.1f} MB)\033[K")
+        sys.stderr.flush()
+    return report
+
+
+def _run_job(job, progress):
+    # Jobs run on a worker thread so Ctrl+C can cancel them cleanly.
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(summary=job.run(progress)), name="job")
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.2)
+    except KeyboardInterrupt:
+        job.cancel()
+        sys.stderr.write("\nCancelling...\n")
+        thread.join()
+    if progress is not None:
+        sys.stderr.write("\n")
+    if 'summary' not in result:
+        raise CommandError("Job failed, see the log for details")
+    return result['summary']
+
+
+def _print_table(rows, headers):
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for row in [headers, *rows]:
+        print("  ".join(str(value).rjust(width) if isinstance(value, int) else str(value).ljust(width)
+                        for value, width in zip(row, widths)).rstrip())
+
+
+def command_list(args):
+    workspace = _workspace(args)
+    if args.project is None:
+        _print_table([(project['name'], len(project['subprojects'])) for project in workspace.projects()],
+                     ("PROJECT", "SUBPROJECTS"))
+        return EXIT_OK
+
+    if workspace.project(args.project) is None:
+        raise CommandError(f"Project {args.project} does not exist")
+    rows = []
+    for subproject in workspace.subprojects(args.project):
+        classes = workspace.classes(args.project, subproject['name'])
+        rows.append((subproject['name'], len(classes), ", ".join(classes) if subproject['exists'] else "(missing)"))
+    _print_table(rows, ("SUBPROJECT", "CLASSES", "NAMES"))
+    return EXIT_OK
+
+
+def command_create(args):
+    workspace = _workspace(args)
+    if workspace.project(args.project) is None:
+        workspace.create_project(args.project)
+        print(f"Created project {args.project}")
+    if args.subproject is None:
+        if args.classes:
+            raise CommandError("Classes belong to a subproject, pass its name")
+        return EXIT_OK
+
+    if args.subproject not in workspace.project(args.project)['subprojects']:
+        workspace.create_subproject(args.project, args.subproject)
+        print(f"Created subproject {args.project}/{args.subproject}")
+    existing = workspace.classes(args.project, args.subproject)
+    for class_name in args.classes:
+        if class_name not in existing:
+            workspace.add_class(args.project, args.subproject, class_name)
+            existing.append(class_name)
+    return EXIT_OK
+
+
+def command_import(args):
+    workspace = _workspace(args)
+    path = _subproject(workspace, args.project, args.subproject)
+    status = EXIT_OK
+    for source in args.sources:
+        if not os.path.isdir(source) and archive_name(source) is None:
+            raise CommandError(f"{source} is not a folder or a zip/tar archive")
+        job = ImportJob(source, os.path.join(path, 'images'), args.mode, args.workers, subproject_path=path,
+                        data_dir=args.data)
+        summary = _run_job(job, _progress(args, os.path.basename(os.path.normpath(source))))
+        if summary['cancelled']:
+            print(f"{source}: cancelled, no images were added")
+            return EXIT_CANCELLED
+
+        print(f"{source}: added {summary['copied']} of {summary['total']} images "
+              f"({summary['bytes'] / (1024 * 1024):.1f} MB) to {summary['dest_folder']} in {summary['seconds']:.1f}s")
+        for failed, error in summary['failed']:
+            print(f"  failed {failed}: {error}", file=sys.stderr)
+            status = EXIT_ERROR
+    return status
+
+
+def _snapshot(path, classes):
+    stats = SubprojectStats(path)
+    try:
+        if not stats.is_current():
+            stamp = annotation_stamp(stats.annotations_path)
+            annotations = AnnotationStore(path)
+            try:
+                stats.rebuild(annotations, stamp)
+            finally:
+                annotations.close()
+        return stats.snapshot(classes)
+    finally:
+        stats.close()
+
+
+def command_stats(args):
+    workspace = _workspace(args)
+    if args.subproject is not None:
+        subprojects = [args.subproject]
+        _subproject(workspace, args.project, args.subproject)
+    else:
+        if workspace.project(args.project) is None:
+            raise CommandError(f"Project {args.project} does not exist")
+        subprojects = [sub['name'] for sub in workspace.subprojects(args.project) if sub['exists']]
+
+    snapshot = merge_snapshots([(name, _snapshot(workspace.subproject_path(args.project, name),
+                                                 workspace.classes(args.project, name)))
+                                for name in subprojects])
+    if args.json:
+        snapshot.pop('current')
+        json.dump(snapshot, sys.stdout, indent=2)
+        print()
+        return EXIT_OK
+
+    pending = max(0, snapshot['images'] - snapshot['annotated'])
+    print(f"{snapshot['images']} images, {snapshot['annotated']} annotated, {pending} pending, "
+          f"{snapshot['boxes']} boxes\n")
+    _print_table([(folder, images, annotated, max(0, images - annotated), boxes)
+                  for folder, images, annotated, boxes in snapshot['folders']],
+                 ("FOLDER", "IMAGES", "ANNOTATED", "PENDING", "BOXES"))
+    print()
+    _print_table([(name, instances, images) for name, (instances, images) in snapshot['classes'].items()],
+                 ("CLASS", "INSTANCES", "IMAGES"))
+    return EXIT_OK
+
+
+def _ratios(value):
+    try:
+        ratios = tuple(float(part) for part in value.replace(" ", "").split("/"))
+    except ValueError:
+        ratios = ()
+    if len(ratios) != 3 or sum(ratios) <= 0 or min(ratios) < 0:
+        raise argparse.ArgumentTypeError(f"expected train/val/test ratios such as 80/10/10, got {value}")
+    return ratios
+
+
+def command_export(args):
+    workspace = _workspace(args)
+    path = _subproject(workspace, args.project, args.subproject)
+    if args.format == 'yolo' and args.images == 'none':
+        raise CommandError(YOLO_NEEDS_IMAGES)
+    job = ExportJob(path, workspace.classes(args.project, args.subproject), args.output, args.format, args.images,
+                    args.workers, ratios=args.split, seed=args.seed, group_by_folder=not args.no_group)
+    summary = _run_job(job, _progress(args, f"{args.project}/{args.subproject}"))
+    if summary['cancelled']:
+        print("Export cancelled, partial output was removed")
+        return EXIT_CANCELLED
+    if not summary['total']:
+        raise CommandError("This subproject has no images to export")
+
+    print(f"Exported {summary['exported']} images and {summary['boxes']} boxes to {summary['dest_folder']} "
+          f"in {summary['seconds']:.1f}s")
+    if summary['splits']:
+        print(", ".join(f"{name}: {count}" for name, count in summary['splits'].items()))
+    for failed, error in summary['failed']:
+        print(f"  failed {failed}: {error}", file=sys.stderr)
+    return EXIT_ERROR if summary['failed'] else EXIT_OK
+
+
+def command_duplicates(args):
+    if not hashing_available():
+        raise CommandError("Decoding images for hashing requires PySide6")
+    workspace = _workspace(args)
+    path = _subproject(workspace, args.project, args.subproject)
+    job = DuplicateJob(path, args.method, args.distance, args.workers)
+    summary = _run_job(job, _progress(args, f"{args.project}/{args.subproject}"))
+    if summary['cancelled']:
+        print("Cancelled, hashes computed so far were kept")
+        return EXIT_CANCELLED
+
+    print(f"Hashed {summary['hashed']} of {summary['total']} new images in {summary['seconds']:.1f}s, "
+          f"found {summary['groups']} groups with {summary['duplicates']} near-duplicates")
+    for failed, error in summary['failed']:
+        print(f"  failed {failed}: {error}", file=sys.stderr)
+
+    index = ImageIndex(path)
+    try:
+        groups = index.duplicate_groups()
+    finally:
+        index.close()
+    annotations = AnnotationStore(path)
+    try:
+        drop = duplicates_to_drop(groups, set(annotations.images()))
+    finally:
+        annotations.close()
+
+    if args.list:
+        for number, group in enumerate(groups, 1):
+            print(f"group {number}:")
+            for image in group:
+                print(f"  {'drop' if image in drop else 'keep'}  {'/'.join(image)}")
+    if args.drop and drop:
+        moved, failed = move_duplicates(path, sorted(drop))
+        print(f"Moved {moved} near-duplicates to {os.path.join(path, 'duplicates')}")
+        for failed_path, error in failed:
+            print(f"  failed {failed_path}: {error}", file=sys.stderr)
+        if failed:
+            return EXIT_ERROR
+    return EXIT_ERROR if summary['failed'] else EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app", description="DeepTag command line tools")
+    parser.add_argument("--data", default=DATA_DIR, help="data directory (default: data)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print log messages")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not show progress")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("list", help="list projects, or the subprojects of a project")
+    command.add_argument("project", nargs="?")
+    command.set_defaults(handler=command_list)
+
+    command = commands.add_parser("create", help="create a project, subproject and classes if missing")
+    command.add_argument("project")
+    command.add_argument("subproject", nargs="?")
+    command.add_argument("--classes", nargs="+", default=[], metavar="CLASS")
+    command.set_defaults(handler=command_create)
+
+    command = commands.add_parser("import", help="import image folders or zip/tar archives into a subproject")
+    command.add_argument("project")
+    command.add_argument("subproject")
+    command.add_argument("sources", nargs="+", metavar="SOURCE")
+    command.add_argument("--mode", choices=list(IMPORT_MODES), default='copy')
+    command.add_argument("--workers", type=int, default=IMPORT_WORKERS)
+    command.set_defaults(handler=command_import)
+
+    command = commands.add_parser("stats", help="show statistics of a project or subproject")
+    command.add_argument("project")
+    command.add_argument("subproject", nargs="?")
+    command.add_argument("--json", action="store_true", help="print machine readable JSON")
+    command.set_defaults(handler=command_stats)
+
+    command = commands.add_parser("export", help="export a subproject as a training dataset")
+    command.add_argument("project")
+    command.add_argument("subproject")
+    command.add_argument("output", help="folder the dataset folder is created in")
+    command.add_argument("--format", choices=list(EXPORT_FORMATS), default='yolo')
+    command.add_argument("--images", choices=list(EXPORT_IMAGE_MODES), default='link')
+    command.add_argument("--split", type=_ratios, default=None, metavar="TRAIN/VAL/TEST",
+                         help="assign train/val/test splits, e.g. 80/10/10")
+    command.add_argument("--seed", type=int, default=0)
+    command.add_argument("--no-group", action="store_true", help="split images of a folder independently")
+    command.add_argument("--workers", type=int, default=EXPORT_WORKERS)
+    command.set_defaults(handler=command_export)
+
+    command = commands.add_parser("duplicates", help="find near-duplicate images in a subproject")
+    command.add_argument("project")
+    command.add_argument("subproject")
+    command.add_argument("--method", choices=list(HASH_METHODS), default=HASH_METHOD)
+    command.add_argument("--distance", type=int, default=DUPLICATE_DISTANCE,
+                         help=f"maximum differing hash bits (default: {DUPLICATE_DISTANCE})")
+    command.add_argument("--workers", type=int, default=HASH_WORKERS)
+    command.add_argument("--list", action="store_true", help="print every group")
+    command.add_argument("--drop", action="store_true",
+                         help="move all but one image of each group, never annotated ones, to duplicates/")
+    command.set_defaults(handler=command_duplicates)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.verbose:
+        logger.set_level(logger.WARNING)
+    try:
+        return args.handler(args)
+    except CommandError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        logger.flush()
@@ -1,8 +1,21 @@
 import sys
-from PySide6.QtWidgets import QApplication
 
-from app.build import MainWindow
+from app.utils import tracing
+from app.utils.tracing import span
+
+# --trace[=PATH] works like DEEPTAG_TRACE and is not passed on to Qt.
+qt_args = []
+for arg in sys.argv:
+    if arg == "--trace" or arg.startswith("--trace="):
+        tracing.enable(arg.partition("=")[2] or None)
+    else:
+        qt_args.append(arg)
+
+with span("import app.build", "startup"):
+    from PySide6.QtWidgets import QApplication
+    from app.build import MainWindow
 from app.utils.logger import log
+from app.utils.theme import ThemeManager
 
 
 if __name__ == "__main__":
@@ -12,27 +25,27 @@ if __name__ == "__main__":
         log("ENV", f"Executable path: {sys.executable}")
 
         log("QT", "Creating QApplication instance")
-        app = QApplication(sys.argv)
+        with span("QApplication", "startup"):
+            app = QApplication(qt_args)
 
+        theme = ThemeManager(app)
         try:
-            style_path = "app/styles/style.css"
-            log("STYLE", f"Loading styles from: {style_path}")
-            with open(style_path, "r") as f:
-                styles = f.read()
-                app.setStyleSheet(styles)
-                log("STYLE", f"Successfully loaded {len(styles)} characters of CSS")
-        except FileNotFoundError:
-            log("ERROR", f"Stylesheet not found: {style_path}")
+            with span("load_stylesheet", "startup"):
+                theme.apply()
+        except FileNotFoundError as e:
+            log("ERROR", f"Stylesheet not found: {e.filename}")
         except Exception as e:
             log("ERROR", f"Error loading stylesheet: {str(e)}")
 
         try:
             log("WINDOW", "Creating MainWindow instance")
-            window = MainWindow()
+            with span("MainWindow", "startup"):
+                window = MainWindow(theme)
             log("WINDOW", "MainWindow created successfully")
 
             log("WINDOW", "Showing window maximized")
-            window.showMaximized()
+            with span("showMaximized", "startup"):
+                window.showMaximized()
             log("UI", "Window displayed in maximized state")
         except Exception as e:
             log("ERROR", f"Failed to create main window: {str(e)}")
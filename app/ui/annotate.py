@@ -1,15 +1,26 @@
 import os
-import json
-import shutil
+import time
+from collections import OrderedDict
 
 from PySide6.QtGui import *
 from PySide6.QtCore import *
 from PySide6.QtWidgets import *
 
+from app.ui.canvas import ImageCanvas
+from app.utils.annotations import AnnotationStore
 from app.utils.logger import log
-
-
-IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']
+from app.utils.prefetch import Prefetcher
+from app.utils.exporter import EXPORT_FORMATS, EXPORT_IMAGE_MODES, YOLO_NEEDS_IMAGES, ExportJob
+from app.utils.importer import ARCHIVE_EXTENSIONS, IMPORT_MODES, ImportJob
+from app.utils.image_index import ImageIndex
+from app.utils.imageinfo import oriented_size
+from app.utils.phash import DuplicateJob, duplicates_to_drop, hashing_available, move_duplicates
+from app.utils.repository import ProjectRepository
+from app.utils.splits import SPLIT_PRESETS
+from app.utils.theme import set_state
+from app.utils.tracing import instant, span
+from app.utils.thumbnails import THUMBNAIL_MEMORY_BUDGET, THUMBNAIL_SIZE, ThumbnailCache, ThumbnailLoader
+from app.utils.tiles import OVERVIEW_CACHE_DIR
 
 
 class ClickableFrame(QFrame):
@@ -18,126 +29,298 @@ class ClickableFrame(QFrame):
     def __init__(self, folder_name, parent=None):
         super().__init__(parent)
         self.folder_name = folder_name
-        self.setStyleSheet("""
-            QFrame {
-                background: #F8F9FA;
-                border-radius: 6px;
-                border: 1px solid #DEE2E6;
-                margin: 4px;
-            }
-        """)
+        self.setObjectName("folderBlock")
+        self.setProperty("selected", False)
 
     def mousePressEvent(self, event):
         self.clicked.emit(self.folder_name)
 
-    def enterEvent(self, event):
-        self.setStyleSheet("""
-            QFrame {
-                background: #E9ECEF;
-                border-radius: 6px;
-                border: 1px solid #CED4DA;
-                margin: 4px;
-            }
-        """)
-
-    def leaveEvent(self, event):
-        self.setStyleSheet("""
-            QFrame {
-                background: #F8F9FA;
-                border-radius: 6px;
-                border: 1px solid #DEE2E6;
-                margin: 4px;
-            }
-        """)
-
-
-class QFlowLayout(QLayout):
-    def __init__(self, parent=None):
+
+class ThumbnailModel(QAbstractListModel):
+    def __init__(self, loader, parent=None):
         super().__init__(parent)
-        self._items = []
-        self._h_spacing = 10
-        self._v_spacing = 10
+        self.loader = loader
+        self._paths = []
+        self._info = []
+        self._pixmaps = OrderedDict()
+        self._pixmap_bytes = 0
+        self._failed = set()
+
+        self._placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self._placeholder.fill(QColor("#f1f3f5"))
+        self._error_icon = QApplication.style().standardIcon(QStyle.StandardPixmap.SP_MessageBoxWarning)
+
+        self.loader.loaded.connect(self._on_loaded)
+        self.loader.failed.connect(self._on_failed)
+
+    def set_paths(self, paths, info=None):
+        self.beginResetModel()
+        self._paths = paths
+        self._info = info or []
+        self._pixmaps.clear()
+        self._pixmap_bytes = 0
+        self._failed.clear()
+        self.endResetModel()
+
+    def path(self, row):
+        return self._paths[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._paths)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self._pixmaps.get(row)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(row)
+                return pixmap
+            if row in self._failed:
+                return self._error_icon
+            self.loader.request(row, self._paths[row])
+            return self._placeholder
+
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self._tooltip(row)
 
-    def addItem(self, item):
-        self._items.append(item)
+        return None
 
-    def count(self):
-        return len(self._items)
+    def _tooltip(self, row):
+        lines = [os.path.basename(self._paths[row])]
+        if row < len(self._info) and self._info[row][0] is not None:
+            fmt, width, height, bit_depth, orientation, taken = self._info[row]
+            width, height = oriented_size(width, height, orientation)
+            lines.append(f"{width} × {height} {fmt.upper()}, {bit_depth}-bit")
+            if taken:
+                lines.append(f"Taken {taken}")
+        return "\n".join(lines)
+
+    def _on_loaded(self, row, image):
+        if row >= len(self._paths):
+            return
 
-    def itemAt(self, index):
-        if 0 <= index < len(self._items):
-            return self._items[index]
-        return None
+        pixmap = QPixmap.fromImage(image)
+        self._pixmaps[row] = pixmap
+        self._pixmap_bytes += pixmap.width() * pixmap.height() * pixmap.depth() // 8
+        while self._pixmap_bytes > THUMBNAIL_MEMORY_BUDGET and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._pixmap_bytes -= evicted.width() * evicted.height() * evicted.depth() // 8
 
-    def takeAt(self, index):
-        if 0 <= index < len(self._items):
-            return self._items.pop(index)
-        return None
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def _on_failed(self, row, error):
+        if row >= len(self._paths):
+            return
+
+        self._failed.add(row)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class DuplicatesDialog(QDialog):
+    def __init__(self, groups, annotated, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Near-Duplicates")
+        self.setMinimumSize(520, 480)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Checked images are moved out of the subproject. "
+                                "The first annotated image of each group is kept."))
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderHidden(True)
+        drop = duplicates_to_drop(groups, annotated)
+        for number, group in enumerate(groups, 1):
+            item = QTreeWidgetItem([f"Group {number} ({len(group)} images)"])
+            for image in group:
+                child = QTreeWidgetItem(["/".join(image)])
+                child.setCheckState(0, Qt.CheckState.Checked if image in drop else Qt.CheckState.Unchecked)
+                child.setData(0, Qt.ItemDataRole.UserRole, image)
+                item.addChild(child)
+            self.tree.addTopLevelItem(item)
+        self.tree.expandAll()
+        layout.addWidget(self.tree)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Cancel)
+        self.drop_button = buttons.addButton("Drop Checked", QDialogButtonBox.ButtonRole.AcceptRole)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def checked_images(self) -> list[tuple[str, str]]:
+        images = []
+        for row in range(self.tree.topLevelItemCount()):
+            item = self.tree.topLevelItem(row)
+            for child_row in range(item.childCount()):
+                child = item.child(child_row)
+                if child.checkState(0) == Qt.CheckState.Checked:
+                    images.append(child.data(0, Qt.ItemDataRole.UserRole))
+        return images
+
+
+class JobThread(QThread):
+    progress = Signal(str, int, int, object)
+    completed = Signal(object)
+
+    def __init__(self, job, name, parent=None):
+        super().__init__(parent)
+        self.job = job
+        self.name = name
+
+    def run(self):
+        # completed is always emitted, with None if the job failed, so the progress dialog can close.
+        summary = None
+        try:
+            with span(self.name, "action", source=self.job.source, mode=getattr(self.job, 'mode', None)):
+                summary = self.job.run(self.progress.emit)
+        except Exception as e:
+            log("ERROR", "%s failed: %s", self.name, e)
+        finally:
+            self.completed.emit(summary)
 
-    def setSpacing(self, spacing):
-        self._h_spacing = spacing
-        self._v_spacing = spacing
 
-    def spacing(self):
-        return self._h_spacing
+class JobProgressDialog(QDialog):
+    def __init__(self, job, title="Importing Images", name="import", scanning="Scanning source folder...",
+                 working="Copying", cancelling="Cancelling, removing copied files...", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setModal(True)
+        self.setMinimumWidth(420)
+
+        self.job = job
+        self.summary = None
+        self.scanning = scanning
+        self.working = working
+        self.cancelling = cancelling
+        self._stage = None
+        self._stage_started = None
 
-    def setGeometry(self, rect):
-        super().setGeometry(rect)
-        self._do_layout(rect)
+        layout = QVBoxLayout()
 
-    def sizeHint(self):
-        return self.minimumSize()
+        self.status_label = QLabel(scanning)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)
+        self.rate_label = QLabel("")
 
-    def minimumSize(self):
-        size = QSize()
-        for item in self._items:
-            size = size.expandedTo(item.minimumSize())
-        margin = self.contentsMargins().left() + self.contentsMargins().right()
-        size += QSize(2 * margin, 2 * margin)
-        return size
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self._cancel)
 
-    def _do_layout(self, rect):
-        x = rect.x()
-        y = rect.y()
-        line_height = 0
-        spacing = self._h_spacing
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.rate_label)
+        layout.addWidget(self.cancel_button, alignment=Qt.AlignmentFlag.AlignRight)
+        self.setLayout(layout)
 
-        for item in self._items:
-            widget = item.widget()
-            if widget is None:
-                continue
+        self.thread = JobThread(job, name, self)
+        self.thread.progress.connect(self._on_progress)
+        self.thread.completed.connect(self._on_completed)
 
-            next_x = x + item.sizeHint().width() + spacing
-            if next_x - spacing > rect.right() and line_height > 0:
-                x = rect.x()
-                y += line_height + self._v_spacing
-                next_x = x + item.sizeHint().width() + spacing
-                line_height = 0
+    def exec(self):
+        self.thread.start()
+        return super().exec()
 
-            item.setGeometry(QRect(QPoint(x, y), item.sizeHint()))
-            x = next_x
-            line_height = max(line_height, item.sizeHint().height())
+    def reject(self):
+        if self.summary is None:
+            self._cancel()
+            return
+        super().reject()
+
+    def _cancel(self):
+        self.job.cancel()
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText(self.cancelling)
+
+    def _on_progress(self, stage, done, total, nbytes):
+        if self.job.cancelled:
+            return
+
+        if stage == "scan":
+            self.status_label.setText(f"{self.scanning} {done} images found" if done else self.scanning)
+            return
+
+        if stage == "split":
+            self.status_label.setText("Assigning train / val / test splits...")
+            return
+
+        if stage == "group":
+            self.status_label.setText("Grouping near-duplicates...")
+            return
+
+        if stage != self._stage:
+            self._stage = stage
+            self._stage_started = time.monotonic()
+            self.rate_label.setText("")
+
+        # Streamed archives report no total until they have been read to the end.
+        self.progress_bar.setRange(0, total)
+        working = "Hashing" if stage == "hash" else self.working
+        self.status_label.setText(f"{working} {done} / {total} images" if total else f"{working} {done} images")
+        self.progress_bar.setValue(done)
+
+        elapsed = time.monotonic() - self._stage_started
+        if done and elapsed > 0:
+            rate = done / elapsed
+            throughput = f" · {nbytes / elapsed / (1024 * 1024):.1f} MB/s" if nbytes else ""
+            eta = f" · ETA {self._format_duration((total - done) / rate)}" if total else ""
+            self.rate_label.setText(f"{rate:.0f} images/s{throughput}{eta}")
+
+    def _on_completed(self, summary):
+        self.summary = summary
+        self.thread.wait()
+        self.accept()
+
+    @staticmethod
+    def _format_duration(seconds):
+        seconds = int(seconds)
+        if seconds >= 3600:
+            return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+        if seconds >= 60:
+            return f"{seconds // 60}m {seconds % 60:02d}s"
+        return f"{seconds}s"
 
 
 class AnnotatePage(QWidget):
-    def __init__(self):
+    def __init__(self, repository=None):
         super().__init__()
+        self.repository = repository if repository is not None else ProjectRepository()
         self.projects = []
         self.current_project = None
         self.current_subproject = None
         self.current_folder = None
+        self.thumbnail_cache = None
+        self.image_index = None
+        self.annotations = None
+        self.current_row = None
         self.allocate_scroll_content = None
-        self.image_layout = None
+        self.folder_blocks = {}
+        self.duplicates_block = None
+        self.image_view = None
+        self.thumbnail_loader = ThumbnailLoader(self)
+        self.thumbnail_loader.failed.connect(self._on_thumbnail_failed)
+        self.thumbnail_loader.finished.connect(self._on_thumbnails_finished)
+        self.thumbnail_model = ThumbnailModel(self.thumbnail_loader, self)
         self.stacked_widget = None
+        self._loaded = False
         self._initialize_ui()
 
+        self.repository.projectsChanged.connect(self._load_projects)
+        self.repository.projectChanged.connect(self._on_project_changed)
+        self.repository.subprojectChanged.connect(self._on_subproject_changed)
+        self.repository.folderChanged.connect(self._on_folder_changed)
+
     def _initialize_ui(self):
         self.stacked_widget = QStackedWidget()
         main_widget = self._create_main_widget()
         self.image_view_widget = self._create_image_view_widget()
+        self.canvas_widget = self._create_canvas_widget()
 
         self.stacked_widget.addWidget(main_widget)
         self.stacked_widget.addWidget(self.image_view_widget)
+        self.stacked_widget.addWidget(self.canvas_widget)
 
         self.setLayout(QVBoxLayout())
         self.layout().addWidget(self.stacked_widget)
@@ -163,14 +346,6 @@ class AnnotatePage(QWidget):
     def _create_dropdown_panel(self):
         container = QFrame()
         container.setObjectName("dropdownPanel")
-        container.setStyleSheet("""
-            QFrame#dropdownPanel {
-                background-color: #ffffff;
-                border-radius: 8px;
-                border: 1px solid #e0e0e0;
-                padding: 10px;
-            }
-        """)
 
         layout = QHBoxLayout(container)
         layout.setContentsMargins(10, 10, 10, 10)
@@ -192,50 +367,40 @@ class AnnotatePage(QWidget):
     def _create_panel(self, title):
         container = QFrame()
         container.setObjectName("panelContainer")
-        container.setStyleSheet("""
-            QFrame#panelContainer {
-                background-color: #ffffff;
-                border-radius: 8px;
-                border: 1px solid #e0e0e0;
-            }
-        """)
 
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
         layout.setSpacing(0)
 
         header = QFrame()
-        header.setStyleSheet("""
-            QFrame {
-                background-color: #ffffff;
-                border-top-left-radius: 8px;
-                border-top-right-radius: 8px;
-                border-bottom: 1px solid #e0e0e0;
-            }
-        """)
+        header.setObjectName("panelHeader")
         header_layout = QHBoxLayout()
         header_layout.setContentsMargins(12, 8, 12, 8)
         header_layout.setSpacing(8)
 
         title_label = QLabel(title)
-        title_label.setStyleSheet("""
-            QLabel {
-                font-size: 14px;
-                font-weight: bold;
-                color: #333333;
-            }
-        """)
+        title_label.setObjectName("panelTitle")
         header_layout.addWidget(title_label)
         header_layout.addSpacerItem(QSpacerItem(0, 0, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum))
 
         if title == "Allocate":
             self.btn_add = QPushButton("+")
             self.btn_add.setToolTip("Add images")
-            self.btn_add.setStyleSheet(self._get_button_style("#4CAF50", "#3e8e41", "#43A047"))
+            self.btn_add.setObjectName("iconButton")
+            self.btn_add.setProperty("variant", "add")
             self.btn_add.setCursor(Qt.CursorShape.PointingHandCursor)
             self.btn_add.clicked.connect(self._handle_add_images)
             header_layout.addWidget(self.btn_add)
 
+            self.btn_duplicates = QPushButton("≈")
+            self.btn_duplicates.setToolTip("Find near-duplicate images")
+            self.btn_duplicates.setObjectName("iconButton")
+            self.btn_duplicates.setProperty("variant", "edit")
+            self.btn_duplicates.setCursor(Qt.CursorShape.PointingHandCursor)
+            self.btn_duplicates.setEnabled(hashing_available())
+            self.btn_duplicates.clicked.connect(self._handle_find_duplicates)
+            header_layout.addWidget(self.btn_duplicates)
+
         header.setLayout(header_layout)
         layout.addWidget(header)
 
@@ -253,9 +418,59 @@ class AnnotatePage(QWidget):
 
         if title == "Allocate":
             self.allocate_scroll_content = content_widget
+        elif title == "Dataset":
+            self._create_dataset_controls(content_layout)
 
         return container
 
+    def _create_dataset_controls(self, layout):
+        form = QFormLayout()
+
+        self.export_format_combo = QComboBox()
+        for fmt, label in EXPORT_FORMATS.items():
+            self.export_format_combo.addItem(label, fmt)
+
+        self.export_images_combo = QComboBox()
+        for mode, label in EXPORT_IMAGE_MODES.items():
+            self.export_images_combo.addItem(label, mode)
+
+        self.export_splits_combo = QComboBox()
+        self.export_splits_combo.addItem("No splits", None)
+        for label, ratios in SPLIT_PRESETS.items():
+            self.export_splits_combo.addItem(f"Train / val / test: {label}", ratios)
+        self.export_splits_combo.currentIndexChanged.connect(self._update_split_controls)
+
+        for combo in (self.export_format_combo, self.export_images_combo, self.export_splits_combo):
+            combo.setSizeAdjustPolicy(QComboBox.SizeAdjustPolicy.AdjustToMinimumContentsLengthWithIcon)
+            combo.setMinimumContentsLength(12)
+
+        self.export_seed_spin = QSpinBox()
+        self.export_seed_spin.setRange(0, 2 ** 31 - 1)
+        self.export_seed_spin.setToolTip("The same seed always produces the same splits")
+
+        self.export_group_check = QCheckBox("Keep folders together")
+        self.export_group_check.setChecked(True)
+        self.export_group_check.setToolTip("Put all images of a folder into the same split")
+
+        form.addRow("Format:", self.export_format_combo)
+        form.addRow("Images:", self.export_images_combo)
+        form.addRow("Splits:", self.export_splits_combo)
+        form.addRow("Seed:", self.export_seed_spin)
+        form.addRow("", self.export_group_check)
+        layout.addLayout(form)
+        self._update_split_controls()
+
+        self.export_button = QPushButton("Export...")
+        self.export_button.setObjectName("actionButton")
+        self.export_button.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.export_button.clicked.connect(self._handle_export)
+        layout.addWidget(self.export_button, alignment=Qt.AlignmentFlag.AlignRight)
+
+    def _update_split_controls(self):
+        enabled = self.export_splits_combo.currentData() is not None
+        self.export_seed_spin.setEnabled(enabled)
+        self.export_group_check.setEnabled(enabled)
+
     def _create_image_view_widget(self):
         widget = QWidget()
         layout = QVBoxLayout(widget)
@@ -263,24 +478,70 @@ class AnnotatePage(QWidget):
         layout.setSpacing(15)
 
         back_button = QPushButton("← Back")
-        back_button.setStyleSheet(self._get_button_style("#6c757d", "#5a6268", "#545b62"))
+        back_button.setObjectName("backButton")
         back_button.clicked.connect(self._return_to_main_view)
         layout.addWidget(back_button, alignment=Qt.AlignmentFlag.AlignLeft)
 
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        scroll.setStyleSheet("border: none;")
+        self.image_view = QListView()
+        self.image_view.setViewMode(QListView.ViewMode.ListMode)
+        self.image_view.setFlow(QListView.Flow.LeftToRight)
+        self.image_view.setWrapping(True)
+        self.image_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.image_view.setMovement(QListView.Movement.Static)
+        self.image_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.image_view.setBatchSize(500)
+        self.image_view.setUniformItemSizes(True)
+        self.image_view.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.image_view.setGridSize(QSize(THUMBNAIL_SIZE + 20, THUMBNAIL_SIZE + 20))
+        self.image_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.image_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.image_view.setObjectName("imageView")
+        self.image_view.setModel(self.thumbnail_model)
+        self.image_view.doubleClicked.connect(lambda index: self._open_image(index.row()))
+
+        layout.addWidget(self.image_view)
+        return widget
 
-        self.image_container = QWidget()
-        self.image_layout = QFlowLayout(self.image_container)
-        self.image_layout.setContentsMargins(5, 5, 5, 5)
-        scroll.setWidget(self.image_container)
+    def _create_canvas_widget(self):
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(15)
 
-        layout.addWidget(scroll)
+        toolbar = QHBoxLayout()
+        back_button = QPushButton("← Back")
+        back_button.setObjectName("backButton")
+        back_button.clicked.connect(self._return_to_image_view)
+        toolbar.addWidget(back_button)
+
+        previous_button = QPushButton("‹")
+        previous_button.setToolTip("Previous image")
+        previous_button.setObjectName("backButton")
+        previous_button.clicked.connect(lambda: self._step_image(-1))
+        next_button = QPushButton("›")
+        next_button.setToolTip("Next image")
+        next_button.setObjectName("backButton")
+        next_button.clicked.connect(lambda: self._step_image(1))
+        toolbar.addWidget(previous_button)
+        toolbar.addWidget(next_button)
+
+        self.canvas_title = QLabel()
+        toolbar.addWidget(self.canvas_title, 1)
+        self.zoom_label = QLabel()
+        toolbar.addWidget(self.zoom_label)
+        layout.addLayout(toolbar)
+
+        self.canvas = ImageCanvas(parent=widget)
+        self.prefetcher = Prefetcher(self.canvas.cache, self)
+        self.canvas.navigate.connect(self._step_image)
+        self.canvas.zoomChanged.connect(lambda zoom: self.zoom_label.setText(f"{zoom * 100:.0f}%"))
+        layout.addWidget(self.canvas, 1)
         return widget
 
     def showEvent(self, event):
-        self._refresh_data()
+        if not self._loaded:
+            self._loaded = True
+            QTimer.singleShot(0, self._refresh_data)
         super().showEvent(event)
 
     def _refresh_data(self):
@@ -289,37 +550,58 @@ class AnnotatePage(QWidget):
 
     def _load_projects(self):
         self.projects = self._scan_projects()
-        self.project_combo.clear()
+        self._sync_project_combo()
+
+    def _sync_project_combo(self):
+        if self._sync_combo(self.project_combo, [(p['name'], p) for p in self.projects]):
+            return
 
-        for project in self.projects:
-            self.project_combo.addItem(project['name'], project)
+        self.current_project = None
+        self.current_subproject = None
+        self.subproject_combo.clear()
+        self._clear_allocate_blocks()
+        self._return_to_main_view()
 
     @staticmethod
-    def _scan_projects() -> list[dict]:
-        projects = []
-        data_dir = "data"
-
-        if not os.path.exists(data_dir):
-            return projects
-
-        for dir_name in os.listdir(data_dir):
-            dir_path = os.path.join(data_dir, dir_name)
-            meta_path = os.path.join(dir_path, "meta.json")
-
-            if os.path.isfile(meta_path):
-                try:
-                    with open(meta_path, 'r', encoding='utf-8') as f:
-                        meta = json.load(f)
-                        if meta.get('type') == 'project':
-                            project_data = {
-                                'name': meta.get('name', dir_name),
-                                'path': dir_path,
-                                'subprojects': meta.get('subprojects', [])
-                            }
-                            projects.append(project_data)
-                except Exception as e:
-                    log("ERROR", f"Error reading {meta_path}: {str(e)}")
-        return projects
+    def _sync_combo(combo, items) -> bool:
+        current = combo.currentText() if combo.currentIndex() != -1 else None
+
+        combo.blockSignals(True)
+        combo.clear()
+        for name, data in items:
+            combo.addItem(name, data)
+        index = combo.findText(current) if current is not None else -1
+        combo.setCurrentIndex(index)
+        combo.blockSignals(False)
+
+        return current is None or index != -1
+
+    def _scan_projects(self) -> list[dict]:
+        return self.repository.projects()
+
+    def _on_project_changed(self, dir_name):
+        self._load_projects()
+
+        path = os.path.join("data", dir_name)
+        if self.current_project and self.current_project['path'] == path:
+            project = self.repository.project(dir_name)
+            if project is not None:
+                self.current_project = project
+                self._load_subprojects(project, keep_selection=True)
+
+    def _on_subproject_changed(self, project_dir, subproject_name):
+        if self._is_current_subproject(project_dir, subproject_name):
+            self._update_allocate_blocks()
+
+    def _on_folder_changed(self, project_dir, subproject_name, folder):
+        if self._is_current_subproject(project_dir, subproject_name):
+            self._update_allocate_blocks()
+
+    def _is_current_subproject(self, project_dir, subproject_name) -> bool:
+        if not self.current_subproject:
+            return False
+        path = os.path.join("data", project_dir, 'subprojects', subproject_name)
+        return os.path.normpath(self.current_subproject['path']) == os.path.normpath(path)
 
     def _on_project_selected(self, index):
         if index == -1:
@@ -329,38 +611,33 @@ class AnnotatePage(QWidget):
         self.current_project = project
         self._load_subprojects(project)
 
-    def _load_subprojects(self, project):
-        subprojects = self._scan_subprojects(project)
-        self.subproject_combo.clear()
+    def _load_subprojects(self, project, keep_selection=False):
+        subprojects = self.repository.subprojects(os.path.basename(project['path']))
+
+        if keep_selection:
+            if not self._sync_combo(self.subproject_combo, [(sp['name'], sp) for sp in subprojects]):
+                self.current_subproject = None
+                self._clear_allocate_blocks()
+                self._return_to_main_view()
+        else:
+            self.subproject_combo.clear()
+            for subproject in subprojects:
+                self.subproject_combo.addItem(subproject['name'], subproject)
+            self.subproject_combo.setCurrentIndex(-1)
+
+        for row, subproject in enumerate(subprojects):
+            if not subproject['exists']:
+                self.subproject_combo.model().item(row).setEnabled(False)
+                self.subproject_combo.setItemData(row, f"Folder {subproject['path']} is missing",
+                                                  Qt.ItemDataRole.ToolTipRole)
 
         if not subprojects:
             self.subproject_combo.setPlaceholderText("No subprojects available")
             self.subproject_combo.setEnabled(False)
             return
 
-        for subproject in subprojects:
-            self.subproject_combo.addItem(subproject['name'], subproject)
-
         self.subproject_combo.setPlaceholderText("Select subproject")
         self.subproject_combo.setEnabled(True)
-        self.subproject_combo.setCurrentIndex(-1)
-
-    @staticmethod
-    def _scan_subprojects(project: dict) -> list[dict]:
-        subprojects = []
-        meta_path = os.path.join(project['path'], "meta.json")
-
-        try:
-            with open(meta_path, 'r', encoding='utf-8') as f:
-                project_meta = json.load(f)
-                for sp_name in project_meta.get('subprojects', []):
-                    sp_path = os.path.join(project['path'], 'subprojects', sp_name)
-                    if os.path.exists(sp_path):
-                        subprojects.append({'name': sp_name, 'path': sp_path})
-        except Exception as e:
-            log("ERROR", f"Error reading {meta_path}: {str(e)}")
-
-        return subprojects
 
     def _on_subproject_selected(self, index):
         if index == -1:
@@ -368,6 +645,15 @@ class AnnotatePage(QWidget):
 
         subproject = self.subproject_combo.itemData(index)
         self.current_subproject = subproject
+        self.thumbnail_loader.cancel()
+        self.thumbnail_cache = None
+        if self.image_index is not None:
+            self.image_index.close()
+        self.image_index = ImageIndex(subproject['path'])
+        if self.annotations is not None:
+            self.annotations.close()
+        self.annotations = AnnotationStore(subproject['path'])
+        self._clear_allocate_blocks()
         self._update_allocate_blocks()
 
     def _handle_add_images(self):
@@ -375,90 +661,235 @@ class AnnotatePage(QWidget):
             QMessageBox.warning(self, "Error", "Please select subproject first!")
             return
 
-        folder = QFileDialog.getExistingDirectory(self, "Select image folder")
-        if not folder:
+        sources = ["Image folder", "Zip or tar archive"]
+        source, ok = QInputDialog.getItem(self, "Add Images", "Import images from:", sources, 0, False)
+        if not ok:
+            return
+        if source == sources[0]:
+            path = QFileDialog.getExistingDirectory(self, "Select image folder")
+        else:
+            patterns = " ".join(f"*{ext}" for ext in ARCHIVE_EXTENSIONS)
+            path, _ = QFileDialog.getOpenFileName(self, "Select image archive", "", f"Archives ({patterns})")
+        if not path:
             return
 
-        valid_files = []
-        for root, _, files in os.walk(folder):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in IMAGE_EXTENSIONS:
-                    valid_files.append(os.path.join(root, file))
+        # Archive members cannot be linked, so only the copying modes are offered for them.
+        modes = list(IMPORT_MODES) if source == sources[0] else [mode for mode in IMPORT_MODES if mode != 'link']
+        labels = [IMPORT_MODES[mode] for mode in modes]
+        label, ok = QInputDialog.getItem(self, "Import Mode", "How should images be added?", labels, 0, False)
+        if not ok:
+            return
+        mode = modes[labels.index(label)]
 
-        if not valid_files:
+        target_dir = os.path.join(self.current_subproject['path'], 'images')
+        job = ImportJob(path, target_dir, mode, subproject_path=self.current_subproject['path'], hash_images=True,
+                        data_dir=self.repository.store.data_dir)
+        scanning = "Scanning source folder..." if source == sources[0] else "Reading archive..."
+        dialog = JobProgressDialog(job, scanning=scanning, parent=self)
+        dialog.exec()
+        summary = dialog.summary
+
+        self._update_allocate_blocks()
+
+        if summary is None:
+            QMessageBox.critical(self, "Import Failed", "The import failed, see the log for details.")
+            return
+
+        if summary['cancelled']:
+            QMessageBox.information(self, "Cancelled", "Import cancelled, no images were added.")
+            return
+
+        if not summary['total']:
             QMessageBox.warning(self, "Error", "No valid image files found!")
             return
 
-        target_dir = os.path.join(self.current_subproject['path'], 'images')
-        os.makedirs(target_dir, exist_ok=True)
+        message = (f"Added {summary['copied']} images "
+                   f"({summary['bytes'] / (1024 * 1024):.1f} MB) in {summary['seconds']:.1f}s!")
+        if summary['saved_bytes']:
+            methods = ", ".join(f"{count} {method}" for method, count in sorted(summary['methods'].items()))
+            message += (f"\n\n{methods}\n"
+                        f"{summary['saved_bytes'] / (1024 * 1024):.1f} MB not copied thanks to links and deduplication.")
+        if summary['duplicates'] and summary['duplicates']['groups']:
+            message += (f"\n\n{summary['duplicates']['groups']} groups of near-duplicates found, "
+                        f"see the Allocate panel.")
+        if summary['failed']:
+            failed = "\n".join(f"{os.path.basename(src)}: {error}" for src, error in summary['failed'][:10])
+            message += f"\n\n{len(summary['failed'])} files could not be copied:\n{failed}"
+            QMessageBox.warning(self, "Import Finished", message)
+        else:
+            QMessageBox.information(self, "Success", message)
+
+    def _handle_export(self):
+        if not self.current_subproject:
+            QMessageBox.warning(self, "Error", "Please select subproject first!")
+            return
 
-        base_name = os.path.basename(folder)
-        dest_folder = os.path.join(target_dir, base_name)
-        counter = 1
-        while os.path.exists(dest_folder):
-            dest_folder = f"{os.path.join(target_dir, base_name)}_{counter}"
-            counter += 1
-        os.makedirs(dest_folder)
+        if self.export_format_combo.currentData() == 'yolo' and self.export_images_combo.currentData() == 'none':
+            QMessageBox.warning(self, "Error", f"{YOLO_NEEDS_IMAGES}.")
+            return
 
-        for file in valid_files:
-            shutil.copy2(file, dest_folder)
+        output_dir = QFileDialog.getExistingDirectory(self, "Select export folder")
+        if not output_dir:
+            return
 
-        self._update_allocate_blocks()
-        QMessageBox.information(self, "Success", f"Added {len(valid_files)} images!")
+        if self.annotations is not None:
+            self.annotations.flush()
+        classes = self.repository.classes(os.path.basename(self.current_project['path']),
+                                          self.current_subproject['name'])
+        job = ExportJob(self.current_subproject['path'], classes, output_dir,
+                        self.export_format_combo.currentData(), self.export_images_combo.currentData(),
+                        ratios=self.export_splits_combo.currentData(), seed=self.export_seed_spin.value(),
+                        group_by_folder=self.export_group_check.isChecked())
+        dialog = JobProgressDialog(job, "Exporting Dataset", "export", "Indexing images...", "Exporting",
+                                   "Cancelling, removing exported files...", parent=self)
+        dialog.exec()
+        summary = dialog.summary
+
+        if summary is None:
+            QMessageBox.critical(self, "Export Failed", "The export failed, see the log for details.")
+            return
 
-    def _update_allocate_blocks(self):
-        if self.allocate_scroll_content.layout():
-            while self.allocate_scroll_content.layout().count():
-                item = self.allocate_scroll_content.layout().takeAt(0)
-                if item.widget():
-                    item.widget().deleteLater()
+        if summary['cancelled']:
+            QMessageBox.information(self, "Cancelled", "Export cancelled, partial output was removed.")
+            return
+
+        if not summary['total']:
+            QMessageBox.warning(self, "Error", "This subproject has no images to export!")
+            return
 
+        message = (f"Exported {summary['exported']} images and {summary['boxes']} boxes "
+                   f"to {summary['dest_folder']} in {summary['seconds']:.1f}s!")
+        if summary['splits']:
+            message += "\n" + ", ".join(f"{name}: {count}" for name, count in summary['splits'].items())
+        if summary['failed']:
+            failed = "\n".join(f"{path}: {error}" for path, error in summary['failed'][:10])
+            message += f"\n\n{len(summary['failed'])} images were skipped:\n{failed}"
+            QMessageBox.warning(self, "Export Finished", message)
+        else:
+            QMessageBox.information(self, "Success", message)
+
+    def _handle_find_duplicates(self):
         if not self.current_subproject:
+            QMessageBox.warning(self, "Error", "Please select subproject first!")
+            return
+
+        dialog = JobProgressDialog(DuplicateJob(self.current_subproject['path']), title="Finding Near-Duplicates",
+                                   name="duplicates", scanning="Scanning images...", working="Hashing",
+                                   cancelling="Cancelling...", parent=self)
+        dialog.exec()
+        summary = dialog.summary
+
+        self._update_allocate_blocks()
+        if summary is None:
+            QMessageBox.critical(self, "Search Failed", "Finding near-duplicates failed, see the log for details.")
+            return
+        if summary['cancelled']:
+            return
+
+        message = (f"Hashed {summary['hashed']} images in {summary['seconds']:.1f}s, found {summary['groups']} "
+                   f"groups with {summary['duplicates']} near-duplicates.")
+        if summary['failed']:
+            message += f"\n\n{len(summary['failed'])} images could not be decoded."
+        QMessageBox.information(self, "Near-Duplicates", message)
+        if summary['groups']:
+            self._show_duplicates()
+
+    def _show_duplicates(self):
+        groups = self.image_index.duplicate_groups()
+        if not groups:
+            return
+
+        dialog = DuplicatesDialog(groups, set(self.annotations.images()), self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        images = dialog.checked_images()
+        if not images:
             return
 
-        image_dir = os.path.join(self.current_subproject['path'], 'images')
-        if not os.path.exists(image_dir):
+        reply = QMessageBox.question(
+            self,
+            "Drop Near-Duplicates",
+            f"Move {len(images)} images to the duplicates folder of this subproject?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
             return
 
-        for folder in os.listdir(image_dir):
-            folder_path = os.path.join(image_dir, folder)
-            if os.path.isdir(folder_path):
-                count = len([f for f in os.listdir(folder_path)
-                             if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS])
+        moved, failed = move_duplicates(self.current_subproject['path'], images)
+        self._update_allocate_blocks()
+        if failed:
+            details = "\n".join(f"{path}: {error}" for path, error in failed[:10])
+            QMessageBox.warning(self, "Drop Near-Duplicates",
+                                f"Moved {moved} images, {len(failed)} could not be moved:\n{details}")
+
+    def _clear_allocate_blocks(self):
+        layout = self.allocate_scroll_content.layout()
+        while layout.count():
+            item = layout.takeAt(0)
+            if item.widget():
+                item.widget().deleteLater()
+        self.folder_blocks = {}
+        self.duplicates_block = None
 
+    def _update_allocate_blocks(self):
+        if not self.current_subproject:
+            self._clear_allocate_blocks()
+            return
+
+        layout = self.allocate_scroll_content.layout()
+        self.image_index.refresh()
+        counts = self.image_index.folder_counts()
+        folders = {folder for folder, _ in counts}
+
+        for folder in list(self.folder_blocks):
+            if folder not in folders:
+                block, _ = self.folder_blocks.pop(folder)
+                layout.removeWidget(block)
+                block.deleteLater()
+
+        for position, (folder, count) in enumerate(counts):
+            if folder not in self.folder_blocks:
                 block = ClickableFrame(folder)
                 block.setToolTip(f"Double click to open {folder}")
 
-                layout = QHBoxLayout(block)
-                layout.addWidget(QLabel(folder))
-                layout.addStretch()
-                layout.addWidget(QLabel(f"{count} images"))
+                block_layout = QHBoxLayout(block)
+                block_layout.addWidget(QLabel(folder))
+                block_layout.addStretch()
+                count_label = QLabel()
+                block_layout.addWidget(count_label)
 
                 block.clicked.connect(self._handle_folder_click)
 
-                self.allocate_scroll_content.layout().addWidget(block)
-
-    def eventFilter(self, obj, event):
-        if event.type() == QEvent.Type.Enter:
-            obj.setStyleSheet("""
-                QFrame {
-                    background: #E9ECEF;
-                    border-radius: 6px;
-                    border: 1px solid #CED4DA;
-                    margin: 4px;
-                }
-            """)
-        elif event.type() == QEvent.Type.Leave:
-            obj.setStyleSheet("""
-                QFrame {
-                    background: #F8F9FA;
-                    border-radius: 6px;
-                    border: 1px solid #DEE2E6;
-                    margin: 4px;
-                }
-            """)
-        return super().eventFilter(obj, event)
+                layout.insertWidget(position, block)
+                self.folder_blocks[folder] = (block, count_label)
+
+            self.folder_blocks[folder][1].setText(f"{count} images")
+
+        self._update_duplicates_block(layout)
+
+    def _update_duplicates_block(self, layout):
+        groups, images = self.image_index.duplicate_counts()
+        if not groups:
+            if self.duplicates_block is not None:
+                block, _ = self.duplicates_block
+                layout.removeWidget(block)
+                block.deleteLater()
+                self.duplicates_block = None
+            return
+
+        if self.duplicates_block is None:
+            block = ClickableFrame("")
+            block.setToolTip("Review near-duplicate groups and drop them before annotating")
+            block_layout = QHBoxLayout(block)
+            block_layout.addWidget(QLabel("Near-duplicates"))
+            block_layout.addStretch()
+            count_label = QLabel()
+            block_layout.addWidget(count_label)
+            block.clicked.connect(lambda _: self._show_duplicates())
+            layout.addWidget(block)
+            self.duplicates_block = (block, count_label)
+
+        self.duplicates_block[1].setText(f"{groups} groups, {images - groups} extra images")
 
     def mousePressEvent(self, event):
         child = self.childAt(event.pos())
@@ -477,66 +908,74 @@ class AnnotatePage(QWidget):
 
         if reply == QMessageBox.StandardButton.Yes:
             self.current_folder = folder_name
+            for name, (block, _) in self.folder_blocks.items():
+                set_state(block, "selected", name == folder_name)
             self._show_image_view()
 
     def _show_image_view(self):
-        self._populate_image_view()
-        self.stacked_widget.setCurrentIndex(1)
+        with span("folder.open", "action", folder=self.current_folder):
+            self._populate_image_view()
+            self.stacked_widget.setCurrentIndex(1)
 
     def _populate_image_view(self):
-        while self.image_layout.count():
-            item = self.image_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-
         folder_path = os.path.join(
             self.current_subproject['path'],
             'images',
             self.current_folder
         )
 
-        for file in sorted(os.listdir(folder_path)):
-            if os.path.splitext(file)[1].lower() in IMAGE_EXTENSIONS:
-                try:
-                    pixmap = QPixmap(os.path.join(folder_path, file))
-                    label = QLabel()
-                    label.setPixmap(pixmap.scaled(200, 200,
-                                                Qt.AspectRatioMode.KeepAspectRatio,
-                                                Qt.TransformationMode.SmoothTransformation))
-                    label.setStyleSheet("""
-                        QLabel {
-                            border-radius: 8px;
-                            border: 2px solid #dee2e6;
-                            margin: 5px;
-                            background-color: #ffffff;
-                        }
-                    """)
-                    self.image_layout.addWidget(label)
-                except Exception as e:
-                    log("ERROR", f"Error loading image {file}: {str(e)}")
+        if self.thumbnail_cache is None:
+            self.thumbnail_cache = ThumbnailCache(self.current_subproject['path'])
+
+        rows = self.image_index.image_info(self.current_folder)
+        paths = [os.path.join(folder_path, row[0]) for row in rows]
+
+        self.thumbnail_loader.start(self.thumbnail_cache)
+        self.thumbnail_model.set_paths(paths, [row[1:] for row in rows])
+        self.prefetcher.set_paths(paths, os.path.join(self.current_subproject['path'], OVERVIEW_CACHE_DIR))
+        self.image_view.scrollToTop()
+
+    def _on_thumbnail_failed(self, index, error):
+        log("ERROR", "Error loading image %s: %s", self.thumbnail_model.path(index), error)
+
+    def _on_thumbnails_finished(self):
+        instant("folder.thumbnails_ready", "action", folder=self.current_folder)
+        stats = self.thumbnail_cache.stats()
+        log("CACHE", f"Thumbnails for {self.current_folder}: {stats['hits']} hits, {stats['misses']} misses, "
+                     f"{stats['entries']} cached ({stats['bytes'] // 1024} KiB of {stats['budget'] // 1024} KiB)")
+
+    def _open_image(self, row):
+        if not 0 <= row < self.thumbnail_model.rowCount():
+            return
+
+        self.current_row = row
+        path = self.thumbnail_model.path(row)
+        name = os.path.basename(path)
+        with span("image.open", "action", image=name):
+            classes = self.repository.classes(os.path.basename(self.current_project['path']),
+                                              self.current_subproject['name'])
+            self.canvas.set_image(path, self.annotations.boxes(f"{self.current_folder}/{name}"), classes,
+                                  image=self.prefetcher.take(path),
+                                  cache_dir=os.path.join(self.current_subproject['path'], OVERVIEW_CACHE_DIR))
+            self.canvas_title.setText(f"{name}  ({row + 1} of {self.thumbnail_model.rowCount()})")
+            self.image_view.setCurrentIndex(self.thumbnail_model.index(row))
+            self.stacked_widget.setCurrentIndex(2)
+            self.canvas.setFocus()
+        self.prefetcher.visit(row, self.canvas.size())
+
+    def _step_image(self, delta):
+        if self.current_row is not None:
+            self._open_image(self.current_row + delta)
+
+    def _return_to_image_view(self):
+        self.canvas.clear()
+        self.current_row = None
+        self.stacked_widget.setCurrentIndex(1)
 
     def _return_to_main_view(self):
+        self.canvas.clear()
+        self.prefetcher.set_paths([])
+        self.current_row = None
+        self.thumbnail_loader.cancel()
+        self.thumbnail_model.set_paths([])
         self.stacked_widget.setCurrentIndex(0)
-
-    @staticmethod
-    def _get_button_style(normal: str, hover: str, pressed: str) -> str:
-        return f"""
-            QPushButton {{
-                background-color: {normal};
-                color: white;
-                border-radius: 6px;
-                min-width: 24px;
-                max-width: 24px;
-                min-height: 24px;
-                max-height: 24px;
-                font-weight: bold;
-                border: none;
-                padding: 0;
-            }}
-            QPushButton:hover {{
-                background-color: {hover};
-            }}
-            QPushButton:pressed {{
-                background-color: {pressed};
-            }}
-        """
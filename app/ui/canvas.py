@@ -0,0 +1,207 @@
+from PySide6.QtGui import *
+from PySide6.QtCore import *
+from PySide6.QtWidgets import *
+
+from app.utils.logger import log
+from app.utils.tiles import TILE_SIZE, TileCache, TiledImage, TileLoader
+
+
+MAX_ZOOM = 32.0
+ZOOM_STEP = 1.25
+BOX_COLORS = ["#e6194b", "#3cb44b", "#4363d8", "#f58231", "#911eb4", "#42d4f4", "#f032e6", "#bfef45"]
+
+
+class ImageCanvas(QWidget):
+    zoomChanged = Signal(float)
+    navigate = Signal(int)
+
+    def __init__(self, cache=None, parent=None):
+        super().__init__(parent)
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+        self.setMinimumSize(200, 200)
+
+        self.cache = cache if cache is not None else TileCache()
+        self.loader = TileLoader(self.cache, self)
+        self.loader.loaded.connect(self._on_tile_loaded)
+
+        self.image = None
+        self.boxes = []
+        self.class_names = []
+        self.zoom = 1.0
+        self.origin = QPointF(0, 0)
+
+        self._fitted = True
+        self._drag_start = None
+        self._drag_origin = None
+
+    def set_image(self, path, boxes=(), class_names=(), image=None, cache_dir=None):
+        self.loader.cancel()
+        self.boxes = list(boxes)
+        self.class_names = list(class_names)
+        try:
+            self.image = image if image is not None else TiledImage(path, cache_dir)
+            log("CANVAS", f"Opened {path}: {self.image.width}x{self.image.height}, {self.image.levels} levels, "
+                          f"{self.image.mode} reads")
+        except ValueError as e:
+            log("ERROR", f"Cannot open {path}: {e}")
+            self.image = None
+        self.fit()
+
+    def clear(self):
+        self.loader.cancel()
+        self.image = None
+        self.boxes = []
+        self.update()
+
+    def fit(self):
+        self._fitted = True
+        if self.image is None or self.width() <= 0 or self.height() <= 0:
+            self.update()
+            return
+
+        self.zoom = min(self.image.fit_zoom(self.width(), self.height()), MAX_ZOOM)
+        self.origin = QPointF((self.image.width - self.width() / self.zoom) / 2,
+                              (self.image.height - self.height() / self.zoom) / 2)
+        self.zoomChanged.emit(self.zoom)
+        self.update()
+
+    def zoom_at(self, position, factor):
+        if self.image is None:
+            return
+
+        fit_zoom = self.image.fit_zoom(self.width(), self.height())
+        zoom = max(min(fit_zoom, 1.0) / 2, min(MAX_ZOOM, self.zoom * factor))
+        anchor = self.origin + QPointF(position) / self.zoom
+        self.zoom = zoom
+        self.origin = anchor - QPointF(position) / zoom
+        self._fitted = False
+        self.zoomChanged.emit(self.zoom)
+        self.update()
+
+    def level(self) -> int:
+        return self.image.level_for_zoom(self.zoom)
+
+    def _to_widget(self, rect) -> QRectF:
+        return QRectF((rect.x() - self.origin.x()) * self.zoom, (rect.y() - self.origin.y()) * self.zoom,
+                      rect.width() * self.zoom, rect.height() * self.zoom)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().color(QPalette.ColorRole.Window))
+        if self.image is None:
+            return
+
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        level = self.level()
+        scale = 1 << level
+        tile_span = TILE_SIZE * scale
+
+        visible = QRectF(self.origin, QSizeF(self.width() / self.zoom, self.height() / self.zoom))
+        visible = visible.intersected(QRectF(0, 0, self.image.width, self.image.height))
+        if visible.isEmpty():
+            return
+
+        cols, rows = self.image.grid(level)
+        first_col, last_col = int(visible.left() // tile_span), min(cols - 1, int(visible.right() // tile_span))
+        first_row, last_row = int(visible.top() // tile_span), min(rows - 1, int(visible.bottom() // tile_span))
+        center = visible.center() / tile_span
+
+        missing = []
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                key = (self.image.path, level, col, row)
+                rect = self.image.tile_rect(level, col, row)
+                target = self._to_widget(QRectF(rect.x() * scale, rect.y() * scale,
+                                                rect.width() * scale, rect.height() * scale))
+                tile = self.cache.get(key)
+                if tile is not None:
+                    painter.drawPixmap(target, tile, QRectF(tile.rect()))
+                else:
+                    missing.append(key)
+                    self._draw_fallback(painter, level, rect, target)
+
+        missing.sort(key=lambda key: (key[2] + 0.5 - center.x()) ** 2 + (key[3] + 0.5 - center.y()) ** 2)
+        self.loader.request(self.image, missing)
+        self._draw_boxes(painter)
+
+    def _draw_fallback(self, painter, level, rect, target):
+        for coarser in range(level + 1, self.image.levels):
+            factor = 1 << (coarser - level)
+            col, row = rect.x() // factor // TILE_SIZE, rect.y() // factor // TILE_SIZE
+            tile = self.cache.peek((self.image.path, coarser, col, row))
+            if tile is not None:
+                source = QRectF(rect.x() / factor - col * TILE_SIZE, rect.y() / factor - row * TILE_SIZE,
+                                rect.width() / factor, rect.height() / factor)
+                painter.drawPixmap(target, tile, source)
+                return
+
+    def _draw_boxes(self, painter):
+        if not self.boxes:
+            return
+
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        for class_id, x, y, w, h, _ in self.boxes:
+            color = QColor(BOX_COLORS[class_id % len(BOX_COLORS)])
+            pen = QPen(color, 2)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            rect = self._to_widget(QRectF(x, y, w, h))
+            painter.drawRect(rect)
+
+            if class_id < len(self.class_names):
+                label_rect = painter.fontMetrics().boundingRect(self.class_names[class_id]).adjusted(-3, -1, 3, 1)
+                label_rect.moveBottomLeft(rect.topLeft().toPoint())
+                painter.fillRect(label_rect, color)
+                painter.setPen(Qt.GlobalColor.white)
+                painter.drawText(label_rect, Qt.AlignmentFlag.AlignCenter, self.class_names[class_id])
+
+    def _on_tile_loaded(self, key, pixmap):
+        if self.image is not None and key[0] == self.image.path:
+            self.update()
+
+    def resizeEvent(self, event):
+        if self._fitted:
+            self.fit()
+        super().resizeEvent(event)
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        if steps:
+            self.zoom_at(event.position(), ZOOM_STEP ** steps)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_start = event.position()
+            self._drag_origin = QPointF(self.origin)
+            self.setCursor(Qt.CursorShape.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self._drag_start is not None:
+            self.origin = self._drag_origin - (event.position() - self._drag_start) / self.zoom
+            self._fitted = False
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_start = None
+            self.unsetCursor()
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit()
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        center = QPointF(self.width() / 2, self.height() / 2)
+        if key in (Qt.Key.Key_Plus, Qt.Key.Key_Equal):
+            self.zoom_at(center, ZOOM_STEP)
+        elif key == Qt.Key.Key_Minus:
+            self.zoom_at(center, 1 / ZOOM_STEP)
+        elif key == Qt.Key.Key_0:
+            self.fit()
+        elif key in (Qt.Key.Key_Right, Qt.Key.Key_PageDown, Qt.Key.Key_Space):
+            self.navigate.emit(1)
+        elif key in (Qt.Key.Key_Left, Qt.Key.Key_PageUp, Qt.Key.Key_Backspace):
+            self.navigate.emit(-1)
+        else:
+            super().keyPressEvent(event)
@@ -1,10 +1,11 @@
 import os
 import re
-import json
+from PySide6.QtGui import QPalette
 from PySide6.QtCore import *
-from datetime import datetime
 from PySide6.QtWidgets import *
 
+from app.utils.repository import ProjectRepository
+
 
 class ConfirmationDialog(QDialog):
     def __init__(self, project_name, parent=None):
@@ -47,7 +48,7 @@ class ClassDialog(QDialog):
         self.input.setPlaceholderText("Object Name (e.g. car, person)")
 
         rules_label = QLabel("Object naming rules:")
-        rules_label.setStyleSheet("font-weight: bold;")
+        rules_label.setObjectName("rulesLabel")
 
         rules_list = QLabel(
             "• Must be a single word\n"
@@ -126,7 +127,7 @@ class ProjectDialog(QDialog):
             btn_text = "Create Subproject"
 
         rules_label = QLabel(rules_title)
-        rules_label.setStyleSheet("font-weight: bold;")
+        rules_label.setObjectName("rulesLabel")
 
         layout.addWidget(self.input)
         layout.addSpacing(10)
@@ -168,8 +169,9 @@ class ProjectDialog(QDialog):
 
 
 class ProjectsPage(QWidget):
-    def __init__(self):
+    def __init__(self, repository=None):
         super().__init__()
+        self.repository = repository if repository is not None else ProjectRepository()
         self.current_project = None
         self.current_subproject = None
         self.current_panel = None
@@ -192,34 +194,24 @@ class ProjectsPage(QWidget):
         self.classes_edit_btn = None
         self.classes_delete_btn = None
 
+        self._loaded = False
         self.setup_ui()
-        self.load_projects()
+
+        self.repository.projectsChanged.connect(self.load_projects)
+        self.repository.projectChanged.connect(self._on_project_changed)
+        self.repository.subprojectChanged.connect(self._on_subproject_changed)
+
+    def showEvent(self, event):
+        if not self._loaded:
+            self._loaded = True
+            QTimer.singleShot(0, self.load_projects)
+        super().showEvent(event)
 
     def setup_ui(self):
         main_layout = QVBoxLayout()
         main_layout.setContentsMargins(20, 20, 20, 20)
         main_layout.setSpacing(20)
 
-        self.setStyleSheet("""
-            ProjectsPage {
-                background-color: #f0f0f0;
-            }
-            QListWidget {
-                background-color: white;
-                border: 1px solid #e0e0e0;
-                border-radius: 0 0 8px 8px;
-                padding: 5px;
-            }
-            QListWidget::item {
-                border-bottom: 1px solid #f0f0f0;
-                padding: 5px;
-            }
-            QListWidget::item:selected {
-                background-color: #e0e0e0;
-                color: black;
-            }
-        """)
-
         top_section = QHBoxLayout()
         top_section.setSpacing(20)
 
@@ -237,57 +229,40 @@ class ProjectsPage(QWidget):
     def _create_panel(self, title):
         container = QFrame()
         container.setObjectName("panelContainer")
-        container.setStyleSheet("""
-            QFrame#panelContainer {
-                background-color: #ffffff;
-                border-radius: 8px;
-                border: 1px solid #e0e0e0;
-            }
-        """)
 
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
         layout.setSpacing(0)
 
         header = QFrame()
-        header.setStyleSheet("""
-            QFrame {
-                background-color: #ffffff;
-                border-top-left-radius: 8px;
-                border-top-right-radius: 8px;
-                border-bottom: 1px solid #e0e0e0;
-            }
-        """)
+        header.setObjectName("panelHeader")
         header_layout = QHBoxLayout()
         header_layout.setContentsMargins(12, 8, 12, 8)
         header_layout.setSpacing(8)
 
         title_label = QLabel(title)
-        title_label.setStyleSheet("""
-            QLabel {
-                font-size: 14px;
-                font-weight: bold;
-                color: #333333;
-            }
-        """)
+        title_label.setObjectName("panelTitle")
         header_layout.addWidget(title_label)
 
         header_layout.addSpacerItem(QSpacerItem(0, 0, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum))
 
         btn_add = QPushButton("+")
         btn_add.setToolTip("Add")
-        btn_add.setStyleSheet(self._get_button_style("#4CAF50", "#3e8e41", "#43A047"))
+        btn_add.setObjectName("iconButton")
+        btn_add.setProperty("variant", "add")
         btn_add.setCursor(Qt.CursorShape.PointingHandCursor)
 
         btn_edit = QPushButton("✎")
         btn_edit.setToolTip("Edit")
-        btn_edit.setStyleSheet(self._get_button_style("#2196F3", "#0b7dda", "#0b7dda"))
+        btn_edit.setObjectName("iconButton")
+        btn_edit.setProperty("variant", "edit")
         btn_edit.setCursor(Qt.CursorShape.PointingHandCursor)
         btn_edit.setEnabled(False)
 
         btn_delete = QPushButton("×")
         btn_delete.setToolTip("Delete")
-        btn_delete.setStyleSheet(self._get_button_style("#f44336", "#d32f2f", "#d32f2f"))
+        btn_delete.setObjectName("iconButton")
+        btn_delete.setProperty("variant", "delete")
         btn_delete.setCursor(Qt.CursorShape.PointingHandCursor)
         btn_delete.setEnabled(False)
 
@@ -327,6 +302,7 @@ class ProjectsPage(QWidget):
         scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
 
         list_widget = QListWidget()
+        list_widget.setObjectName("projectList")
         list_widget.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         list_widget.itemClicked.connect(lambda item: self._on_item_clicked(item, title))
 
@@ -343,27 +319,6 @@ class ProjectsPage(QWidget):
         container.setLayout(layout)
         return container
 
-    def _get_button_style(self, normal_color, border_color, hover_color):
-        return f"""
-            QPushButton {{
-                background-color: {normal_color};
-                color: white;
-                border: 1px solid {border_color};
-                min-width: 24px;
-                max-width: 24px;
-                min-height: 24px;
-                max-height: 24px;
-                border-radius: 4px;
-            }}
-            QPushButton:hover {{
-                background-color: {hover_color};
-            }}
-            QPushButton:disabled {{
-                background-color: #cccccc;
-                border: 1px solid #aaaaaa;
-            }}
-        """
-
     def _on_item_clicked(self, item, panel_type):
         name = item.text()
 
@@ -382,6 +337,8 @@ class ProjectsPage(QWidget):
             self.classes_edit_btn.setEnabled(False)
             self.classes_delete_btn.setEnabled(False)
 
+            self.subprojects_list.clear()
+            self.classes_list.clear()
             self.load_subprojects(name)
 
         elif panel_type == "Subprojects":
@@ -397,6 +354,7 @@ class ProjectsPage(QWidget):
             self.classes_edit_btn.setEnabled(False)
             self.classes_delete_btn.setEnabled(False)
 
+            self.classes_list.clear()
             self.load_classes(self.current_project, name)
 
         else:
@@ -445,7 +403,7 @@ class ProjectsPage(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             project_name = dialog.input.text().strip()
             if project_name:
-                self._save_project(project_name)
+                self.repository.create_project(project_name)
                 self.load_projects()
 
     def _edit_project(self):
@@ -456,7 +414,7 @@ class ProjectsPage(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             new_name = dialog.input.text().strip()
             if new_name and new_name != self.current_project:
-                self._rename_project(self.current_project, new_name)
+                self.repository.rename_project(self.current_project, new_name)
                 self.load_projects()
                 self._clear_selection()
 
@@ -471,7 +429,7 @@ class ProjectsPage(QWidget):
                 QMessageBox.warning(self, "Invalid Name", "Project name does not match!")
                 return
 
-            self._remove_project(self.current_project)
+            self.repository.remove_project(self.current_project)
             self.load_projects()
             self.subprojects_list.clear()
             self.classes_list.clear()
@@ -485,7 +443,7 @@ class ProjectsPage(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             name = dialog.input.text().strip()
             if name:
-                self._save_subproject(self.current_project, name)
+                self.repository.create_subproject(self.current_project, name)
                 self.load_subprojects(self.current_project)
 
     def _edit_subproject(self):
@@ -496,7 +454,7 @@ class ProjectsPage(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             new_name = dialog.input.text().strip()
             if new_name and new_name != self.current_subproject:
-                self._rename_subproject(self.current_project, self.current_subproject, new_name)
+                self.repository.rename_subproject(self.current_project, self.current_subproject, new_name)
                 self.load_subprojects(self.current_project)
                 self.current_subproject = new_name
 
@@ -512,7 +470,7 @@ class ProjectsPage(QWidget):
         confirm_dialog.setDefaultButton(QMessageBox.StandardButton.No)
 
         if confirm_dialog.exec() == QMessageBox.StandardButton.Yes:
-            self._remove_subproject(self.current_project, self.current_subproject)
+            self.repository.remove_subproject(self.current_project, self.current_subproject)
             self.load_subprojects(self.current_project)
             self.current_subproject = None
             self.classes_list.clear()
@@ -527,7 +485,7 @@ class ProjectsPage(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             class_name = dialog.input.text().strip()
             if class_name:
-                self._save_class(self.current_project, self.current_subproject, class_name)
+                self.repository.add_class(self.current_project, self.current_subproject, class_name)
                 self.load_classes(self.current_project, self.current_subproject)
 
     def _edit_class(self):
@@ -546,7 +504,7 @@ class ProjectsPage(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             new_name = dialog.input.text().strip()
             if new_name and new_name != old_name:
-                self._rename_class(self.current_project, self.current_subproject, old_name, new_name)
+                self.repository.rename_class(self.current_project, self.current_subproject, old_name, new_name)
                 self.load_classes(self.current_project, self.current_subproject)
 
     def _delete_class(self):
@@ -567,255 +525,60 @@ class ProjectsPage(QWidget):
         )
 
         if confirm == QMessageBox.StandardButton.Yes:
-            self._remove_class(self.current_project, self.current_subproject, class_name)
+            self.repository.remove_class(self.current_project, self.current_subproject, class_name)
             self.load_classes(self.current_project, self.current_subproject)
 
-    def _save_project(self, name):
-        os.makedirs("data", exist_ok=True)
-        project_path = os.path.join("data", name)
-        os.makedirs(project_path, exist_ok=True)
-
-        meta = {
-            "name": name,
-            "type": "project",
-            "created": datetime.now().isoformat(),
-            "modified": datetime.now().isoformat(),
-            "subprojects": []
-        }
-
-        with open(os.path.join(project_path, "meta.json"), "w", encoding='utf-8') as f:
-            json.dump(meta, f, indent=2)  # type: ignore
-
-    def _rename_project(self, old_name, new_name):
-        old_path = os.path.join("data", old_name)
-        new_path = os.path.join("data", new_name)
-
-        if os.path.exists(old_path):
-            os.rename(old_path, new_path)
-
-            meta_path = os.path.join(new_path, "meta.json")
-            if os.path.exists(meta_path):
-                with open(meta_path, "r", encoding='utf-8') as f:
-                    meta = json.load(f)
-                meta["name"] = new_name
-                meta["modified"] = datetime.now().isoformat()
-                with open(meta_path, "w", encoding='utf-8') as f:
-                    json.dump(meta, f, indent=2)  # type: ignore
-
-    def _remove_project(self, name):
-        project_path = os.path.join("data", name)
-        if os.path.exists(project_path):
-            import shutil
-            shutil.rmtree(project_path)
-
-    def _save_subproject(self, project_name, subproject_name):
-        project_path = os.path.join("data", project_name)
-        os.makedirs(project_path, exist_ok=True)
-
-        subprojects_path = os.path.join(project_path, "subprojects")
-        os.makedirs(subprojects_path, exist_ok=True)
-
-        subproject_path = os.path.join(subprojects_path, subproject_name)
-        os.makedirs(subproject_path, exist_ok=True)
-
-        meta_path = os.path.join(project_path, "meta.json")
-        meta = {
-            "name": project_name,
-            "type": "project",
-            "modified": datetime.now().isoformat(),
-            "subprojects": []
-        }
-
-        if os.path.exists(meta_path):
-            with open(meta_path, "r", encoding='utf-8') as f:
-                meta = json.load(f)
-
-        if subproject_name not in meta["subprojects"]:
-            meta["subprojects"].append(subproject_name)
-            meta["modified"] = datetime.now().isoformat()
-
-            with open(meta_path, "w", encoding='utf-8') as f:
-                json.dump(meta, f, indent=2)  # type: ignore
-
-        sub_meta = {
-            "name": subproject_name,
-            "type": "subproject",
-            "project": project_name,
-            "created": datetime.now().isoformat(),
-            "modified": datetime.now().isoformat(),
-            "classes": []
-        }
-
-        with open(os.path.join(subproject_path, "meta.json"), "w", encoding='utf-8') as f:
-            json.dump(sub_meta, f, indent=2)  # type: ignore
-
-    def _rename_subproject(self, project_name, old_name, new_name):
-        project_path = os.path.join("data", project_name)
-        subprojects_path = os.path.join(project_path, "subprojects")
-
-        old_path = os.path.join(subprojects_path, old_name)
-        new_path = os.path.join(subprojects_path, new_name)
-
-        if os.path.exists(old_path):
-            os.rename(old_path, new_path)
-
-            meta_path = os.path.join(project_path, "meta.json")
-            if os.path.exists(meta_path):
-                with open(meta_path, "r", encoding='utf-8') as f:
-                    meta = json.load(f)
-
-                if old_name in meta["subprojects"]:
-                    index = meta["subprojects"].index(old_name)
-                    meta["subprojects"][index] = new_name
-                    meta["modified"] = datetime.now().isoformat()
-
-                    with open(meta_path, "w", encoding='utf-8') as f:
-                        json.dump(meta, f, indent=2)  # type: ignore
-
-            sub_meta_path = os.path.join(new_path, "meta.json")
-            if os.path.exists(sub_meta_path):
-                with open(sub_meta_path, "r", encoding='utf-8') as f:
-                    sub_meta = json.load(f)
-
-                sub_meta["name"] = new_name
-                sub_meta["modified"] = datetime.now().isoformat()
-
-                with open(sub_meta_path, "w", encoding='utf-8') as f:
-                    json.dump(sub_meta, f, indent=2)  # type: ignore
-
-    def _remove_subproject(self, project_name, subproject_name):
-        project_path = os.path.join("data", project_name)
-        subproject_path = os.path.join(project_path, "subprojects", subproject_name)
-
-        if os.path.exists(subproject_path):
-            import shutil
-            shutil.rmtree(subproject_path)
-
-            meta_path = os.path.join(project_path, "meta.json")
-            if os.path.exists(meta_path):
-                with open(meta_path, "r", encoding='utf-8') as f:
-                    meta = json.load(f)
-
-                if subproject_name in meta["subprojects"]:
-                    meta["subprojects"].remove(subproject_name)
-                    meta["modified"] = datetime.now().isoformat()
-
-                    with open(meta_path, "w", encoding='utf-8') as f:
-                        json.dump(meta, f, indent=2)  # type: ignore
-
-    def _save_class(self, project_name, subproject_name, class_name):
-        subproject_path = os.path.join("data", project_name, "subprojects", subproject_name)
-        os.makedirs(subproject_path, exist_ok=True)
-
-        meta_path = os.path.join(subproject_path, "meta.json")
-        meta = {
-            "name": subproject_name,
-            "type": "subproject",
-            "project": project_name,
-            "modified": datetime.now().isoformat(),
-            "classes": []
-        }
-
-        if os.path.exists(meta_path):
-            with open(meta_path, "r", encoding='utf-8') as f:
-                meta = json.load(f)
-
-        if class_name not in meta["classes"]:
-            meta["classes"].append(class_name)
-            meta["modified"] = datetime.now().isoformat()
-
-            with open(meta_path, "w", encoding='utf-8') as f:
-                json.dump(meta, f, indent=2)  # type: ignore
-
-    def _rename_class(self, project_name, subproject_name, old_name, new_name):
-        subproject_path = os.path.join("data", project_name, "subprojects", subproject_name)
-        meta_path = os.path.join(subproject_path, "meta.json")
-
-        if os.path.exists(meta_path):
-            with open(meta_path, "r", encoding='utf-8') as f:
-                meta = json.load(f)
-
-            if old_name in meta["classes"]:
-                index = meta["classes"].index(old_name)
-                meta["classes"][index] = new_name
-                meta["modified"] = datetime.now().isoformat()
-
-                with open(meta_path, "w", encoding='utf-8') as f:
-                    json.dump(meta, f, indent=2)  # type: ignore
-
-    def _remove_class(self, project_name, subproject_name, class_name):
-        subproject_path = os.path.join("data", project_name, "subprojects", subproject_name)
-        meta_path = os.path.join(subproject_path, "meta.json")
-
-        if os.path.exists(meta_path):
-            with open(meta_path, "r", encoding='utf-8') as f:
-                meta = json.load(f)
-
-            if class_name in meta["classes"]:
-                meta["classes"].remove(class_name)
-                meta["modified"] = datetime.now().isoformat()
-
-                with open(meta_path, "w", encoding='utf-8') as f:
-                    json.dump(meta, f, indent=2)  # type: ignore
+    def _on_project_changed(self, project_name):
+        if project_name == self.current_project:
+            self.load_subprojects(project_name)
+
+    def _on_subproject_changed(self, project_name, subproject_name):
+        if project_name == self.current_project and subproject_name == self.current_subproject:
+            self.load_classes(project_name, subproject_name)
+
+    @staticmethod
+    def _sync_list(list_widget, names):
+        wanted = set(names)
+        for row in reversed(range(list_widget.count())):
+            if list_widget.item(row).text() not in wanted:
+                list_widget.takeItem(row)
+
+        for position, name in enumerate(names):
+            if position < list_widget.count() and list_widget.item(position).text() == name:
+                continue
+
+            matches = list_widget.findItems(name, Qt.MatchFlag.MatchExactly)
+            if matches:
+                item = list_widget.takeItem(list_widget.row(matches[0]))
+            else:
+                item = QListWidgetItem(name)
+                item.setSizeHint(QSize(0, 40))
+            list_widget.insertItem(position, item)
 
     def load_projects(self):
-        self.projects_list.clear()
-
-        if not os.path.exists("data"):
-            return
-
-        for item in os.listdir("data"):
-            item_path = os.path.join("data", item)
-            if os.path.isdir(item_path):
-                meta_path = os.path.join(item_path, "meta.json")
-                if os.path.exists(meta_path):
-                    try:
-                        with open(meta_path, "r", encoding='utf-8') as f:
-                            meta = json.load(f)
-                            if meta.get("type") == "project":
-                                item = QListWidgetItem(meta["name"])
-                                item.setSizeHint(QSize(0, 40))
-                                self.projects_list.addItem(item)
-                    except json.JSONDecodeError:
-                        continue
+        names = [project['name'] for project in self.repository.projects()]
+        self._sync_list(self.projects_list, names)
 
     def load_subprojects(self, project_name):
-        self.subprojects_list.clear()
-        self.classes_list.clear()
-
         if not project_name:
+            self.subprojects_list.clear()
             return
 
-        project_path = os.path.join("data", project_name)
-        meta_path = os.path.join(project_path, "meta.json")
-
-        if os.path.exists(meta_path):
-            try:
-                with open(meta_path, "r", encoding='utf-8') as f:
-                    meta = json.load(f)
-                    for subproject in meta.get("subprojects", []):
-                        item = QListWidgetItem(subproject)
-                        item.setSizeHint(QSize(0, 40))
-                        self.subprojects_list.addItem(item)
-            except json.JSONDecodeError:
-                return
+        subprojects = self.repository.subprojects(project_name)
+        self._sync_list(self.subprojects_list, [subproject['name'] for subproject in subprojects])
 
-    def load_classes(self, project_name, subproject_name):
-        self.classes_list.clear()
+        for row, subproject in enumerate(subprojects):
+            item = self.subprojects_list.item(row)
+            if subproject['exists']:
+                item.setData(Qt.ItemDataRole.ForegroundRole, None)
+                item.setToolTip("")
+            else:
+                item.setForeground(self.subprojects_list.palette().color(QPalette.ColorGroup.Disabled,
+                                                                         QPalette.ColorRole.Text))
+                item.setToolTip(f"Folder {subproject['path']} is missing")
 
+    def load_classes(self, project_name, subproject_name):
         if not project_name or not subproject_name:
+            self.classes_list.clear()
             return
-
-        subproject_path = os.path.join("data", project_name, "subprojects", subproject_name)
-        meta_path = os.path.join(subproject_path, "meta.json")
-
-        if os.path.exists(meta_path):
-            try:
-                with open(meta_path, "r", encoding='utf-8') as f:
-                    meta = json.load(f)
-                    for class_name in meta.get("classes", []):
-                        item = QListWidgetItem(class_name)
-                        item.setSizeHint(QSize(0, 40))
-                        self.classes_list.addItem(item)
-            except json.JSONDecodeError:
-                return
+        self._sync_list(self.classes_list, self.repository.classes(project_name, subproject_name))
@@ -1,12 +1,28 @@
 from PySide6.QtWidgets import *
 
+from app.utils.theme import ThemeManager
+
 
 class SettingsPage(QWidget):
-    def __init__(self):
+    def __init__(self, theme=None):
         super().__init__()
+        self.theme = theme if theme is not None else ThemeManager(parent=self)
         self.setup_ui()
 
     def setup_ui(self):
         layout = QVBoxLayout()
         layout.setContentsMargins(20, 20, 20, 20)
+
+        form = QFormLayout()
+        self.theme_combo = QComboBox()
+        for name, label in self.theme.themes():
+            self.theme_combo.addItem(label, name)
+        self.theme_combo.setCurrentIndex(max(0, self.theme_combo.findData(self.theme.current)))
+        self.theme_combo.currentIndexChanged.connect(
+            lambda index: self.theme.apply(self.theme_combo.itemData(index))
+        )
+        form.addRow("Theme:", self.theme_combo)
+
+        layout.addLayout(form)
+        layout.addStretch()
         self.setLayout(layout)
@@ -1,12 +1,306 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout
+import os
+
+from PySide6.QtGui import *
+from PySide6.QtCore import *
+from PySide6.QtWidgets import *
+
+from app.utils.annotations import AnnotationStore
+from app.utils.logger import log
+from app.utils.stats import ASPECT_LIMIT, SIZE_BINS, SubprojectStats, annotation_stamp, merge_snapshots
+from app.utils.tracing import span
+
+
+REFRESH_DELAY_MS = 500
+ALL_SUBPROJECTS = None
+
+
+class _StatsSignals(QObject):
+    ready = Signal(int, object)
+
+
+class _StatsTask(QRunnable):
+    # Emits the stored aggregates first, then rebuilds stale subprojects and emits again.
+    def __init__(self, subprojects, generation, signals):
+        super().__init__()
+        self.subprojects = subprojects
+        self.generation = generation
+        self.signals = signals
+
+    def run(self):
+        try:
+            snapshots = self._snapshots()
+            merged = merge_snapshots(snapshots)
+            self.signals.ready.emit(self.generation, merged)
+            if merged['current']:
+                return
+
+            for name, path, _ in self.subprojects:
+                stats = SubprojectStats(path)
+                try:
+                    if not stats.is_current():
+                        stamp = annotation_stamp(stats.annotations_path)
+                        annotations = AnnotationStore(path)
+                        try:
+                            with span("stats.rebuild", "stats", subproject=name):
+                                stats.rebuild(annotations, stamp)
+                        finally:
+                            annotations.close()
+                finally:
+                    stats.close()
+            self.signals.ready.emit(self.generation, merge_snapshots(self._snapshots()))
+        except Exception as e:
+            log("ERROR", f"Failed to compute statistics: {str(e)}")
+            self.signals.ready.emit(self.generation, None)
+
+    def _snapshots(self):
+        snapshots = []
+        for name, path, classes in self.subprojects:
+            stats = SubprojectStats(path)
+            try:
+                snapshots.append((name, stats.snapshot(classes)))
+            finally:
+                stats.close()
+        return snapshots
+
+
+class HistogramWidget(QWidget):
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.bins = []
+        self.setMinimumHeight(160)
+
+    def set_bins(self, bins):
+        # bins: (label, count) pairs in display order
+        self.bins = list(bins)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        palette = self.palette()
+        metrics = painter.fontMetrics()
+        painter.setPen(palette.color(QPalette.ColorRole.WindowText))
+        painter.drawText(QRect(0, 0, self.width(), metrics.height()), Qt.AlignmentFlag.AlignLeft, self.title)
+        if not self.bins:
+            return
+
+        top, bottom = metrics.height() + 6, self.height() - metrics.height() - 4
+        peak = max(count for _, count in self.bins) or 1
+        width = self.width() / len(self.bins)
+        for position, (label, count) in enumerate(self.bins):
+            height = (bottom - top) * count / peak
+            bar = QRectF(position * width + 2, bottom - height, max(1.0, width - 4), height)
+            painter.fillRect(bar, palette.color(QPalette.ColorRole.Highlight))
+            painter.setPen(palette.color(QPalette.ColorRole.WindowText))
+            painter.drawText(QRectF(position * width, bottom + 2, width, metrics.height()),
+                             Qt.AlignmentFlag.AlignCenter, label)
+
+    def event(self, event):
+        if event.type() == QEvent.Type.ToolTip:
+            if self.bins:
+                position = min(len(self.bins) - 1, int(event.position().x() * len(self.bins) / max(1, self.width())))
+                label, count = self.bins[position]
+                QToolTip.showText(event.globalPosition().toPoint(), f"{label}: {count}", self)
+            return True
+        return super().event(event)
 
 
 class StatsPage(QWidget):
-    def __init__(self):
+    def __init__(self, repository=None):
         super().__init__()
+        self.repository = repository
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._generation = 0
+        self._loaded = False
+
+        self._signals = _StatsSignals()
+        self._signals.ready.connect(self._on_ready)
+
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self.refresh)
+
         self.setup_ui()
 
+        if self.repository is not None:
+            self.repository.projectsChanged.connect(self._on_projects_changed)
+            self.repository.projectChanged.connect(self._on_project_changed)
+            self.repository.subprojectChanged.connect(self._on_subproject_changed)
+            self.repository.folderChanged.connect(
+                lambda project, subproject, folder: self._on_subproject_changed(project, subproject))
+
     def setup_ui(self):
         layout = QVBoxLayout()
         layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(15)
+
+        title = QLabel("Statistics")
+        title.setObjectName("pageTitle")
+        layout.addWidget(title)
+
+        controls = QHBoxLayout()
+        self.project_combo = QComboBox()
+        self.project_combo.setMinimumWidth(200)
+        self.project_combo.currentIndexChanged.connect(self._populate_subprojects)
+        self.subproject_combo = QComboBox()
+        self.subproject_combo.setMinimumWidth(200)
+        self.subproject_combo.currentIndexChanged.connect(self._schedule_refresh)
+        self.status_label = QLabel()
+
+        controls.addWidget(QLabel("Project:"))
+        controls.addWidget(self.project_combo)
+        controls.addWidget(QLabel("Subproject:"))
+        controls.addWidget(self.subproject_combo)
+        controls.addWidget(self.status_label)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        tables = QHBoxLayout()
+        self.folder_table = self._create_table(["Folder", "Images", "Annotated", "Pending", "Boxes"])
+        self.class_table = self._create_table(["Class", "Instances", "Images"])
+        tables.addWidget(self.folder_table, 3)
+        tables.addWidget(self.class_table, 2)
+        layout.addLayout(tables, 1)
+
+        histograms = QHBoxLayout()
+        self.size_histogram = HistogramWidget("Box size (px, square root of area)")
+        self.aspect_histogram = HistogramWidget("Box aspect ratio (width : height)")
+        histograms.addWidget(self.size_histogram)
+        histograms.addWidget(self.aspect_histogram)
+        layout.addLayout(histograms)
+
         self.setLayout(layout)
+
+    @staticmethod
+    def _create_table(headers):
+        table = QTableWidget(0, len(headers))
+        table.setObjectName("statsTable")
+        table.setHorizontalHeaderLabels(headers)
+        table.setAlternatingRowColors(True)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        table.setSortingEnabled(True)
+        return table
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._loaded:
+            self._loaded = True
+            QTimer.singleShot(0, self._populate_projects)
+        else:
+            self._schedule_refresh()
+
+    def _populate_projects(self):
+        if self.repository is None:
+            return
+        current = self.project_combo.currentData()
+        self.project_combo.blockSignals(True)
+        self.project_combo.clear()
+        for project in self.repository.projects():
+            self.project_combo.addItem(project['name'], os.path.basename(project['path']))
+        self.project_combo.setCurrentIndex(max(0, self.project_combo.findData(current)))
+        self.project_combo.blockSignals(False)
+        self._populate_subprojects()
+
+    def _populate_subprojects(self):
+        current = self.subproject_combo.currentData()
+        self.subproject_combo.blockSignals(True)
+        self.subproject_combo.clear()
+        self.subproject_combo.addItem("All subprojects", ALL_SUBPROJECTS)
+        for subproject in self._subprojects():
+            self.subproject_combo.addItem(subproject['name'], subproject['name'])
+        self.subproject_combo.setCurrentIndex(max(0, self.subproject_combo.findData(current)))
+        self.subproject_combo.blockSignals(False)
+        self.refresh()
+
+    def _subprojects(self) -> list[dict]:
+        project = self.project_combo.currentData()
+        if self.repository is None or not project:
+            return []
+        return [subproject for subproject in self.repository.subprojects(project) if subproject['exists']]
+
+    def _schedule_refresh(self):
+        if self.isVisible():
+            self._refresh_timer.start()
+
+    def refresh(self):
+        self._refresh_timer.stop()
+        project = self.project_combo.currentData()
+        selected = self.subproject_combo.currentData()
+        subprojects = [(subproject['name'], subproject['path'], self.repository.classes(project, subproject['name']))
+                       for subproject in self._subprojects()
+                       if selected is ALL_SUBPROJECTS or subproject['name'] == selected]
+
+        self._generation += 1
+        if not subprojects:
+            self._show(None)
+            return
+        self.status_label.setText("Loading...")
+        self.pool.start(_StatsTask(subprojects, self._generation, self._signals))
+
+    def _on_ready(self, generation, snapshot):
+        if generation != self._generation:
+            return
+        self._show(snapshot)
+
+    def _show(self, snapshot):
+        if snapshot is None:
+            snapshot = merge_snapshots([])
+        self.status_label.setText("" if snapshot['current'] else "Updating...")
+
+        pending = max(0, snapshot['images'] - snapshot['annotated'])
+        self.summary_label.setText(f"{snapshot['images']} images · {snapshot['annotated']} annotated · "
+                                   f"{pending} pending · {snapshot['boxes']} boxes · "
+                                   f"{len(snapshot['classes'])} classes")
+
+        self._fill_table(self.folder_table, [(folder, images, annotated, max(0, images - annotated), boxes)
+                                             for folder, images, annotated, boxes in snapshot['folders']])
+        self._fill_table(self.class_table, [(name, instances, images)
+                                            for name, (instances, images) in snapshot['classes'].items()])
+
+        sizes, aspects = snapshot['sizes'], snapshot['aspects']
+        self.size_histogram.set_bins([(f"{1 << index}", sizes.get(index, 0))
+                                      for index in range(SIZE_BINS)] if sizes else [])
+        self.aspect_histogram.set_bins([(self._aspect_label(index), aspects.get(index, 0))
+                                        for index in range(-ASPECT_LIMIT, ASPECT_LIMIT + 1)] if aspects else [])
+
+    @staticmethod
+    def _aspect_label(index) -> str:
+        ratio = 2 ** (abs(index) / 2)
+        ratio = f"{ratio:.0f}" if ratio == int(ratio) else f"{ratio:.1f}"
+        return f"{ratio}:1" if index > 0 else f"1:{ratio}" if index < 0 else "1:1"
+
+    @staticmethod
+    def _fill_table(table, rows):
+        table.setSortingEnabled(False)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem()
+                if isinstance(value, int):
+                    item.setData(Qt.ItemDataRole.DisplayRole, value)
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                else:
+                    item.setText(value)
+                table.setItem(row, column, item)
+        table.setSortingEnabled(True)
+
+    def _on_projects_changed(self):
+        if self._loaded:
+            self._populate_projects()
+
+    def _on_project_changed(self, project):
+        if self._loaded and project == self.project_combo.currentData():
+            self._populate_subprojects()
+
+    def _on_subproject_changed(self, project, subproject):
+        selected = self.subproject_combo.currentData()
+        if project == self.project_combo.currentData() and selected in (ALL_SUBPROJECTS, subproject):
+            self._schedule_refresh()
@@ -0,0 +1,214 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+from collections import Counter
+
+from app.utils.logger import log
+from app.utils.meta_store import atomic_write_bytes
+
+
+ANNOTATIONS_FILENAME = "annotations.bin"
+MAGIC = b"DTAN"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHQQQ")
+ALIGNMENT = 8
+
+COLUMNS = (
+    ('image', 'I'),
+    ('class', 'H'),
+    ('x', 'f'),
+    ('y', 'f'),
+    ('w', 'f'),
+    ('h', 'f'),
+    ('flags', 'B')
+)
+BOX_COLUMNS = [name for name, _ in COLUMNS[1:]]
+
+FLAG_DIFFICULT = 1
+FLAG_TRUNCATED = 2
+FLAG_OCCLUDED = 4
+
+_BYTE_ORDERS = {'little': 0, 'big': 1}
+
+
+def _padded(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+# Rows are sorted by image, so the boxes of image i are rows offsets[i]:offsets[i + 1]
+# of every column. Columns are zero-copy views into the mapped file; edits stay in
+# memory until save() rewrites it.
+class AnnotationStore:
+    def __init__(self, subproject_path):
+        self.subproject_path = subproject_path
+        self.path = os.path.join(subproject_path, ANNOTATIONS_FILENAME)
+
+        self._file = None
+        self._map = None
+        self._columns = {}
+        self._offsets = array('Q', [0])
+        self._names = []
+        self._ids = {}
+        self._pending = {}
+
+        self._load()
+
+    def _load(self):
+        self._unmap()
+        self._columns = {name: array(code) for name, code in COLUMNS}
+        self._offsets = array('Q', [0])
+        self._names = []
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= HEADER.size:
+            self._file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, byte_order, _, rows, images, names_size = HEADER.unpack_from(self._map)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{self.path} is not a version {VERSION} annotation file")
+
+            view = memoryview(self._map)
+            swap = byte_order != _BYTE_ORDERS[sys.byteorder]
+            position = HEADER.size
+            for name, code in COLUMNS:
+                size = rows * array(code).itemsize
+                self._columns[name] = self._column_view(view[position:position + size], code, swap)
+                position += _padded(size)
+
+            size = (images + 1) * array('Q').itemsize
+            self._offsets = self._column_view(view[position:position + size], 'Q', swap)
+            position += size
+            self._names = bytes(view[position:position + names_size]).decode('utf-8').split('\n') if images else []
+
+        self._ids = {name: index for index, name in enumerate(self._names)}
+
+    @staticmethod
+    def _column_view(buffer, code, swap):
+        if not swap:
+            return buffer.cast(code)
+        column = array(code, bytes(buffer))
+        column.byteswap()
+        return column
+
+    def _unmap(self):
+        # Views into the map must be released before it can be closed.
+        self._columns = {}
+        self._offsets = array('Q', [0])
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                log("ANNOTATIONS", f"Column views of {self.path} are still referenced, leaving the map open")
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        if self._pending:
+            self.save()
+        self._unmap()
+
+    def __len__(self):
+        self.flush()
+        return len(self._columns['class'])
+
+    def images(self) -> list[str]:
+        self.flush()
+        return list(self._names)
+
+    def boxes(self, image) -> list[tuple[int, float, float, float, float, int]]:
+        if image in self._pending:
+            return list(self._pending[image])
+
+        index = self._ids.get(image)
+        if index is None:
+            return []
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return list(zip(*(self._columns[name][start:end] for name in BOX_COLUMNS)))
+
+    def set_boxes(self, image, boxes):
+        self._pending[image] = [(int(c), float(x), float(y), float(w), float(h), int(flags))
+                                for c, x, y, w, h, flags in boxes]
+
+    def remove_image(self, image):
+        self._pending[image] = []
+
+    def column(self, name):
+        self.flush()
+        return self._columns[name]
+
+    def row_range(self, image) -> tuple[int, int]:
+        self.flush()
+        index = self._ids.get(image)
+        if index is None:
+            return 0, 0
+        return self._offsets[index], self._offsets[index + 1]
+
+    def box_counts(self) -> dict[str, int]:
+        self.flush()
+        offsets = self._offsets
+        return {name: offsets[index + 1] - offsets[index] for index, name in enumerate(self._names)}
+
+    def class_counts(self) -> Counter:
+        return Counter(self.column('class'))
+
+    def rows_for_class(self, class_id) -> list[int]:
+        return [row for row, value in enumerate(self.column('class')) if value == class_id]
+
+    def flush(self):
+        if self._pending:
+            self.save()
+
+    def save(self):
+        # Imported here because the statistics module builds on this one.
+        from app.utils.stats import annotation_stamp, record_changes
+
+        pending, self._pending = self._pending, {}
+        changes = {name: (self.boxes(name), boxes) for name, boxes in pending.items()}
+        old_stamp = annotation_stamp(self.path)
+        names = sorted((set(self._names) | set(pending)) - {name for name, boxes in pending.items() if not boxes})
+
+        columns = {name: array(code) for name, code in COLUMNS}
+        offsets = array('Q', [0])
+        for image_id, name in enumerate(names):
+            if name in pending:
+                boxes = pending[name]
+                columns['image'].extend([image_id] * len(boxes))
+                for column, values in zip(BOX_COLUMNS, zip(*boxes)):
+                    columns[column].extend(values)
+            else:
+                index = self._ids[name]
+                start, end = self._offsets[index], self._offsets[index + 1]
+                columns['image'].extend([image_id] * (end - start))
+                for column in BOX_COLUMNS:
+                    columns[column].frombytes(self._columns[column][start:end].tobytes())
+            offsets.append(len(columns['image']))
+
+        rows = len(columns['image'])
+        names_blob = '\n'.join(names).encode('utf-8')
+        parts = [HEADER.pack(MAGIC, VERSION, _BYTE_ORDERS[sys.byteorder], 0, rows, len(names), len(names_blob))]
+        for name, _ in COLUMNS:
+            data = columns[name].tobytes()
+            parts.append(data + b"\0" * (_padded(len(data)) - len(data)))
+        parts.append(offsets.tobytes())
+        parts.append(names_blob)
+
+        self._unmap()
+        atomic_write_bytes(self.path, b"".join(parts))
+        log("ANNOTATIONS", f"Saved {rows} boxes for {len(names)} images to {self.path}")
+        self._load()
+        record_changes(self.subproject_path, changes, old_stamp, annotation_stamp(self.path))
+
+    def remove_class(self, class_id):
+        # Class ids are positions in the subproject's class list, so ids after
+        # the removed one shift down by one.
+        if not any(value >= class_id for value in self.column('class')):
+            return
+
+        for name in self._names:
+            boxes = [(c - 1 if c > class_id else c, x, y, w, h, flags)
+                     for c, x, y, w, h, flags in self.boxes(name) if c != class_id]
+            self._pending[name] = boxes
+        self.save()
@@ -0,0 +1,178 @@
+import os
+import glob
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from app.utils.logger import log
+from app.utils.meta_store import DATA_DIR
+
+
+CONTENT_INDEX_FILENAME = "content.db"
+CONTENT_INDEX_PATH = os.path.join(DATA_DIR, CONTENT_INDEX_FILENAME)
+HASH_CHUNK = 1024 * 1024
+FICLONE = 0x40049409
+
+
+def hash_file(path) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_stream_and_hash(fin, dst) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(dst, 'wb') as fout:
+        while chunk := fin.read(HASH_CHUNK):
+            digest.update(chunk)
+            fout.write(chunk)
+    return digest.hexdigest()
+
+
+def copy_and_hash(src, dst) -> str:
+    with open(src, 'rb') as fin:
+        digest = copy_stream_and_hash(fin, dst)
+    shutil.copystat(src, dst)
+    return digest
+
+
+def reflink(src, dst) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+    except OSError:
+        try:
+            os.remove(dst)
+        except FileNotFoundError:
+            pass
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def link_or_copy(src, dst, same_device) -> str:
+    if same_device:
+        if reflink(src, dst):
+            return "reflink"
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+# Content hashes of the images stored under data/. Files that are known but not hashed yet, such as
+# the images of existing subprojects or of copy and link imports, are hashed the first time an
+# imported file of the same size is looked up.
+class ContentIndex:
+    def __init__(self, path=CONTENT_INDEX_PATH):
+        self.path = path
+        self.data_dir = os.path.dirname(path) or "."
+        self._lock = threading.Lock()
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS content ("
+            "hash TEXT PRIMARY KEY, size INTEGER NOT NULL, path TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS content_size ON content(size)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pending (path TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pending_size ON pending(size)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+
+        self._sizes = set()
+        if self._conn.execute("SELECT 1 FROM state WHERE key = 'scanned'").fetchone() is None:
+            self.rescan()
+        sizes = self._conn.execute("SELECT size FROM content UNION SELECT size FROM pending")
+        self._sizes.update(row[0] for row in sizes)
+
+    def rescan(self) -> int:
+        # Imported here because the importer builds on this module.
+        from app.utils.importer import is_image_name
+
+        # Registers every image of every subproject: data/<project>/subprojects/<subproject>/images/<folder>/.
+        files = []
+        for images_dir in glob.glob(os.path.join(glob.escape(self.data_dir), "*", "subprojects", "*", "images")):
+            for folder in os.scandir(images_dir):
+                if not folder.is_dir():
+                    continue
+                for entry in os.scandir(folder.path):
+                    if is_image_name(entry.name) and entry.is_file():
+                        files.append((os.path.abspath(entry.path), entry.stat().st_size))
+        self.register(files)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('scanned', '1')")
+            self._conn.commit()
+        log("DEDUP", f"Registered {len(files)} stored images from {self.data_dir}")
+        return len(files)
+
+    def register(self, files):
+        # (path, size) of stored files, hashed only once a file of the same size is imported.
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO pending (path, size) VALUES (?, ?)", files)
+            self._sizes.update(size for _, size in files)
+
+    def has_size(self, size) -> bool:
+        with self._lock:
+            return size in self._sizes
+
+    def _hash_pending(self, size):
+        # Files are hashed outside the lock so other workers keep going; two workers looking up the
+        # same size may both hash a candidate, which only costs time.
+        with self._lock:
+            paths = [row[0] for row in self._conn.execute("SELECT path FROM pending WHERE size = ?", (size,))]
+        for path in paths:
+            digest = None
+            try:
+                if os.path.getsize(path) == size:
+                    digest = hash_file(path)
+            except OSError:
+                pass
+            with self._lock:
+                if digest is not None:
+                    self._conn.execute("INSERT OR IGNORE INTO content (hash, size, path) VALUES (?, ?, ?)",
+                                       (digest, size, path))
+                self._conn.execute("DELETE FROM pending WHERE path = ?", (path,))
+
+    def lookup(self, digest, size):
+        self._hash_pending(size)
+        with self._lock:
+            row = self._conn.execute("SELECT path, size FROM content WHERE hash = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+
+            path, stored_size = row
+            try:
+                if stored_size == size and os.path.getsize(path) == size:
+                    return path
+            except OSError:
+                pass
+
+            log("DEDUP", f"Dropping stale content entry {path}")
+            self._conn.execute("DELETE FROM content WHERE hash = ?", (digest,))
+            return None
+
+    def add(self, digest, size, path):
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO content (hash, size, path) VALUES (?, ?, ?)",
+                               (digest, size, path))
+            self._sizes.add(size)
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
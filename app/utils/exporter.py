@@ -0,0 +1,410 @@
+import os
+import json
+import time
+import shutil
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+from app.utils.annotations import FLAG_DIFFICULT, FLAG_OCCLUDED, FLAG_TRUNCATED, AnnotationStore
+from app.utils.dedup import link_or_copy
+from app.utils.image_index import ImageIndex
+from app.utils.imageinfo import oriented_size, probe
+from app.utils.importer import PROGRESS_INTERVAL, unique_folder
+from app.utils.logger import log
+from app.utils.splits import SPLITS, assign_splits
+from app.utils.tracing import span
+
+
+EXPORT_WORKERS = os.cpu_count() or 4
+EXPORT_BATCH = 256
+
+EXPORT_FORMATS = {
+    'yolo': "YOLO (txt labels and data.yaml)",
+    'coco': "COCO (instances JSON)",
+    'voc': "Pascal VOC (XML per image)"
+}
+
+YOLO_NEEDS_IMAGES = "YOLO datasets need the images next to the labels, link or copy them"
+
+EXPORT_IMAGE_MODES = {
+    'link': "Link images (reflink or hardlink on the same disk, copy otherwise)",
+    'copy': "Copy images",
+    'none': "Labels only (keep images where they are)"
+}
+
+
+def _process_batch(batch, image_mode, same_device):
+    results = []
+    for src, dst, size in batch:
+        try:
+            if size is None:
+                info = probe(src)
+                if info is None:
+                    results.append((None, "unsupported or corrupt file"))
+                    continue
+                size = oriented_size(info[1], info[2], info[4])
+            if dst is not None:
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                if image_mode == 'copy':
+                    shutil.copy2(src, dst)
+                else:
+                    link_or_copy(src, dst, same_device)
+            results.append((size, None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+class YoloWriter:
+    image_dir = "images"
+    split_images = True
+
+    def __init__(self, dest_folder, classes):
+        self.dest_folder = dest_folder
+        self.classes = classes
+        self.label_dir = os.path.join(dest_folder, "labels")
+        self.splits = set()
+
+    def add(self, image_id, relative_path, width, height, boxes, split=None):
+        if split is not None:
+            self.splits.add(split)
+            relative_path = f"{SPLITS[split]}/{relative_path}"
+        label_path = os.path.join(self.label_dir, os.path.splitext(relative_path)[0] + ".txt")
+        os.makedirs(os.path.dirname(label_path), exist_ok=True)
+        with open(label_path, 'w', encoding='utf-8') as f:
+            for class_id, x, y, w, h, _ in boxes:
+                x0, y0 = max(0.0, x), max(0.0, y)
+                x1, y1 = min(float(width), x + w), min(float(height), y + h)
+                if x1 <= x0 or y1 <= y0:
+                    continue
+                f.write(f"{class_id} {(x0 + x1) / 2 / width:.6f} {(y0 + y1) / 2 / height:.6f} "
+                        f"{(x1 - x0) / width:.6f} {(y1 - y0) / height:.6f}\n")
+
+    def finish(self):
+        lines = [f"path: {os.path.abspath(self.dest_folder)}"]
+        if self.splits:
+            # Ultralytics requires a val entry, so a dataset without one validates on train.
+            lines += [f"{name}: {self.image_dir}/{name}" for split, name in enumerate(SPLITS) if split in self.splits]
+            if SPLITS.index('val') not in self.splits:
+                lines.append(f"val: {self.image_dir}/train")
+        else:
+            lines += [f"train: {self.image_dir}", f"val: {self.image_dir}"]
+        lines.append("names:")
+        lines += [f"  {class_id}: {json.dumps(name)}" for class_id, name in enumerate(self.classes)]
+        with open(os.path.join(self.dest_folder, "data.yaml"), 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+
+    def abort(self):
+        pass
+
+
+class _CocoDocument:
+    def __init__(self, path, header):
+        self.path = path
+        self.boxes_path = path + ".boxes.tmp"
+
+        # Images and annotations are two arrays of the same document, so annotations
+        # are spooled to a side file and appended once all images are written.
+        self._images = open(path, 'w', encoding='utf-8')
+        self._boxes = open(self.boxes_path, 'w+', encoding='utf-8')
+        self._image_count = 0
+        self._box_count = 0
+        self._images.write(header)
+
+    def add(self, image_id, relative_path, width, height, boxes):
+        separator = ", " if self._image_count else ""
+        self._image_count += 1
+        self._images.write(separator + json.dumps({'id': image_id + 1, 'file_name': relative_path,
+                                                   'width': width, 'height': height}))
+        for class_id, x, y, w, h, flags in boxes:
+            separator = ", " if self._box_count else ""
+            self._box_count += 1
+            self._boxes.write(separator + json.dumps({
+                'id': self._box_count, 'image_id': image_id + 1, 'category_id': class_id + 1,
+                'bbox': [round(x, 2), round(y, 2), round(w, 2), round(h, 2)], 'area': round(w * h, 2),
+                'iscrowd': 0
+            }))
+
+    def finish(self):
+        self._images.write('], "annotations": [')
+        self._boxes.seek(0)
+        shutil.copyfileobj(self._boxes, self._images)
+        self._images.write("]}\n")
+        self.close()
+
+    def close(self):
+        self._images.close()
+        self._boxes.close()
+        if os.path.exists(self.boxes_path):
+            os.remove(self.boxes_path)
+
+
+class CocoWriter:
+    image_dir = "images"
+    split_images = True
+
+    def __init__(self, dest_folder, classes, images_root=None):
+        self.dest_folder = dest_folder
+        self.annotations_dir = os.path.join(dest_folder, "annotations")
+        os.makedirs(self.annotations_dir, exist_ok=True)
+
+        info = {'description': "Exported from DeepTag", 'date_created': time.strftime("%Y-%m-%dT%H:%M:%S")}
+        if images_root:
+            info['images_root'] = os.path.abspath(images_root)
+        categories = [{'id': class_id + 1, 'name': name, 'supercategory': ""} for class_id, name in enumerate(classes)]
+        self._header = (f'{{"info": {json.dumps(info)}, "licenses": [], '
+                        f'"categories": {json.dumps(categories)}, "images": [')
+        self._documents = {}
+
+    def add(self, image_id, relative_path, width, height, boxes, split=None):
+        # One instances file per split, with file names relative to that split's image folder
+        document = self._documents.get(split)
+        if document is None:
+            name = "instances.json" if split is None else f"instances_{SPLITS[split]}.json"
+            document = self._documents[split] = _CocoDocument(os.path.join(self.annotations_dir, name), self._header)
+        document.add(image_id, relative_path, width, height, boxes)
+
+    def finish(self):
+        for document in self._documents.values():
+            document.finish()
+
+    def abort(self):
+        for document in self._documents.values():
+            document.close()
+
+
+class VocWriter:
+    image_dir = "JPEGImages"
+    split_images = False
+
+    def __init__(self, dest_folder, classes):
+        self.dest_folder = dest_folder
+        self.classes = classes
+        self.annotation_dir = os.path.join(dest_folder, "Annotations")
+        self.sets_dir = os.path.join(dest_folder, "ImageSets", "Main")
+        os.makedirs(self.sets_dir, exist_ok=True)
+        self._image_sets = {}
+
+    def add(self, image_id, relative_path, width, height, boxes, split=None):
+        stem = os.path.splitext(relative_path)[0]
+        objects = []
+        for class_id, x, y, w, h, flags in boxes:
+            name = self.classes[class_id] if class_id < len(self.classes) else str(class_id)
+            objects.append(
+                f"  <object>\n"
+                f"    <name>{escape(name)}</name>\n"
+                f"    <truncated>{int(bool(flags & FLAG_TRUNCATED))}</truncated>\n"
+                f"    <occluded>{int(bool(flags & FLAG_OCCLUDED))}</occluded>\n"
+                f"    <difficult>{int(bool(flags & FLAG_DIFFICULT))}</difficult>\n"
+                f"    <bndbox>\n"
+                f"      <xmin>{round(x) + 1}</xmin>\n"
+                f"      <ymin>{round(y) + 1}</ymin>\n"
+                f"      <xmax>{round(x + w)}</xmax>\n"
+                f"      <ymax>{round(y + h)}</ymax>\n"
+                f"    </bndbox>\n"
+                f"  </object>\n"
+            )
+
+        path = os.path.join(self.annotation_dir, stem + ".xml")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(
+                f"<annotation>\n"
+                f"  <folder>{escape(os.path.dirname(relative_path))}</folder>\n"
+                f"  <filename>{escape(os.path.basename(relative_path))}</filename>\n"
+                f"  <size>\n"
+                f"    <width>{width}</width>\n"
+                f"    <height>{height}</height>\n"
+                f"    <depth>3</depth>\n"
+                f"  </size>\n"
+                f"  <segmented>0</segmented>\n"
+                f"{''.join(objects)}"
+                f"</annotation>\n"
+            )
+        image_set = self._image_sets.get(split)
+        if image_set is None:
+            name = "default.txt" if split is None else f"{SPLITS[split]}.txt"
+            image_set = self._image_sets[split] = open(os.path.join(self.sets_dir, name), 'w', encoding='utf-8')
+        image_set.write(stem + "\n")
+
+    def finish(self):
+        for image_set in self._image_sets.values():
+            image_set.close()
+
+    def abort(self):
+        self.finish()
+
+
+class ExportJob:
+    def __init__(self, subproject_path, classes, output_dir, fmt='yolo', image_mode='link', workers=EXPORT_WORKERS,
+                 ratios=None, seed=0, group_by_folder=True):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if image_mode not in EXPORT_IMAGE_MODES:
+            raise ValueError(f"Unknown image mode: {image_mode}")
+        if fmt == 'yolo' and image_mode == 'none':
+            # YOLO finds each label by swapping images/ for labels/ in the image path.
+            raise ValueError(YOLO_NEEDS_IMAGES)
+        self.source = subproject_path
+        self.classes = list(classes)
+        self.output_dir = output_dir
+        self.format = fmt
+        self.mode = image_mode
+        self.workers = workers
+        self.ratios = ratios
+        self.seed = seed
+        self.group_by_folder = group_by_folder
+        self.dest_folder = None
+        self._cancelled = threading.Event()
+        self._progress = None
+        self._last_report = 0.0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _create_writer(self):
+        if self.format == 'yolo':
+            return YoloWriter(self.dest_folder, self.classes)
+        if self.format == 'coco':
+            images_root = os.path.join(self.source, 'images') if self.mode == 'none' else None
+            return CocoWriter(self.dest_folder, self.classes, images_root)
+        return VocWriter(self.dest_folder, self.classes)
+
+    def run(self, progress=None) -> dict:
+        self._progress = progress
+        started = time.monotonic()
+        summary = {
+            'source': self.source,
+            'dest_folder': None,
+            'format': self.format,
+            'total': 0,
+            'exported': 0,
+            'boxes': 0,
+            'bytes': 0,
+            'failed': [],
+            'splits': None,
+            'cancelled': False,
+            'seconds': 0.0
+        }
+
+        index = ImageIndex(self.source)
+        annotations = AnnotationStore(self.source)
+        try:
+            self._report("scan", 0, 0, 0, force=True)
+            index.refresh()
+            index.update_info()
+            summary['total'] = index.image_count()
+
+            if self.ratios is not None:
+                self._report("split", 0, summary['total'], 0, force=True)
+                with span("export.split", "export", images=summary['total']):
+                    result = assign_splits(self.source, self.ratios, self.seed, self.group_by_folder,
+                                           index=index, annotations=annotations)
+                summary['splits'] = result['counts']
+
+            os.makedirs(self.output_dir, exist_ok=True)
+            name = f"{os.path.basename(os.path.normpath(self.source))}_{self.format}"
+            self.dest_folder = unique_folder(self.output_dir, name)
+            os.makedirs(self.dest_folder)
+            summary['dest_folder'] = self.dest_folder
+
+            log("EXPORT", f"Exporting {summary['total']} images from {self.source} to {self.dest_folder} "
+                          f"({self.format}, images: {self.mode}, {self.workers} workers)")
+            writer = self._create_writer()
+            try:
+                with span("export.write", "export", format=self.format, images=summary['total']):
+                    self._export_all(index, annotations, writer, summary)
+            except BaseException:
+                writer.abort()
+                raise
+            if self.cancelled:
+                writer.abort()
+            else:
+                writer.finish()
+        finally:
+            annotations.close()
+            index.close()
+
+        if self.cancelled:
+            summary['cancelled'] = True
+            if self.dest_folder:
+                shutil.rmtree(self.dest_folder, ignore_errors=True)
+                log("EXPORT", f"Export cancelled, removed partial folder {self.dest_folder}")
+
+        summary['seconds'] = time.monotonic() - started
+        log("EXPORT", f"Finished: {summary['exported']}/{summary['total']} images, {summary['boxes']} boxes, "
+                      f"{len(summary['failed'])} failed, {summary['seconds']:.1f}s")
+        return summary
+
+    def _export_all(self, index, annotations, writer, summary):
+        images_dir = os.path.join(self.source, 'images')
+        target_dir = None if self.mode == 'none' else os.path.join(self.dest_folder, writer.image_dir)
+        same_device = os.path.isdir(images_dir) and os.stat(images_dir).st_dev == os.stat(self.dest_folder).st_dev
+
+        self._report("export", 0, summary['total'], 0, force=True)
+        # Forking a process running a GUI and helper threads is unsafe, so workers are spawned.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            window = deque()
+            batch = []
+            for folder, name, nbytes, _, split, width, height in index.iter_images(with_split=True, with_size=True):
+                if self.cancelled:
+                    break
+                size = (width, height) if width is not None else None
+                batch.append((f"{folder}/{name}", nbytes, split if self.ratios is not None else None, size))
+                if len(batch) == EXPORT_BATCH:
+                    window.append(self._submit(executor, batch, images_dir, target_dir, same_device, writer))
+                    batch = []
+                    while len(window) > self.workers * 2:
+                        self._write_batch(*window.popleft(), annotations, writer, summary)
+
+            if batch and not self.cancelled:
+                window.append(self._submit(executor, batch, images_dir, target_dir, same_device, writer))
+            while window:
+                items, future = window.popleft()
+                if self.cancelled:
+                    future.cancel()
+                    continue
+                self._write_batch(items, future, annotations, writer, summary)
+
+        self._report("export", summary['exported'] + len(summary['failed']), summary['total'],
+                     summary['bytes'], force=True)
+
+    def _submit(self, executor, batch, images_dir, target_dir, same_device, writer):
+        paths = []
+        for relative_path, _, split, size in batch:
+            target = None
+            if target_dir:
+                split_dir = SPLITS[split] if writer.split_images and split is not None else ""
+                target = os.path.join(target_dir, split_dir, relative_path)
+            paths.append((os.path.join(images_dir, relative_path), target, size))
+        return batch, executor.submit(_process_batch, paths, self.mode, same_device)
+
+    def _write_batch(self, batch, future, annotations, writer, summary):
+        for (relative_path, nbytes, split, _), (size, error) in zip(batch, future.result()):
+            if error is not None:
+                summary['failed'].append((relative_path, error))
+                log("ERROR", "Error exporting %s: %s", relative_path, error)
+                continue
+
+            boxes = annotations.boxes(relative_path)
+            writer.add(summary['exported'], relative_path, size[0], size[1], boxes, split)
+            summary['exported'] += 1
+            summary['boxes'] += len(boxes)
+            summary['bytes'] += nbytes
+        self._report("export", summary['exported'] + len(summary['failed']), summary['total'], summary['bytes'])
+
+    def _report(self, stage, done, total, nbytes, force=False):
+        if self._progress is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            self._progress(stage, done, total, nbytes)
@@ -0,0 +1,284 @@
+import os
+import time
+import sqlite3
+
+from app.utils.imageinfo import PROBE_WORKERS, probe_many
+from app.utils.importer import IMAGE_EXTENSIONS
+from app.utils.logger import log
+
+
+INDEX_FILENAME = "index.db"
+RACY_MTIME_NS = 2 * 1000 ** 3
+
+_INFO_JOIN = ("LEFT JOIN image_info info ON info.folder = images.folder AND info.name = images.name "
+              "AND info.size = images.size AND info.mtime_ns = images.mtime_ns")
+_HASH_JOIN = ("LEFT JOIN hashes ON hashes.folder = images.folder AND hashes.name = images.name "
+              "AND hashes.size = images.size AND hashes.mtime_ns = images.mtime_ns")
+FOLDER_TABLES = ("images", "image_info", "hashes")
+
+
+class ImageIndex:
+    def __init__(self, subproject_path):
+        self.subproject_path = subproject_path
+        self.image_dir = os.path.join(subproject_path, 'images')
+        self.path = os.path.join(subproject_path, INDEX_FILENAME)
+
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS folders ("
+                "name TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, count INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "folder TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "PRIMARY KEY (folder, name)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS splits ("
+                "folder TEXT NOT NULL, name TEXT NOT NULL, split INTEGER NOT NULL, "
+                "PRIMARY KEY (folder, name)) WITHOUT ROWID"
+            )
+            # Header metadata, valid while size and mtime_ns match the images row. A NULL format
+            # marks a file that was probed but could not be read.
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_info ("
+                "folder TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "format TEXT, width INTEGER, height INTEGER, bit_depth INTEGER, orientation INTEGER, taken TEXT, "
+                "PRIMARY KEY (folder, name)) WITHOUT ROWID"
+            )
+            # Perceptual hashes, valid like image_info. A NULL hash marks a file that could not be decoded.
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                "folder TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "hash INTEGER, PRIMARY KEY (folder, name)) WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS duplicates ("
+                "folder TEXT NOT NULL, name TEXT NOT NULL, group_id INTEGER NOT NULL, "
+                "PRIMARY KEY (folder, name)) WITHOUT ROWID"
+            )
+
+    def close(self):
+        self._conn.close()
+
+    def refresh(self) -> list[str]:
+        try:
+            root_mtime = os.stat(self.image_dir).st_mtime_ns
+        except FileNotFoundError:
+            with self._conn:
+                self._conn.execute("DELETE FROM folders")
+                for table in FOLDER_TABLES:
+                    self._conn.execute(f"DELETE FROM {table}")
+                self._conn.execute("DELETE FROM state WHERE key = 'root_mtime_ns'")
+            return []
+
+        known = dict(self._conn.execute("SELECT name, mtime_ns FROM folders"))
+        row = self._conn.execute("SELECT value FROM state WHERE key = 'root_mtime_ns'").fetchone()
+
+        if row is None or row[0] != root_mtime:
+            names = [entry.name for entry in os.scandir(self.image_dir) if entry.is_dir()]
+            removed = known.keys() - set(names)
+            with self._conn:
+                for name in removed:
+                    self._conn.execute("DELETE FROM folders WHERE name = ?", (name,))
+                    for table in FOLDER_TABLES:
+                        self._conn.execute(f"DELETE FROM {table} WHERE folder = ?", (name,))
+                self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('root_mtime_ns', ?)",
+                                   (self._stable_mtime(root_mtime),))
+        else:
+            names = list(known)
+
+        changed = [name for name in names if self._refresh_folder(name, known.get(name))]
+        if changed:
+            log("INDEX", f"Rescanned {len(changed)} of {len(names)} folders in {self.image_dir}")
+        return changed
+
+    def _refresh_folder(self, folder, known_mtime=None) -> bool:
+        folder_path = os.path.join(self.image_dir, folder)
+        try:
+            mtime = os.stat(folder_path).st_mtime_ns
+        except FileNotFoundError:
+            with self._conn:
+                self._conn.execute("DELETE FROM folders WHERE name = ?", (folder,))
+                for table in FOLDER_TABLES:
+                    self._conn.execute(f"DELETE FROM {table} WHERE folder = ?", (folder,))
+            return True
+
+        if known_mtime is None:
+            row = self._conn.execute("SELECT mtime_ns FROM folders WHERE name = ?", (folder,)).fetchone()
+            known_mtime = row[0] if row else None
+        if known_mtime == mtime:
+            return False
+
+        rows = []
+        for entry in os.scandir(folder_path):
+            if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and entry.is_file():
+                stat = entry.stat()
+                rows.append((folder, entry.name, stat.st_size, stat.st_mtime_ns))
+
+        with self._conn:
+            self._conn.execute("DELETE FROM images WHERE folder = ?", (folder,))
+            self._conn.executemany("INSERT INTO images (folder, name, size, mtime_ns) VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO folders (name, mtime_ns, count) VALUES (?, ?, ?)",
+                               (folder, self._stable_mtime(mtime), len(rows)))
+        return True
+
+    @staticmethod
+    def _stable_mtime(mtime_ns):
+        # A directory modified within the filesystem's timestamp granularity could change
+        # again without its mtime moving, so such entries are rescanned on the next refresh.
+        if time.time_ns() - mtime_ns < RACY_MTIME_NS:
+            return 0
+        return mtime_ns
+
+    def folder_counts(self) -> list[tuple[str, int]]:
+        return self._conn.execute("SELECT name, count FROM folders ORDER BY name").fetchall()
+
+    def list_images(self, folder) -> list[str]:
+        self._refresh_folder(folder)
+        return [row[0] for row in
+                self._conn.execute("SELECT name FROM images WHERE folder = ? ORDER BY name", (folder,))]
+
+    def images(self, folder=None) -> list[tuple[str, str, int, int]]:
+        if folder is None:
+            query = "SELECT folder, name, size, mtime_ns FROM images ORDER BY folder, name"
+            return self._conn.execute(query).fetchall()
+        self._refresh_folder(folder)
+        query = "SELECT folder, name, size, mtime_ns FROM images WHERE folder = ? ORDER BY name"
+        return self._conn.execute(query, (folder,)).fetchall()
+
+    def iter_images(self, with_split=False, with_size=False):
+        # with_size appends the displayed width and height, NULL when the header was not probed.
+        columns = "images.folder, images.name, images.size, images.mtime_ns"
+        joins = ""
+        if with_split:
+            columns += ", split"
+            joins += " LEFT JOIN splits USING (folder, name)"
+        if with_size:
+            columns += (", CASE WHEN orientation >= 5 THEN height ELSE width END, "
+                        "CASE WHEN orientation >= 5 THEN width ELSE height END")
+            joins += f" {_INFO_JOIN}"
+        cursor = self._conn.execute(f"SELECT {columns} FROM images{joins} ORDER BY images.folder, images.name")
+        while rows := cursor.fetchmany(1000):
+            yield from rows
+
+    def image_names(self, with_split=False) -> list[tuple]:
+        if with_split:
+            query = ("SELECT folder, name, split FROM images "
+                     "LEFT JOIN splits USING (folder, name) ORDER BY folder, name")
+        else:
+            query = "SELECT folder, name FROM images ORDER BY folder, name"
+        return self._conn.execute(query).fetchall()
+
+    def image_info(self, folder) -> list[tuple]:
+        # (name, format, width, height, bit_depth, orientation, taken) for every image of a folder.
+        self._refresh_folder(folder)
+        query = ("SELECT images.name, format, width, height, bit_depth, orientation, taken FROM images "
+                 f"{_INFO_JOIN} WHERE images.folder = ? ORDER BY images.name")
+        return self._conn.execute(query, (folder,)).fetchall()
+
+    def missing_info(self) -> list[tuple[str, str, int, int]]:
+        query = ("SELECT images.folder, images.name, images.size, images.mtime_ns FROM images "
+                 f"{_INFO_JOIN} WHERE info.folder IS NULL")
+        return self._conn.execute(query).fetchall()
+
+    def set_info(self, rows):
+        # rows are (folder, name, size, mtime_ns, info) with info as returned by imageinfo.probe.
+        empty = (None,) * 6
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO image_info (folder, name, size, mtime_ns, format, width, height, "
+                "bit_depth, orientation, taken) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((*row, *(info or empty)) for *row, info in rows))
+
+    def update_info(self, workers=PROBE_WORKERS) -> int:
+        rows = self.missing_info()
+        if rows:
+            paths = [os.path.join(self.image_dir, folder, name) for folder, name, _, _ in rows]
+            self.set_info((*row, info) for row, info in zip(rows, probe_many(paths, workers)))
+            log("INDEX", f"Probed {len(rows)} image headers in {self.image_dir}")
+        with self._conn:
+            self._conn.execute("DELETE FROM image_info WHERE NOT EXISTS (SELECT 1 FROM images "
+                               "WHERE images.folder = image_info.folder AND images.name = image_info.name)")
+        return len(rows)
+
+    def missing_hashes(self) -> list[tuple[str, str, int, int]]:
+        query = ("SELECT images.folder, images.name, images.size, images.mtime_ns FROM images "
+                 f"{_HASH_JOIN} WHERE hashes.folder IS NULL ORDER BY images.folder, images.name")
+        return self._conn.execute(query).fetchall()
+
+    def set_hashes(self, rows):
+        # rows are (folder, name, size, mtime_ns, hash) with hash as a signed 64-bit integer or None.
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO hashes (folder, name, size, mtime_ns, hash) "
+                                   "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def hashes(self) -> list[tuple[str, str, int]]:
+        query = (f"SELECT images.folder, images.name, hash FROM images {_HASH_JOIN} "
+                 "WHERE hash IS NOT NULL ORDER BY images.folder, images.name")
+        return self._conn.execute(query).fetchall()
+
+    def clear_hashes(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM hashes")
+            self._conn.execute("DELETE FROM duplicates")
+
+    def set_duplicates(self, groups):
+        with self._conn:
+            self._conn.execute("DELETE FROM duplicates")
+            self._conn.executemany("INSERT INTO duplicates (folder, name, group_id) VALUES (?, ?, ?)",
+                                   ((folder, name, group_id) for group_id, members in enumerate(groups)
+                                    for folder, name in members))
+
+    def duplicate_groups(self) -> list[list[tuple[str, str]]]:
+        # Groups shrink when images are moved away, and are dropped once a single image is left.
+        query = ("SELECT group_id, folder, name FROM duplicates JOIN images USING (folder, name) "
+                 "WHERE group_id IN (SELECT group_id FROM duplicates JOIN images USING (folder, name) "
+                 "GROUP BY group_id HAVING COUNT(*) > 1) ORDER BY group_id, folder, name")
+        groups = {}
+        for group_id, folder, name in self._conn.execute(query):
+            groups.setdefault(group_id, []).append((folder, name))
+        return list(groups.values())
+
+    def duplicate_counts(self) -> tuple[int, int]:
+        query = ("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM (SELECT COUNT(*) AS size FROM duplicates "
+                 "JOIN images USING (folder, name) GROUP BY group_id HAVING COUNT(*) > 1)")
+        return self._conn.execute(query).fetchone()
+
+    def unassigned_count(self) -> int:
+        query = "SELECT COUNT(*) FROM images LEFT JOIN splits USING (folder, name) WHERE split IS NULL"
+        return self._conn.execute(query).fetchone()[0]
+
+    def folder_splits(self) -> dict[str, int]:
+        query = "SELECT folder, MIN(split) FROM splits JOIN images USING (folder, name) GROUP BY folder"
+        return dict(self._conn.execute(query).fetchall())
+
+    def set_splits(self, rows=(), folders=(), replace=False):
+        with self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM splits")
+            else:
+                self._conn.execute("DELETE FROM splits WHERE NOT EXISTS (SELECT 1 FROM images "
+                                   "WHERE images.folder = splits.folder AND images.name = splits.name)")
+            self._conn.executemany("INSERT OR REPLACE INTO splits (folder, name, split) VALUES (?, ?, ?)", rows)
+            self._conn.executemany("INSERT OR REPLACE INTO splits (folder, name, split) "
+                                   "SELECT folder, name, ? FROM images WHERE folder = ?", folders)
+
+    def split_counts(self) -> dict[int, int]:
+        query = "SELECT split, COUNT(*) FROM splits JOIN images USING (folder, name) GROUP BY split"
+        return dict(self._conn.execute(query).fetchall())
+
+    def get_state(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, key, value):
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def image_count(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(count), 0) FROM folders").fetchone()[0]
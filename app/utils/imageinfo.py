@@ -0,0 +1,219 @@
+import os
+import mmap
+import struct
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+HEADER_BYTES = 64 * 1024
+PROBE_WORKERS = min(16, (os.cpu_count() or 4) * 2)
+PROBE_CHUNK = 1024
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+TIFF_TYPES = {1: "B", 2: "s", 3: "H", 4: "I", 7: "B"}
+TAG_WIDTH = 0x0100
+TAG_HEIGHT = 0x0101
+TAG_BITS = 0x0102
+TAG_SAMPLES = 0x0115
+TAG_ORIENTATION = 0x0112
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TIFF_TAGS = {TAG_WIDTH, TAG_HEIGHT, TAG_BITS, TAG_SAMPLES, TAG_ORIENTATION, TAG_DATETIME, TAG_EXIF_IFD,
+             TAG_DATETIME_ORIGINAL}
+
+
+# Header probe: (format, width, height, bits per pixel, EXIF orientation, capture time) or None.
+# Width and height are stored pixels, before the orientation is applied.
+def probe(path):
+    with open(path, 'rb') as f:
+        head = f.read(HEADER_BYTES)
+        try:
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return _png_info(head)
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                width, height, packed = struct.unpack("<HHB", head[6:11])
+                return 'gif', width, height, (packed & 7) + 1, 1, None
+            if head.startswith(b"BM"):
+                width, height, _, bits = struct.unpack("<iiHH", head[18:30])
+                return 'bmp', width, abs(height), bits, 1, None
+            if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+                return _webp_info(f, head)
+            if head.startswith(b"\xff\xd8"):
+                return _jpeg_info(f)
+            if head[:4] in (b"II*\x00", b"MM\x00*"):
+                return _tiff_info(f)
+        except (struct.error, IndexError, ValueError):
+            return None
+    return None
+
+
+def probe_size(path):
+    info = probe(path)
+    return None if info is None else (info[1], info[2])
+
+
+def oriented_size(width, height, orientation):
+    # Orientations 5 to 8 rotate by 90 degrees, which is how the image is displayed and annotated.
+    if orientation and orientation >= 5:
+        return height, width
+    return width, height
+
+
+def _probe_or_none(path):
+    try:
+        return probe(path)
+    except OSError:
+        return None
+
+
+def probe_many(paths, workers=PROBE_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(paths), PROBE_CHUNK):
+            yield from executor.map(_probe_or_none, paths[start:start + PROBE_CHUNK])
+
+
+def _png_info(data):
+    width, height, depth, color_type = struct.unpack(">IIBB", data[16:26])
+    orientation, taken = 1, None
+    offset = 8
+    while offset + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[offset:offset + 8])
+        if kind == b"eXIf":
+            orientation, taken = _exif(data[offset + 8:offset + 8 + length])
+            break
+        if kind in (b"IDAT", b"IEND"):
+            break
+        offset += length + 12
+    return 'png', width, height, depth * PNG_CHANNELS.get(color_type, 1), orientation, taken
+
+
+def _jpeg_info(f):
+    f.seek(2)
+    orientation, taken = 1, None
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker == 0xD9:
+            return None
+
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker == 0xE1:
+            segment = f.read(length - 2)
+            if segment.startswith(b"Exif\x00\x00"):
+                orientation, taken = _exif(segment[6:])
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            precision, height, width, components = struct.unpack(">BHHB", f.read(6))
+            return 'jpeg', width, height, precision * components, orientation, taken
+        f.seek(length - 2, 1)
+
+
+def _webp_info(f, data):
+    chunk = data[12:16]
+    if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[26:30])
+        return 'webp', width & 0x3FFF, height & 0x3FFF, 24, 1, None
+    if chunk == b"VP8L" and data[20] == 0x2F:
+        bits = int.from_bytes(data[21:25], 'little')
+        depth = 32 if bits >> 28 & 1 else 24
+        return 'webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, depth, 1, None
+    if chunk == b"VP8X":
+        flags = data[20]
+        orientation, taken = 1, None
+        if flags & 0x08:
+            orientation, taken = _exif(_riff_chunk(f, b"EXIF") or b"")
+        width, height = int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        return 'webp', width, height, 32 if flags & 0x10 else 24, orientation, taken
+    return None
+
+
+def _riff_chunk(f, kind):
+    # The EXIF chunk of an extended WebP follows the image data, so chunk headers are skipped over.
+    f.seek(12)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        name, length = struct.unpack("<4sI", header)
+        if name == kind:
+            return f.read(length)
+        f.seek(length + (length & 1), 1)
+
+
+def _tiff_info(f):
+    # IFDs can be anywhere in a TIFF file, so the file is mapped rather than read.
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        tags = _tiff_tags(data)
+    if TAG_WIDTH not in tags or TAG_HEIGHT not in tags:
+        return None
+    depth = tags.get(TAG_BITS, (1,))[0] * tags.get(TAG_SAMPLES, (1,))[0]
+    return 'tiff', tags[TAG_WIDTH][0], tags[TAG_HEIGHT][0], depth, _orientation(tags), _taken(tags)
+
+
+def _exif(data):
+    if data.startswith(b"Exif\x00\x00"):
+        data = data[6:]
+    try:
+        tags = _tiff_tags(data)
+    except (struct.error, IndexError, ValueError):
+        return 1, None
+    return _orientation(tags), _taken(tags)
+
+
+def _tiff_tags(data):
+    if data[:4] not in (b"II*\x00", b"MM\x00*"):
+        raise ValueError("not a TIFF header")
+    order = "<" if data[:2] == b"II" else ">"
+    tags = _ifd(data, order, struct.unpack_from(order + "I", data, 4)[0])
+    if TAG_EXIF_IFD in tags:
+        tags.update(_ifd(data, order, tags[TAG_EXIF_IFD][0]))
+    return tags
+
+
+def _ifd(data, order, offset):
+    tags = {}
+    count = struct.unpack_from(order + "H", data, offset)[0]
+    for index in range(count):
+        entry = offset + 2 + index * 12
+        tag, field_type, length = struct.unpack_from(order + "HHI", data, entry)
+        code = TIFF_TYPES.get(field_type)
+        if tag not in TIFF_TAGS or code is None:
+            continue
+        nbytes = struct.calcsize(code) * length
+        start = entry + 8 if nbytes <= 4 else struct.unpack_from(order + "I", data, entry + 8)[0]
+        if code == "s":
+            tags[tag] = bytes(data[start:start + nbytes]).split(b"\x00", 1)[0].decode('ascii', 'replace')
+        else:
+            tags[tag] = struct.unpack_from(f"{order}{length}{code}", data, start)
+    return tags
+
+
+def _orientation(tags):
+    value = tags.get(TAG_ORIENTATION, (1,))
+    return value[0] if isinstance(value, tuple) and value and 1 <= value[0] <= 8 else 1
+
+
+def _taken(tags):
+    for tag in (TAG_DATETIME_ORIGINAL, TAG_DATETIME):
+        value = tags.get(tag)
+        if isinstance(value, str):
+            try:
+                return datetime.strptime(value.strip()[:19], "%Y:%m:%d %H:%M:%S").isoformat(sep=' ')
+            except ValueError:
+                continue
+    return None
@@ -0,0 +1,427 @@
+import os
+import time
+import zlib
+import shutil
+import tarfile
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from app.utils.logger import log
+from app.utils.tracing import span
+from app.utils.dedup import (CONTENT_INDEX_FILENAME, HASH_CHUNK, ContentIndex, copy_and_hash, copy_stream_and_hash,
+                             hash_file, link_or_copy)
+from app.utils.imageinfo import probe
+from app.utils.meta_store import DATA_DIR
+
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']
+ARCHIVE_EXTENSIONS = ['.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz']
+ARCHIVE_ERRORS = (OSError, EOFError, zlib.error, zipfile.BadZipFile, tarfile.TarError, NotImplementedError,
+                  RuntimeError)
+IMPORT_WORKERS = min(16, (os.cpu_count() or 4) * 2)
+PROGRESS_INTERVAL = 0.1
+
+IMPORT_MODES = {
+    'copy': "Copy files",
+    'link': "Link files (reflink or hardlink on the same disk, copy otherwise)",
+    'dedup': "Deduplicate (link files already stored in DeepTag, copy new ones)",
+    'skip': "Deduplicate and skip (do not import files already stored in DeepTag)"
+}
+
+
+def find_images(folder):
+    for root, _, files in os.walk(folder):
+        for file in files:
+            if is_image_name(file):
+                yield os.path.join(root, file)
+
+
+def archive_name(path):
+    # Folder name an archive is imported into (photos.tar.gz -> photos), None for anything else.
+    name = os.path.basename(path)
+    for ext in ARCHIVE_EXTENSIONS:
+        if name.lower().endswith(ext) and len(name) > len(ext) and os.path.isfile(path):
+            return name[:-len(ext)]
+    return None
+
+
+def is_image_name(name) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def unique_folder(target_dir, base_name) -> str:
+    dest_folder = os.path.join(target_dir, base_name)
+    counter = 1
+    while os.path.exists(dest_folder):
+        dest_folder = f"{os.path.join(target_dir, base_name)}_{counter}"
+        counter += 1
+    return dest_folder
+
+
+def unique_name(name, names) -> str:
+    stem, ext = os.path.splitext(name)
+    counter = 1
+    while name in names:
+        name = f"{stem}_{counter}{ext}"
+        counter += 1
+    names.add(name)
+    return name
+
+
+def plan_destinations(files, dest_folder) -> list[tuple[str, str]]:
+    names = set()
+    return [(path, os.path.join(dest_folder, unique_name(os.path.basename(path), names))) for path in files]
+
+
+class ImportJob:
+    # The source is a folder or a zip/tar archive, which is extracted without a temporary copy.
+    # Headers are probed by the copy workers; with subproject_path set they are stored in its index,
+    # and with hash_images also set the imported images are hashed for near-duplicate detection.
+    # The content index used to deduplicate is the one of the workspace in data_dir.
+    def __init__(self, source, target_dir, mode='copy', workers=IMPORT_WORKERS, subproject_path=None,
+                 hash_images=False, data_dir=DATA_DIR):
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Unknown import mode: {mode}")
+        self.source = source
+        self.target_dir = target_dir
+        self.mode = mode
+        self.workers = workers
+        self.subproject_path = subproject_path
+        self.hash_images = hash_images
+        self.data_dir = data_dir
+        self.hash_job = None
+        self.dest_folder = None
+        self.content_index = None
+        self._same_device = False
+        self._cancelled = threading.Event()
+        self._progress = None
+        self._last_report = 0.0
+        self._info = []
+        self._archive = archive_name(source)
+        self._zip_handles = threading.local()
+        self._zip_files = []
+        self._zip_lock = threading.Lock()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.hash_job is not None:
+            self.hash_job.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def run(self, progress=None) -> dict:
+        self._progress = progress
+        started = time.monotonic()
+        summary = {
+            'source': self.source,
+            'dest_folder': None,
+            'total': 0,
+            'copied': 0,
+            'bytes': 0,
+            'saved_bytes': 0,
+            'methods': {},
+            'failed': [],
+            'duplicates': None,
+            'cancelled': False,
+            'seconds': 0.0
+        }
+
+        # Compressed tar files can only be read front to back, so their members are not listed first.
+        streaming = self._archive is not None and not self.source.lower().endswith('.zip')
+        log("IMPORT", f"Scanning {self.source}")
+        files = []
+        if not streaming:
+            with span("import.scan", "import", source=self.source) as scan:
+                try:
+                    for path in self._scan():
+                        if self.cancelled:
+                            break
+                        files.append(path)
+                        self._report("scan", len(files), 0, 0)
+                except ARCHIVE_ERRORS as e:
+                    summary['failed'].append((self.source, str(e)))
+                    log("ERROR", "Error reading %s: %s", self.source, e)
+                scan.args['files'] = len(files)
+            summary['total'] = len(files)
+
+        if (files or streaming) and not self.cancelled:
+            os.makedirs(self.target_dir, exist_ok=True)
+            base_name = self._archive or os.path.basename(os.path.normpath(self.source))
+            self.dest_folder = unique_folder(self.target_dir, base_name)
+            os.makedirs(self.dest_folder)
+            summary['dest_folder'] = self.dest_folder
+
+            self._same_device = os.stat(self.source).st_dev == os.stat(self.dest_folder).st_dev
+            if self.mode in ('dedup', 'skip'):
+                self.content_index = ContentIndex(os.path.join(self.data_dir, CONTENT_INDEX_FILENAME))
+
+            if streaming:
+                log("IMPORT", f"Extracting images from {self.source} to {self.dest_folder} (mode: {self.mode}, streamed)")
+            else:
+                log("IMPORT", f"Importing {len(files)} images to {self.dest_folder} "
+                              f"(mode: {self.mode}, {self.workers} workers)")
+            try:
+                with span("import.copy", "import", mode=self.mode, files=len(files), workers=self.workers):
+                    if streaming:
+                        self._extract_tar(summary)
+                    elif self._archive is not None:
+                        self._copy_all(plan_destinations(files, self.dest_folder), summary, self._extract_zip_member)
+                    else:
+                        self._copy_all(plan_destinations(files, self.dest_folder), summary, self._copy_file)
+            finally:
+                if self.content_index is not None:
+                    self.content_index.close()
+                for handle in self._zip_files:
+                    handle.close()
+
+            if not self.cancelled and not summary['copied']:
+                os.rmdir(self.dest_folder)
+                summary['dest_folder'] = None
+            elif not self.cancelled:
+                if self.subproject_path is not None:
+                    if self.mode in ('copy', 'link'):
+                        self._register_content()
+                    rows = self._store_info()
+                    if self.hash_images:
+                        summary['duplicates'] = self._hash_images(rows)
+
+        if self.cancelled:
+            summary['cancelled'] = True
+            if self.dest_folder:
+                shutil.rmtree(self.dest_folder, ignore_errors=True)
+                log("IMPORT", f"Import cancelled, removed partial folder {self.dest_folder}")
+
+        summary['seconds'] = time.monotonic() - started
+        log("IMPORT", f"Finished: {summary['copied']}/{summary['total']} images, "
+                      f"{len(summary['failed'])} failed, {summary['seconds']:.1f}s, methods: {summary['methods']}")
+        return summary
+
+    def _scan(self):
+        if self._archive is None:
+            yield from find_images(self.source)
+            return
+        with zipfile.ZipFile(self.source) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and is_image_name(member.filename):
+                    yield member.filename
+
+    def _copy_all(self, plan, summary, copy):
+        self._report("copy", 0, len(plan), 0, force=True)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for src, dst in plan:
+                if self.cancelled:
+                    break
+                if len(pending) >= self.workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done, summary, len(plan))
+                pending.add(executor.submit(copy, src, dst))
+
+            done, _ = wait(pending)
+            self._collect(done, summary, len(plan))
+
+        self._report("copy", summary['copied'] + len(summary['failed']), len(plan), summary['bytes'], force=True)
+
+    def _register_content(self):
+        # Copies and links are not hashed here, but later deduplicating imports can still match them.
+        content_index = ContentIndex(os.path.join(self.data_dir, CONTENT_INDEX_FILENAME))
+        try:
+            content_index.register([(os.path.abspath(os.path.join(self.dest_folder, name)), size)
+                                    for _, name, size, _, _ in self._info])
+        finally:
+            content_index.close()
+
+    def _store_info(self):
+        # Imported here because the image index builds on this module.
+        from app.utils.image_index import ImageIndex
+
+        index = ImageIndex(self.subproject_path)
+        try:
+            index.set_info(self._info)
+        finally:
+            index.close()
+        rows, self._info = [row[:4] for row in self._info], []
+        return rows
+
+    def _hash_images(self, rows):
+        # Imported here because the hashing module builds on this one.
+        from app.utils.phash import DuplicateJob, hashing_available
+
+        if not hashing_available():
+            log("IMPORT", "Skipping near-duplicate hashing, PySide6 is not available")
+            return None
+        self.hash_job = DuplicateJob(self.subproject_path, rows=rows)
+        if self.cancelled:
+            return None
+        return self.hash_job.run(self._progress)
+
+    def _collect(self, futures, summary, total):
+        for future in futures:
+            self._record(future.result(), summary)
+        self._report("copy", summary['copied'] + len(summary['failed']), total, summary['bytes'])
+
+    def _record(self, result, summary):
+        if result is None:
+            return
+        src, nbytes, error, method, info = result
+        if info is not None:
+            self._info.append(info)
+        if error is None:
+            summary['methods'][method] = summary['methods'].get(method, 0) + 1
+            summary['bytes'] += nbytes
+            if method != 'copy':
+                summary['saved_bytes'] += nbytes
+            if method != 'skipped':
+                summary['copied'] += 1
+        else:
+            summary['failed'].append((src, error))
+            log("ERROR", "Error importing %s: %s", src, error)
+
+    def _copy_file(self, src, dst):
+        if self.cancelled:
+            return None
+        try:
+            info = probe(src)
+            if info is None:
+                return src, 0, "unsupported or corrupt file", None, None
+            method = self._transfer(src, dst)
+            if method == 'skipped':
+                return src, os.path.getsize(src), None, method, None
+            stat = os.stat(dst)
+            row = (os.path.basename(self.dest_folder), os.path.basename(dst), stat.st_size, stat.st_mtime_ns, info)
+            return src, stat.st_size, None, method, row
+        except OSError as e:
+            return src, 0, str(e), None, None
+
+    def _zip_handle(self):
+        # Every worker reads through its own handle, so members inflate in parallel.
+        handle = getattr(self._zip_handles, 'archive', None)
+        if handle is None:
+            handle = self._zip_handles.archive = zipfile.ZipFile(self.source)
+            with self._zip_lock:
+                self._zip_files.append(handle)
+        return handle
+
+    def _extract_zip_member(self, member, dst):
+        if self.cancelled:
+            return None
+        src = os.path.join(self.source, member)
+        try:
+            with self._zip_handle().open(member) as fileobj:
+                return self._extract(src, fileobj, dst)
+        except ARCHIVE_ERRORS as e:
+            return self._discard(src, dst, e)
+
+    def _extract_tar(self, summary):
+        names = set()
+        self._report("copy", 0, 0, 0, force=True)
+        try:
+            with tarfile.open(self.source, mode='r|*') as archive:
+                for member in archive:
+                    # A streamed archive keeps every header it has read, which would grow with the member count.
+                    archive.members = []
+                    if self.cancelled:
+                        break
+                    if not member.isfile() or not is_image_name(member.name):
+                        continue
+
+                    summary['total'] += 1
+                    src = os.path.join(self.source, os.path.normpath(member.name))
+                    dst = os.path.join(self.dest_folder, unique_name(os.path.basename(member.name), names))
+                    try:
+                        result = self._extract(src, archive.extractfile(member), dst)
+                    except ARCHIVE_ERRORS as e:
+                        result = self._discard(src, dst, e)
+                    self._record(result, summary)
+                    self._report("copy", summary['copied'] + len(summary['failed']), 0, summary['bytes'])
+        except ARCHIVE_ERRORS as e:
+            summary['failed'].append((self.source, str(e)))
+            log("ERROR", "Error reading %s: %s", self.source, e)
+
+        self._report("copy", summary['copied'] + len(summary['failed']), summary['total'], summary['bytes'],
+                     force=True)
+
+    @staticmethod
+    def _discard(src, dst, error):
+        try:
+            os.remove(dst)
+        except FileNotFoundError:
+            pass
+        return src, 0, str(error), None, None
+
+    def _extract(self, src, fileobj, dst):
+        # Archive members cannot be linked, so they are always written, and hashed on the way when deduplicating.
+        if self.content_index is None:
+            with open(dst, 'wb') as f:
+                shutil.copyfileobj(fileobj, f, HASH_CHUNK)
+            digest = None
+        else:
+            digest = copy_stream_and_hash(fileobj, dst)
+
+        info = probe(dst)
+        if info is None:
+            os.remove(dst)
+            return src, 0, "unsupported or corrupt file", None, None
+
+        method = 'copy'
+        size = os.path.getsize(dst)
+        if digest is not None:
+            existing = self.content_index.lookup(digest, size)
+            if existing is None:
+                self.content_index.add(digest, size, os.path.abspath(dst))
+            elif self.mode == 'skip':
+                os.remove(dst)
+                return src, size, None, 'skipped', None
+            else:
+                try:
+                    os.link(existing, dst + ".link")
+                    os.replace(dst + ".link", dst)
+                    method = 'deduplicated'
+                except OSError:
+                    pass
+
+        stat = os.stat(dst)
+        row = (os.path.basename(self.dest_folder), os.path.basename(dst), stat.st_size, stat.st_mtime_ns, info)
+        return src, stat.st_size, None, method, row
+
+    def _transfer(self, src, dst) -> str:
+        if self.mode == 'copy':
+            shutil.copy2(src, dst)
+            return 'copy'
+        if self.mode == 'link':
+            return link_or_copy(src, dst, self._same_device)
+
+        size = os.path.getsize(src)
+        digest = None
+        if self.content_index.has_size(size):
+            digest = hash_file(src)
+            existing = self.content_index.lookup(digest, size)
+            if existing is not None:
+                if self.mode == 'skip':
+                    return 'skipped'
+                try:
+                    os.link(existing, dst)
+                    return 'deduplicated'
+                except OSError:
+                    pass
+
+        # New content is always copied: a link to the source would let edits there change the project image.
+        if digest is None:
+            digest = copy_and_hash(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+        self.content_index.add(digest, size, os.path.abspath(dst))
+        return 'copy'
+
+    def _report(self, stage, done, total, nbytes, force=False):
+        if self._progress is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            self._progress(stage, done, total, nbytes)
@@ -1,7 +1,126 @@
-import datetime
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+from collections import deque
 
 
-def log(category, message):
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-    print(f"[{timestamp}] [{category}] {message}")
-    print("-" * 150)
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+CRITICAL = logging.CRITICAL
+OFF = CRITICAL + 10
+
+LOG_FORMAT = "[%(asctime)s.%(msecs)03d] [%(category)s] %(message)s"
+LOG_FILE_FORMAT = "[%(asctime)s.%(msecs)03d] [%(levelname)s] [%(category)s] [%(threadName)s] %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+RING_BUFFER_SIZE = 2000
+
+CATEGORY_LEVELS = {
+    "ERROR": ERROR,
+    "CRITICAL": CRITICAL,
+    "WARNING": WARNING
+}
+
+
+def _parse_level(value, default=INFO):
+    value = str(value).strip().upper()
+    if value == "OFF":
+        return OFF
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value)
+    return level if isinstance(level, int) else default
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity=RING_BUFFER_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+
+
+_level = _parse_level(os.environ.get("DEEPTAG_LOG_LEVEL", "INFO"))
+_category_thresholds = {}
+for _entry in filter(None, os.environ.get("DEEPTAG_LOG_CATEGORIES", "").split(",")):
+    _category, _, _category_level = _entry.partition(":")
+    _category_thresholds[_category.strip().upper()] = _parse_level(_category_level or "DEBUG")
+
+_queue = queue.SimpleQueue()
+_queue_handler = _LazyQueueHandler(_queue)
+_ring_buffer = RingBufferHandler()
+_ring_buffer.setFormatter(logging.Formatter(LOG_FILE_FORMAT, LOG_DATE_FORMAT))
+
+_console = logging.StreamHandler(sys.stdout)
+_console.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+_handlers = [_console, _ring_buffer]
+
+_log_file = os.environ.get("DEEPTAG_LOG_FILE")
+if _log_file:
+    os.makedirs(os.path.dirname(_log_file) or ".", exist_ok=True)
+    _file_handler = logging.handlers.RotatingFileHandler(
+        _log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8'
+    )
+    _file_handler.setFormatter(logging.Formatter(LOG_FILE_FORMAT, LOG_DATE_FORMAT))
+    _handlers.append(_file_handler)
+
+_listener = logging.handlers.QueueListener(_queue, *_handlers, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
+
+_logger = logging.getLogger("deeptag")
+_logger.propagate = False
+
+
+def is_enabled(category, level=INFO) -> bool:
+    return level >= _category_thresholds.get(category, _level)
+
+
+def log(category, message, *args, level=None):
+    if level is None:
+        level = CATEGORY_LEVELS.get(category, INFO)
+    if level < _category_thresholds.get(category, _level):
+        return
+
+    record = _logger.makeRecord(_logger.name, level, "", 0, message, args, None, extra={'category': category})
+    _queue_handler.handle(record)
+
+
+def debug(category, message, *args):
+    if DEBUG < _category_thresholds.get(category, _level):
+        return
+    log(category, message, *args, level=DEBUG)
+
+
+def set_level(level):
+    global _level
+    _level = _parse_level(level) if isinstance(level, str) else level
+
+
+def set_category_level(category, level):
+    if level is None:
+        _category_thresholds.pop(category, None)
+    else:
+        _category_thresholds[category] = _parse_level(level) if isinstance(level, str) else level
+
+
+def recent(count=None) -> list[str]:
+    records = list(_ring_buffer.records)
+    return records if count is None else records[-count:]
+
+
+def flush():
+    _listener.stop()
+    _listener.start()
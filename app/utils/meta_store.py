@@ -0,0 +1,589 @@
+import os
+import sys
+import copy
+import json
+import atexit
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+import weakref
+from datetime import datetime
+
+from app.utils.logger import log
+
+
+DATA_DIR = "data"
+SQLITE_FILENAME = "deeptag.db"
+WRITE_DEBOUNCE = 0.25
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created TEXT,
+    modified TEXT
+);
+CREATE TABLE IF NOT EXISTS subprojects (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    created TEXT,
+    modified TEXT,
+    UNIQUE (project_id, name)
+);
+CREATE TABLE IF NOT EXISTS classes (
+    id INTEGER PRIMARY KEY,
+    subproject_id INTEGER NOT NULL REFERENCES subprojects(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    UNIQUE (subproject_id, name)
+);
+CREATE INDEX IF NOT EXISTS subprojects_order ON subprojects(project_id, position);
+CREATE INDEX IF NOT EXISTS classes_order ON classes(subproject_id, position);
+"""
+
+
+def atomic_write_json(path, data):
+    atomic_write_bytes(path, json.dumps(data, indent=2).encode('utf-8'))
+
+
+def atomic_write_bytes(path, data):
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".meta.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+# Stores still holding debounced writes are flushed at exit; the set does not keep them alive.
+_json_stores = weakref.WeakSet()
+
+
+def _flush_json_stores():
+    for store in list(_json_stores):
+        store.flush()
+
+
+atexit.register(_flush_json_stores)
+
+
+class JsonMetaStore:
+    def __init__(self, data_dir=DATA_DIR, debounce=WRITE_DEBOUNCE):
+        self.data_dir = data_dir
+        self.debounce = debounce
+
+        self._cache = {}
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        _json_stores.add(self)
+
+    def project_path(self, project_name):
+        return os.path.join(self.data_dir, project_name)
+
+    def subproject_path(self, project_name, subproject_name):
+        return os.path.join(self.data_dir, project_name, "subprojects", subproject_name)
+
+    def _read(self, meta_path):
+        with self._lock:
+            if meta_path in self._pending:
+                return copy.deepcopy(self._pending[meta_path])
+
+            stat = os.stat(meta_path)
+            cached = self._cache.get(meta_path)
+            if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+                return copy.deepcopy(cached[1])
+
+            with open(meta_path, "r", encoding='utf-8') as f:
+                meta = json.load(f)
+            self._cache[meta_path] = ((stat.st_mtime_ns, stat.st_size), meta)
+            return copy.deepcopy(meta)
+
+    def _exists(self, meta_path) -> bool:
+        with self._lock:
+            return meta_path in self._pending or os.path.isfile(meta_path)
+
+    def _write(self, meta_path, meta):
+        with self._lock:
+            self._pending[meta_path] = copy.deepcopy(meta)
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            for meta_path, meta in pending.items():
+                if not os.path.isdir(os.path.dirname(meta_path)):
+                    continue
+                try:
+                    atomic_write_json(meta_path, meta)
+                    stat = os.stat(meta_path)
+                except OSError as e:
+                    log("ERROR", f"Error writing {meta_path}: {str(e)}")
+                    with self._lock:
+                        self._pending.setdefault(meta_path, meta)
+                    continue
+
+                with self._lock:
+                    self._cache[meta_path] = ((stat.st_mtime_ns, stat.st_size), meta)
+
+            if pending:
+                log("META", f"Wrote {len(pending)} metadata files")
+
+    def _forget(self, path, discard_pending=False):
+        prefix = os.path.join(path, "")
+        with self._lock:
+            for meta_path in [p for p in self._cache if p.startswith(prefix)]:
+                del self._cache[meta_path]
+            if discard_pending:
+                for meta_path in [p for p in self._pending if p.startswith(prefix)]:
+                    del self._pending[meta_path]
+
+    def read_project_meta(self, project_name):
+        return self._read(os.path.join(self.project_path(project_name), "meta.json"))
+
+    def read_subproject_meta(self, project_name, subproject_name):
+        return self._read(os.path.join(self.subproject_path(project_name, subproject_name), "meta.json"))
+
+    def list_projects(self) -> list[dict]:
+        projects = []
+        if not os.path.exists(self.data_dir):
+            return projects
+
+        for dir_name in sorted(os.listdir(self.data_dir)):
+            project = self.get_project(dir_name)
+            if project is not None:
+                projects.append(project)
+        return projects
+
+    def get_project(self, dir_name):
+        dir_path = self.project_path(dir_name)
+        meta_path = os.path.join(dir_path, "meta.json")
+        if not self._exists(meta_path):
+            return None
+
+        try:
+            meta = self._read(meta_path)
+        except Exception as e:
+            log("ERROR", f"Error reading {meta_path}: {str(e)}")
+            return None
+
+        if meta.get("type") != "project":
+            return None
+        return {
+            'name': meta.get('name', dir_name),
+            'path': dir_path,
+            'subprojects': meta.get('subprojects', [])
+        }
+
+    def list_subprojects(self, project_name) -> list[str]:
+        project = self.get_project(project_name)
+        return project['subprojects'] if project else []
+
+    def list_classes(self, project_name, subproject_name) -> list[str]:
+        meta_path = os.path.join(self.subproject_path(project_name, subproject_name), "meta.json")
+        if not self._exists(meta_path):
+            return []
+        try:
+            return self._read(meta_path).get("classes", [])
+        except Exception as e:
+            log("ERROR", f"Error reading {meta_path}: {str(e)}")
+            return []
+
+    def create_project(self, name):
+        project_path = self.project_path(name)
+        os.makedirs(project_path, exist_ok=True)
+
+        meta = {
+            "name": name,
+            "type": "project",
+            "created": datetime.now().isoformat(),
+            "modified": datetime.now().isoformat(),
+            "subprojects": []
+        }
+        self._write(os.path.join(project_path, "meta.json"), meta)
+
+    def rename_project(self, old_name, new_name):
+        old_path = self.project_path(old_name)
+        new_path = self.project_path(new_name)
+
+        if os.path.exists(old_path):
+            self.flush()
+            os.rename(old_path, new_path)
+            self._forget(old_path)
+
+            meta_path = os.path.join(new_path, "meta.json")
+            if self._exists(meta_path):
+                meta = self._read(meta_path)
+                meta["name"] = new_name
+                meta["modified"] = datetime.now().isoformat()
+                self._write(meta_path, meta)
+
+    def remove_project(self, name):
+        project_path = self.project_path(name)
+        if os.path.exists(project_path):
+            self._forget(project_path, discard_pending=True)
+            shutil.rmtree(project_path)
+
+    def create_subproject(self, project_name, subproject_name):
+        project_path = self.project_path(project_name)
+        subproject_path = self.subproject_path(project_name, subproject_name)
+        os.makedirs(subproject_path, exist_ok=True)
+
+        meta_path = os.path.join(project_path, "meta.json")
+        meta = {
+            "name": project_name,
+            "type": "project",
+            "modified": datetime.now().isoformat(),
+            "subprojects": []
+        }
+
+        if self._exists(meta_path):
+            meta = self._read(meta_path)
+
+        if subproject_name not in meta["subprojects"]:
+            meta["subprojects"].append(subproject_name)
+            meta["modified"] = datetime.now().isoformat()
+            self._write(meta_path, meta)
+
+        sub_meta = {
+            "name": subproject_name,
+            "type": "subproject",
+            "project": project_name,
+            "created": datetime.now().isoformat(),
+            "modified": datetime.now().isoformat(),
+            "classes": []
+        }
+        self._write(os.path.join(subproject_path, "meta.json"), sub_meta)
+
+    def rename_subproject(self, project_name, old_name, new_name):
+        project_path = self.project_path(project_name)
+        old_path = self.subproject_path(project_name, old_name)
+        new_path = self.subproject_path(project_name, new_name)
+
+        if os.path.exists(old_path):
+            self.flush()
+            os.rename(old_path, new_path)
+            self._forget(old_path)
+
+            meta_path = os.path.join(project_path, "meta.json")
+            if self._exists(meta_path):
+                meta = self._read(meta_path)
+                if old_name in meta["subprojects"]:
+                    index = meta["subprojects"].index(old_name)
+                    meta["subprojects"][index] = new_name
+                    meta["modified"] = datetime.now().isoformat()
+                    self._write(meta_path, meta)
+
+            sub_meta_path = os.path.join(new_path, "meta.json")
+            if self._exists(sub_meta_path):
+                sub_meta = self._read(sub_meta_path)
+                sub_meta["name"] = new_name
+                sub_meta["modified"] = datetime.now().isoformat()
+                self._write(sub_meta_path, sub_meta)
+
+    def remove_subproject(self, project_name, subproject_name):
+        project_path = self.project_path(project_name)
+        subproject_path = self.subproject_path(project_name, subproject_name)
+
+        if os.path.exists(subproject_path):
+            self._forget(subproject_path, discard_pending=True)
+            shutil.rmtree(subproject_path)
+
+            meta_path = os.path.join(project_path, "meta.json")
+            if self._exists(meta_path):
+                meta = self._read(meta_path)
+                if subproject_name in meta["subprojects"]:
+                    meta["subprojects"].remove(subproject_name)
+                    meta["modified"] = datetime.now().isoformat()
+                    self._write(meta_path, meta)
+
+    def add_class(self, project_name, subproject_name, class_name):
+        subproject_path = self.subproject_path(project_name, subproject_name)
+        os.makedirs(subproject_path, exist_ok=True)
+
+        meta_path = os.path.join(subproject_path, "meta.json")
+        meta = {
+            "name": subproject_name,
+            "type": "subproject",
+            "project": project_name,
+            "modified": datetime.now().isoformat(),
+            "classes": []
+        }
+
+        if self._exists(meta_path):
+            meta = self._read(meta_path)
+
+        if class_name not in meta["classes"]:
+            meta["classes"].append(class_name)
+            meta["modified"] = datetime.now().isoformat()
+            self._write(meta_path, meta)
+
+    def rename_class(self, project_name, subproject_name, old_name, new_name):
+        meta_path = os.path.join(self.subproject_path(project_name, subproject_name), "meta.json")
+
+        if self._exists(meta_path):
+            meta = self._read(meta_path)
+            if old_name in meta["classes"]:
+                index = meta["classes"].index(old_name)
+                meta["classes"][index] = new_name
+                meta["modified"] = datetime.now().isoformat()
+                self._write(meta_path, meta)
+
+    def remove_class(self, project_name, subproject_name, class_name):
+        meta_path = os.path.join(self.subproject_path(project_name, subproject_name), "meta.json")
+
+        if self._exists(meta_path):
+            meta = self._read(meta_path)
+            if class_name in meta["classes"]:
+                meta["classes"].remove(class_name)
+                meta["modified"] = datetime.now().isoformat()
+                self._write(meta_path, meta)
+
+
+class SqliteMetaStore:
+    def __init__(self, data_dir=DATA_DIR, db_path=None):
+        self.data_dir = data_dir
+        self.db_path = db_path or os.path.join(data_dir, SQLITE_FILENAME)
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.executescript(SQLITE_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def project_path(self, project_name):
+        return os.path.join(self.data_dir, project_name)
+
+    def subproject_path(self, project_name, subproject_name):
+        return os.path.join(self.data_dir, project_name, "subprojects", subproject_name)
+
+    def _project_id(self, name):
+        row = self._conn.execute("SELECT id FROM projects WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _subproject_id(self, project_name, subproject_name):
+        row = self._conn.execute(
+            "SELECT s.id FROM subprojects s JOIN projects p ON p.id = s.project_id "
+            "WHERE p.name = ? AND s.name = ?", (project_name, subproject_name)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _ensure_project(self, name, now):
+        self._conn.execute("INSERT OR IGNORE INTO projects (name, created, modified) VALUES (?, ?, ?)",
+                           (name, now, now))
+        return self._project_id(name)
+
+    def _ensure_subproject(self, project_name, subproject_name, now):
+        project_id = self._ensure_project(project_name, now)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO subprojects (project_id, name, position, created, modified) "
+            "SELECT ?, ?, COALESCE(MAX(position) + 1, 0), ?, ? FROM subprojects WHERE project_id = ?",
+            (project_id, subproject_name, now, now, project_id)
+        )
+        return self._subproject_id(project_name, subproject_name)
+
+    def list_projects(self) -> list[dict]:
+        subprojects = {}
+        for project_id, name in self._conn.execute(
+                "SELECT project_id, name FROM subprojects ORDER BY project_id, position"):
+            subprojects.setdefault(project_id, []).append(name)
+
+        return [{'name': name, 'path': self.project_path(name), 'subprojects': subprojects.get(project_id, [])}
+                for project_id, name in self._conn.execute("SELECT id, name FROM projects ORDER BY name")]
+
+    def get_project(self, name):
+        project_id = self._project_id(name)
+        if project_id is None:
+            return None
+        return {'name': name, 'path': self.project_path(name), 'subprojects': self.list_subprojects(name)}
+
+    def list_subprojects(self, project_name) -> list[str]:
+        return [row[0] for row in self._conn.execute(
+            "SELECT s.name FROM subprojects s JOIN projects p ON p.id = s.project_id "
+            "WHERE p.name = ? ORDER BY s.position", (project_name,))]
+
+    def list_classes(self, project_name, subproject_name) -> list[str]:
+        return [row[0] for row in self._conn.execute(
+            "SELECT c.name FROM classes c "
+            "JOIN subprojects s ON s.id = c.subproject_id JOIN projects p ON p.id = s.project_id "
+            "WHERE p.name = ? AND s.name = ? ORDER BY c.position", (project_name, subproject_name))]
+
+    def create_project(self, name):
+        now = datetime.now().isoformat()
+        with self._conn:
+            self._ensure_project(name, now)
+            os.makedirs(self.project_path(name), exist_ok=True)
+
+    def rename_project(self, old_name, new_name):
+        with self._conn:
+            self._conn.execute("UPDATE projects SET name = ?, modified = ? WHERE name = ?",
+                               (new_name, datetime.now().isoformat(), old_name))
+            if os.path.exists(self.project_path(old_name)):
+                os.rename(self.project_path(old_name), self.project_path(new_name))
+
+    def remove_project(self, name):
+        with self._conn:
+            self._conn.execute("DELETE FROM projects WHERE name = ?", (name,))
+        if os.path.exists(self.project_path(name)):
+            shutil.rmtree(self.project_path(name))
+
+    def create_subproject(self, project_name, subproject_name):
+        now = datetime.now().isoformat()
+        with self._conn:
+            self._ensure_subproject(project_name, subproject_name, now)
+            self._conn.execute("UPDATE projects SET modified = ? WHERE name = ?", (now, project_name))
+            os.makedirs(self.subproject_path(project_name, subproject_name), exist_ok=True)
+
+    def rename_subproject(self, project_name, old_name, new_name):
+        now = datetime.now().isoformat()
+        project_id = self._project_id(project_name)
+        with self._conn:
+            self._conn.execute("UPDATE subprojects SET name = ?, modified = ? WHERE project_id = ? AND name = ?",
+                               (new_name, now, project_id, old_name))
+            self._conn.execute("UPDATE projects SET modified = ? WHERE id = ?", (now, project_id))
+            old_path = self.subproject_path(project_name, old_name)
+            if os.path.exists(old_path):
+                os.rename(old_path, self.subproject_path(project_name, new_name))
+
+    def remove_subproject(self, project_name, subproject_name):
+        project_id = self._project_id(project_name)
+        with self._conn:
+            self._conn.execute("DELETE FROM subprojects WHERE project_id = ? AND name = ?",
+                               (project_id, subproject_name))
+            self._conn.execute("UPDATE projects SET modified = ? WHERE id = ?",
+                               (datetime.now().isoformat(), project_id))
+        subproject_path = self.subproject_path(project_name, subproject_name)
+        if os.path.exists(subproject_path):
+            shutil.rmtree(subproject_path)
+
+    def add_class(self, project_name, subproject_name, class_name):
+        now = datetime.now().isoformat()
+        with self._conn:
+            subproject_id = self._ensure_subproject(project_name, subproject_name, now)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO classes (subproject_id, name, position) "
+                "SELECT ?, ?, COALESCE(MAX(position) + 1, 0) FROM classes WHERE subproject_id = ?",
+                (subproject_id, class_name, subproject_id)
+            )
+            self._conn.execute("UPDATE subprojects SET modified = ? WHERE id = ?", (now, subproject_id))
+
+    def rename_class(self, project_name, subproject_name, old_name, new_name):
+        subproject_id = self._subproject_id(project_name, subproject_name)
+        with self._conn:
+            self._conn.execute("UPDATE classes SET name = ? WHERE subproject_id = ? AND name = ?",
+                               (new_name, subproject_id, old_name))
+            self._conn.execute("UPDATE subprojects SET modified = ? WHERE id = ?",
+                               (datetime.now().isoformat(), subproject_id))
+
+    def remove_class(self, project_name, subproject_name, class_name):
+        subproject_id = self._subproject_id(project_name, subproject_name)
+        with self._conn:
+            self._conn.execute("DELETE FROM classes WHERE subproject_id = ? AND name = ?",
+                               (subproject_id, class_name))
+            self._conn.execute("UPDATE subprojects SET modified = ? WHERE id = ?",
+                               (datetime.now().isoformat(), subproject_id))
+
+
+def open_meta_store(data_dir=DATA_DIR):
+    backend = os.environ.get("DEEPTAG_META_STORE", "").lower()
+    if backend == "sqlite" or (backend != "json" and os.path.exists(os.path.join(data_dir, SQLITE_FILENAME))):
+        log("META", f"Using SQLite metadata store {os.path.join(data_dir, SQLITE_FILENAME)}")
+        return SqliteMetaStore(data_dir)
+    return JsonMetaStore(data_dir)
+
+
+def migrate_json_to_sqlite(data_dir=DATA_DIR, db_path=None) -> dict:
+    source = JsonMetaStore(data_dir)
+    target = SqliteMetaStore(data_dir, db_path)
+    counts = {'projects': 0, 'subprojects': 0, 'classes': 0}
+
+    try:
+        with target._conn:
+            for project in source.list_projects():
+                dir_name = os.path.basename(project['path'])
+                meta = source.read_project_meta(dir_name)
+                target._conn.execute(
+                    "INSERT OR REPLACE INTO projects (name, created, modified) VALUES (?, ?, ?)",
+                    (dir_name, meta.get("created"), meta.get("modified"))
+                )
+                project_id = target._project_id(dir_name)
+                counts['projects'] += 1
+
+                seen = set()
+                for subproject_name in project['subprojects']:
+                    if subproject_name in seen:
+                        log("META", f"Skipping duplicate subproject {dir_name}/{subproject_name} in meta.json")
+                        continue
+                    position = len(seen)
+                    seen.add(subproject_name)
+                    try:
+                        sub_meta = source.read_subproject_meta(dir_name, subproject_name)
+                    except (OSError, json.JSONDecodeError) as e:
+                        log("META", f"Subproject {dir_name}/{subproject_name} has no readable meta.json: {str(e)}")
+                        sub_meta = {}
+
+                    target._conn.execute(
+                        "INSERT INTO subprojects (project_id, name, position, created, modified) VALUES (?, ?, ?, ?, ?)",
+                        (project_id, subproject_name, position, sub_meta.get("created"), sub_meta.get("modified"))
+                    )
+                    subproject_id = target._subproject_id(dir_name, subproject_name)
+                    counts['subprojects'] += 1
+
+                    for class_position, class_name in enumerate(sub_meta.get("classes", [])):
+                        target._conn.execute(
+                            "INSERT OR IGNORE INTO classes (subproject_id, name, position) VALUES (?, ?, ?)",
+                            (subproject_id, class_name, class_position)
+                        )
+                        counts['classes'] += 1
+    finally:
+        target.close()
+
+    log("META", f"Migrated {counts['projects']} projects, {counts['subprojects']} subprojects "
+                f"and {counts['classes']} classes to {target.db_path}")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DeepTag metadata store tools")
+    parser.add_argument("command", choices=["migrate"], help="migrate data/*/meta.json into the SQLite store")
+    parser.add_argument("--data", default=DATA_DIR, help="data directory (default: data)")
+    parser.add_argument("--db", default=None, help=f"SQLite file (default: <data>/{SQLITE_FILENAME})")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(args.data, SQLITE_FILENAME)
+    if os.path.exists(db_path):
+        print(f"{db_path} already exists, remove it first to migrate again")
+        sys.exit(1)
+    migrate_json_to_sqlite(args.data, db_path)
@@ -0,0 +1,294 @@
+import os
+import math
+import time
+import operator
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.image_index import ImageIndex
+from app.utils.importer import PROGRESS_INTERVAL
+from app.utils.logger import log
+from app.utils.tracing import span
+
+
+HASH_METHODS = {
+    'phash': "Perceptual hash (DCT)",
+    'dhash': "Difference hash",
+    'ahash': "Average hash"
+}
+HASH_METHOD = os.environ.get("DEEPTAG_HASH_METHOD", "phash")
+DUPLICATE_DISTANCE = int(os.environ.get("DEEPTAG_DUPLICATE_DISTANCE", "3"))
+HASH_WORKERS = os.cpu_count() or 4
+HASH_BATCH = 128
+DUPLICATES_DIR = "duplicates"
+
+HASH_BITS = 64
+INDEX_CHUNKS = 4
+CHUNK_BITS = HASH_BITS // INDEX_CHUNKS
+DECODE_SIZES = {'ahash': (8, 8), 'dhash': (9, 8), 'phash': (32, 32)}
+DCT_BASIS = [[math.cos((2 * x + 1) * u * math.pi / 64) for x in range(32)] for u in range(8)]
+
+
+def hashing_available():
+    try:
+        from PySide6.QtGui import QImageReader
+        return True
+    except ImportError:
+        return False
+
+
+def _gray_rows(path, width, height) -> list[bytes]:
+    from PySide6.QtCore import QSize
+    from PySide6.QtGui import QImage, QImageReader
+
+    # Decoders that support it (JPEG among them) decode straight to the small size.
+    reader = QImageReader(path)
+    reader.setScaledSize(QSize(width, height))
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(reader.errorString())
+    image = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    data = bytes(image.constBits())
+    stride = image.bytesPerLine()
+    return [data[y * stride:y * stride + width] for y in range(height)]
+
+
+def image_hash(rows, method=HASH_METHOD) -> int:
+    if method == 'ahash':
+        pixels = b"".join(rows)
+        mean = sum(pixels) / len(pixels)
+        bits = [value > mean for value in pixels]
+    elif method == 'dhash':
+        bits = [row[x] < row[x + 1] for row in rows for x in range(len(row) - 1)]
+    else:
+        # 8x8 lowest frequencies of a separable 32x32 DCT-II, compared against their median.
+        coefficients = [[sum(map(operator.mul, basis, row)) for basis in DCT_BASIS] for row in rows]
+        low = [sum(map(operator.mul, basis, column)) for basis in DCT_BASIS for column in zip(*coefficients)]
+        median = sorted(low)[len(low) // 2]
+        bits = [value > median for value in low]
+
+    value = 0
+    for bit in bits:
+        value = value << 1 | bit
+    return value
+
+
+def _hash_batch(paths, method):
+    width, height = DECODE_SIZES[method]
+    results = []
+    for path in paths:
+        try:
+            results.append((image_hash(_gray_rows(path, width, height), method), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+def _to_signed(value):
+    return value - (1 << HASH_BITS) if value >> (HASH_BITS - 1) else value
+
+
+def _to_unsigned(value):
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def _chunk_masks(radius):
+    masks = [0]
+    for bits in range(1, radius + 1):
+        masks += [mask for mask in range(1 << CHUNK_BITS) if mask.bit_count() == bits]
+    return masks
+
+
+def find_duplicates(hashes, distance=DUPLICATE_DISTANCE) -> list[list[int]]:
+    # Multi-index hashing: two hashes within distance bits agree to within distance // 4 bits on one
+    # of the four 16-bit chunks, so only hashes sharing a (nearby) chunk value are compared.
+    # Equal hashes are collapsed first and matches are merged with union-find.
+    members = {}
+    for position, value in enumerate(hashes):
+        members.setdefault(value, []).append(position)
+    distinct = list(members)
+    parent = list(range(len(distinct)))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    masks = _chunk_masks(distance // INDEX_CHUNKS)
+    for chunk in range(INDEX_CHUNKS):
+        shift = chunk * CHUNK_BITS
+        buckets = {}
+        for node, value in enumerate(distinct):
+            buckets.setdefault(value >> shift & ((1 << CHUNK_BITS) - 1), []).append(node)
+
+        for key, bucket in buckets.items():
+            for mask in masks:
+                if mask == 0:
+                    pairs = ((a, bucket[i + 1:]) for i, a in enumerate(bucket))
+                elif key < key ^ mask and key ^ mask in buckets:
+                    other = buckets[key ^ mask]
+                    pairs = ((a, other) for a in bucket)
+                else:
+                    continue
+                for a, candidates in pairs:
+                    value = distinct[a]
+                    for b in candidates:
+                        if (value ^ distinct[b]).bit_count() <= distance:
+                            root_a, root_b = find(a), find(b)
+                            if root_a != root_b:
+                                parent[root_b] = root_a
+
+    groups = {}
+    for node, value in enumerate(distinct):
+        groups.setdefault(find(node), []).extend(members[value])
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def duplicates_to_drop(groups, annotated) -> set[tuple[str, str]]:
+    # Keeps the first annotated image of each group, or the first image, and never drops annotated ones.
+    drop = set()
+    for group in groups:
+        paths = [f"{folder}/{name}" for folder, name in group]
+        keep = next((position for position, path in enumerate(paths) if path in annotated), 0)
+        drop.update(image for position, (path, image) in enumerate(zip(paths, group))
+                    if position != keep and path not in annotated)
+    return drop
+
+
+def move_duplicates(subproject_path, images) -> tuple[int, list[tuple[str, str]]]:
+    # Dropped images are moved to duplicates/ next to images/, so they can be brought back by hand.
+    moved, failed = 0, []
+    for folder, name in images:
+        target_dir = os.path.join(subproject_path, DUPLICATES_DIR, folder)
+        try:
+            os.makedirs(target_dir, exist_ok=True)
+            os.replace(os.path.join(subproject_path, 'images', folder, name), os.path.join(target_dir, name))
+            moved += 1
+        except OSError as e:
+            failed.append((f"{folder}/{name}", str(e)))
+    log("HASH", f"Moved {moved} near-duplicates to {os.path.join(subproject_path, DUPLICATES_DIR)}")
+    return moved, failed
+
+
+class DuplicateJob:
+    # Hashes the images of a subproject that have no current hash and regroups near-duplicates.
+    # With rows set only those (folder, name, size, mtime_ns) rows are hashed, as done after an import.
+    def __init__(self, subproject_path, method=HASH_METHOD, distance=DUPLICATE_DISTANCE, workers=HASH_WORKERS,
+                 rows=None):
+        if method not in HASH_METHODS:
+            raise ValueError(f"Unknown hash method: {method}")
+        self.source = subproject_path
+        self.method = method
+        self.distance = distance
+        self.workers = workers
+        self.rows = rows
+        self._cancelled = threading.Event()
+        self._progress = None
+        self._last_report = 0.0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def run(self, progress=None) -> dict:
+        self._progress = progress
+        started = time.monotonic()
+        summary = {
+            'source': self.source,
+            'total': 0,
+            'hashed': 0,
+            'failed': [],
+            'groups': 0,
+            'duplicates': 0,
+            'cancelled': False,
+            'seconds': 0.0
+        }
+
+        index = ImageIndex(self.source)
+        try:
+            self._report("scan", 0, 0, 0, force=True)
+            index.refresh()
+            rows = self.rows
+            if index.get_state('hash_method') != self.method:
+                # Every stored hash is dropped, so all images are hashed again, not just the given rows.
+                index.clear_hashes()
+                index.set_state('hash_method', self.method)
+                rows = None
+            if rows is None:
+                rows = index.missing_hashes()
+            summary['total'] = len(rows)
+
+            if rows:
+                log("HASH", f"Hashing {len(rows)} images in {self.source} ({self.method}, {self.workers} workers)")
+                with span("duplicates.hash", "duplicates", images=len(rows), workers=self.workers):
+                    self._hash_all(index, rows, summary)
+
+            if not self.cancelled:
+                self._report("group", 0, 0, 0, force=True)
+                with span("duplicates.group", "duplicates", distance=self.distance):
+                    hashed = index.hashes()
+                    groups = find_duplicates([_to_unsigned(value) for _, _, value in hashed], self.distance)
+                    index.set_duplicates([[hashed[position][:2] for position in group] for group in groups])
+                summary['groups'] = len(groups)
+                summary['duplicates'] = sum(len(group) - 1 for group in groups)
+        finally:
+            index.close()
+
+        summary['cancelled'] = self.cancelled
+        summary['seconds'] = time.monotonic() - started
+        log("HASH", f"Finished: {summary['hashed']}/{summary['total']} images hashed, {summary['groups']} groups "
+                    f"with {summary['duplicates']} near-duplicates, {len(summary['failed'])} failed, "
+                    f"{summary['seconds']:.1f}s")
+        return summary
+
+    def _hash_all(self, index, rows, summary):
+        images_dir = os.path.join(self.source, 'images')
+        self._report("hash", 0, len(rows), 0, force=True)
+        # Workers decode with Qt, so they are spawned rather than forked from a process running a GUI.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            window = deque()
+            for start in range(0, len(rows), HASH_BATCH):
+                if self.cancelled:
+                    break
+                batch = rows[start:start + HASH_BATCH]
+                paths = [os.path.join(images_dir, folder, name) for folder, name, _, _ in batch]
+                window.append((batch, executor.submit(_hash_batch, paths, self.method)))
+                while len(window) > self.workers * 2:
+                    self._store_batch(index, *window.popleft(), summary)
+
+            while window:
+                batch, future = window.popleft()
+                if self.cancelled:
+                    future.cancel()
+                    continue
+                self._store_batch(index, batch, future, summary)
+
+        self._report("hash", summary['hashed'] + len(summary['failed']), len(rows), 0, force=True)
+
+    def _store_batch(self, index, batch, future, summary):
+        stored = []
+        for (folder, name, size, mtime_ns), (value, error) in zip(batch, future.result()):
+            if error is not None:
+                summary['failed'].append((f"{folder}/{name}", error))
+                log("ERROR", "Error hashing %s/%s: %s", folder, name, error)
+                stored.append((folder, name, size, mtime_ns, None))
+                continue
+            stored.append((folder, name, size, mtime_ns, _to_signed(value)))
+            summary['hashed'] += 1
+        index.set_hashes(stored)
+        self._report("hash", summary['hashed'] + len(summary['failed']), summary['total'], 0)
+
+    def _report(self, stage, done, total, nbytes, force=False):
+        if self._progress is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            self._progress(stage, done, total, nbytes)
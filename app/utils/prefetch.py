@@ -0,0 +1,151 @@
+import os
+import math
+import time
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QPixmap
+
+from app.utils.logger import debug
+from app.utils.tiles import TiledImage
+
+
+PREFETCH_AHEAD = int(os.environ.get("DEEPTAG_PREFETCH_AHEAD", "3"))
+PREFETCH_BEHIND = int(os.environ.get("DEEPTAG_PREFETCH_BEHIND", "1"))
+PREFETCH_MAX_DEPTH = 12
+PREFETCH_THREADS = 2
+PREFETCH_IMAGES = 2 * PREFETCH_MAX_DEPTH
+SMOOTHING = 0.3
+
+
+class _PrefetchSignals(QObject):
+    done = Signal(int, str, object, object, float)
+
+
+class _PrefetchTask(QRunnable):
+    def __init__(self, path, viewport, cache_dir, generation, signals):
+        super().__init__()
+        self.path = path
+        self.viewport = viewport
+        self.cache_dir = cache_dir
+        self.generation = generation
+        self.signals = signals
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            image = TiledImage(self.path, self.cache_dir)
+            # Large images that have to be read whole are left to the canvas, which opens them one at a time.
+            if image.needs_full_pass:
+                self.signals.done.emit(self.generation, self.path, image, [], time.monotonic() - started)
+                return
+            level = image.level_for_zoom(image.fit_zoom(*self.viewport))
+            cols, rows = image.grid(level)
+            tiles = [((self.path, level, col, row), image.render(level, col, row))
+                     for row in range(rows) for col in range(cols)]
+            image.release()
+        except Exception:
+            image, tiles = None, []
+        self.signals.done.emit(self.generation, self.path, image, tiles, time.monotonic() - started)
+
+
+class Prefetcher(QObject):
+    # Decodes the fit-to-view level of the images around the current one into the
+    # canvas tile cache. Look-ahead grows when the user steps faster than images decode.
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(PREFETCH_THREADS)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._paths = []
+        self._cache_dir = None
+        self._viewport = (1, 1)
+        self._images = OrderedDict()
+        self._queue = []
+        self._running = set()
+        self._generation = 0
+
+        self._index = None
+        self._direction = 1
+        self._last_visit = None
+        self._interval = None
+        self._decode_time = 0.0
+
+        self._signals = _PrefetchSignals()
+        self._signals.done.connect(self._on_done)
+
+    def set_paths(self, paths, cache_dir=None):
+        self._generation += 1
+        self._paths = list(paths)
+        self._cache_dir = cache_dir
+        self._images.clear()
+        self._queue = []
+        self._running.clear()
+        self._index = None
+        self._last_visit = None
+
+    def take(self, path):
+        image = self._images.get(path)
+        if image is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._images.move_to_end(path)
+        return image
+
+    def depth(self) -> tuple[int, int]:
+        ahead, behind = PREFETCH_AHEAD, PREFETCH_BEHIND
+        if self._interval:
+            needed = math.ceil(self._decode_time * PREFETCH_THREADS / max(self._interval, 0.05)) + 1
+            ahead = max(ahead, min(PREFETCH_MAX_DEPTH, needed))
+        return (ahead, behind) if self._direction > 0 else (behind, ahead)
+
+    def visit(self, index, viewport):
+        now = time.monotonic()
+        if self._index is not None and index != self._index:
+            self._direction = 1 if index > self._index else -1
+            interval = now - self._last_visit
+            self._interval = interval if self._interval is None else \
+                SMOOTHING * interval + (1 - SMOOTHING) * self._interval
+        self._index = index
+        self._last_visit = now
+
+        after, before = self.depth()
+        order = []
+        for distance in range(1, max(after, before) + 1):
+            if distance <= after:
+                order.append(index + distance * self._direction)
+            if distance <= before:
+                order.append(index - distance * self._direction)
+
+        self._viewport = (max(1, viewport.width()), max(1, viewport.height()))
+        self._queue = [self._paths[i] for i in order
+                       if 0 <= i < len(self._paths) and self._paths[i] not in self._images
+                       and self._paths[i] not in self._running]
+        debug("PREFETCH", "Visit %d: depth %d/%d, %d queued, %d hits, %d misses",
+              index, after, before, len(self._queue), self.hits, self.misses)
+        self._submit()
+
+    def _submit(self):
+        while len(self._running) < PREFETCH_THREADS and self._queue:
+            path = self._queue.pop(0)
+            self._running.add(path)
+            self.pool.start(_PrefetchTask(path, self._viewport, self._cache_dir, self._generation, self._signals))
+
+    def _on_done(self, generation, path, image, tiles, seconds):
+        if generation != self._generation:
+            return
+        self._running.discard(path)
+        self._decode_time = SMOOTHING * seconds + (1 - SMOOTHING) * self._decode_time
+
+        if image is not None:
+            for key, tile in tiles:
+                self.cache.put(key, QPixmap.fromImage(tile))
+            self._images[path] = image
+            while len(self._images) > PREFETCH_IMAGES:
+                self._images.popitem(last=False)
+        self._submit()
@@ -0,0 +1,95 @@
+from PySide6.QtCore import QObject, Signal
+
+from app.utils.workspace import Workspace
+
+
+class ProjectRepository(QObject):
+    projectsChanged = Signal()
+    projectChanged = Signal(str)
+    subprojectChanged = Signal(str, str)
+    folderChanged = Signal(str, str, str)
+
+    def __init__(self, store=None, tracker=None, parent=None):
+        super().__init__(parent)
+        self.workspace = Workspace(store)
+        self.store = self.workspace.store
+        self.tracker = None
+
+        if tracker is not None:
+            self.attach_tracker(tracker)
+
+    def attach_tracker(self, tracker):
+        self.tracker = tracker
+        tracker.projectsChanged.connect(self.reload)
+        tracker.projectChanged.connect(self.reload_project)
+        tracker.subprojectChanged.connect(self.reload_subproject)
+        tracker.folderChanged.connect(self.folderChanged)
+
+    def preload(self):
+        self.workspace.load()
+
+    def reload(self):
+        self.workspace.invalidate()
+        self.workspace.load()
+        self.projectsChanged.emit()
+
+    def reload_project(self, name):
+        if self.workspace.invalidate_project(name):
+            self.projectsChanged.emit()
+        self.projectChanged.emit(name)
+
+    def reload_subproject(self, project_name, subproject_name):
+        self.workspace.invalidate_subproject(project_name, subproject_name)
+        self.subprojectChanged.emit(project_name, subproject_name)
+
+    def projects(self) -> list[dict]:
+        return self.workspace.projects()
+
+    def project(self, name):
+        return self.workspace.project(name)
+
+    def subprojects(self, project_name) -> list[dict]:
+        return self.workspace.subprojects(project_name)
+
+    def subproject_path(self, project_name, subproject_name):
+        return self.workspace.subproject_path(project_name, subproject_name)
+
+    def classes(self, project_name, subproject_name) -> list[str]:
+        return self.workspace.classes(project_name, subproject_name)
+
+    def create_project(self, name):
+        self.store.create_project(name)
+        self.reload_project(name)
+
+    def rename_project(self, old_name, new_name):
+        self.store.rename_project(old_name, new_name)
+        self.reload_project(old_name)
+        self.reload_project(new_name)
+
+    def remove_project(self, name):
+        self.store.remove_project(name)
+        self.reload_project(name)
+
+    def create_subproject(self, project_name, subproject_name):
+        self.store.create_subproject(project_name, subproject_name)
+        self.reload_project(project_name)
+
+    def rename_subproject(self, project_name, old_name, new_name):
+        self.store.rename_subproject(project_name, old_name, new_name)
+        self.reload_project(project_name)
+
+    def remove_subproject(self, project_name, subproject_name):
+        self.store.remove_subproject(project_name, subproject_name)
+        self.reload_project(project_name)
+
+    def add_class(self, project_name, subproject_name, class_name):
+        self.workspace.add_class(project_name, subproject_name, class_name)
+        self.subprojectChanged.emit(project_name, subproject_name)
+
+    def rename_class(self, project_name, subproject_name, old_name, new_name):
+        self.workspace.rename_class(project_name, subproject_name, old_name, new_name)
+        self.subprojectChanged.emit(project_name, subproject_name)
+
+    def remove_class(self, project_name, subproject_name, class_name):
+        self.workspace.remove_class(project_name, subproject_name, class_name)
+        self.subprojectChanged.emit(project_name, subproject_name)
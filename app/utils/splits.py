@@ -0,0 +1,189 @@
+import json
+import time
+import zlib
+from bisect import bisect_right
+from collections import Counter
+from itertools import accumulate
+
+from app.utils.annotations import AnnotationStore
+from app.utils.image_index import ImageIndex
+from app.utils.logger import log
+
+
+SPLITS = ('train', 'val', 'test')
+DEFAULT_RATIOS = (0.8, 0.1, 0.1)
+UNANNOTATED = -1
+
+SPLIT_PRESETS = {
+    "80 / 10 / 10": (0.8, 0.1, 0.1),
+    "70 / 15 / 15": (0.7, 0.15, 0.15),
+    "70 / 20 / 10": (0.7, 0.2, 0.1),
+    "90 / 10 / 0": (0.9, 0.1, 0.0)
+}
+
+
+def image_strata(annotations) -> dict[str, int]:
+    # An image is stratified by the rarest class it contains, so rare classes are
+    # spread over the splits first and common ones follow from the ratios.
+    pairs = set(zip(annotations.column('image'), annotations.column('class')))
+    frequency = Counter(class_id for _, class_id in pairs)
+
+    rarest = {}
+    for image_id, class_id in sorted(pairs, key=lambda pair: (-frequency[pair[1]], -pair[1])):
+        rarest[image_id] = class_id
+
+    names = annotations.images()
+    return {names[image_id]: class_id for image_id, class_id in rarest.items()}
+
+
+def _unit_hashes(keys, seed) -> list[int]:
+    return [zlib.crc32(f"{seed}:{key}".encode('utf-8')) for key in keys]
+
+
+def _group_units(rows, strata, group_by_folder, frequency):
+    # Units are parallel lists of keys, sizes and strata; a folder takes the
+    # rarest stratum of its images. Single images have no sizes list.
+    if not group_by_folder:
+        keys = [f"{folder}/{name}" for folder, name in rows]
+        return keys, None, [strata.get(key, UNANNOTATED) for key in keys]
+
+    units = {}
+    for folder, name in rows:
+        stratum = strata.get(f"{folder}/{name}", UNANNOTATED)
+        unit = units.get(folder)
+        if unit is None:
+            units[folder] = [1, stratum]
+            continue
+        unit[0] += 1
+        if stratum != UNANNOTATED and (unit[1] == UNANNOTATED or
+                                       (frequency[stratum], stratum) < (frequency[unit[1]], unit[1])):
+            unit[1] = stratum
+    return list(units), [size for size, _ in units.values()], [stratum for _, stratum in units.values()]
+
+
+def _cut(keys, sizes, unit_strata, ratios, seed):
+    # Full pass: shuffle each stratum by a seeded hash and cut it at the ratio
+    # boundaries, weighting folders by their image count.
+    hashes = _unit_hashes(keys, seed)
+    buckets = {}
+    for position, stratum in enumerate(unit_strata):
+        buckets.setdefault(stratum, []).append(position)
+
+    boundaries = list(accumulate(ratios))[:-1]
+    assignment, counts = [0] * len(keys), {}
+    for stratum, members in buckets.items():
+        members.sort(key=hashes.__getitem__)
+        stratum_counts = counts[stratum] = [0] * len(SPLITS)
+        if sizes is None:
+            edges = [0] + [round(boundary * len(members)) for boundary in boundaries] + [len(members)]
+            for split in range(len(SPLITS)):
+                for member in members[edges[split]:edges[split + 1]]:
+                    assignment[member] = split
+                stratum_counts[split] = edges[split + 1] - edges[split]
+            continue
+
+        total, position = sum(sizes[member] for member in members), 0
+        for member in members:
+            split = bisect_right(boundaries, (position + sizes[member] / 2) / total)
+            position += sizes[member]
+            assignment[member] = split
+            stratum_counts[split] += sizes[member]
+    return assignment, counts
+
+
+def _fill(keys, sizes, unit_strata, ratios, seed, counts):
+    # Incremental pass: new units go to whichever split is furthest below its
+    # ratio within their stratum, so earlier assignments never move.
+    hashes = _unit_hashes(keys, seed)
+    assignment = [0] * len(keys)
+    for member in sorted(range(len(keys)), key=lambda member: (unit_strata[member], hashes[member])):
+        size = sizes[member] if sizes else 1
+        stratum_counts = counts.setdefault(unit_strata[member], [0] * len(SPLITS))
+        total = sum(stratum_counts) + size
+        deficits = [ratio * total - assigned for ratio, assigned in zip(ratios, stratum_counts)]
+        split = max(range(len(SPLITS)), key=lambda i: (deficits[i], -i))
+        stratum_counts[split] += size
+        assignment[member] = split
+    return assignment
+
+
+def assign_splits(subproject_path, ratios=DEFAULT_RATIOS, seed=0, group_by_folder=True, reset=False,
+                  index=None, annotations=None) -> dict:
+    if len(ratios) != len(SPLITS) or sum(ratios) <= 0:
+        raise ValueError(f"Expected {len(SPLITS)} split ratios, got {ratios}")
+    ratios = [ratio / sum(ratios) for ratio in ratios]
+
+    started = time.monotonic()
+    own_index, own_annotations = index is None, annotations is None
+    index = index or ImageIndex(subproject_path)
+    annotations = annotations or AnnotationStore(subproject_path)
+    try:
+        index.refresh()
+        config = json.dumps({'ratios': [round(ratio, 6) for ratio in ratios], 'seed': seed,
+                             'group_by_folder': group_by_folder})
+        incremental = not reset and index.get_state('split_config') == config
+        if incremental and not index.unassigned_count():
+            totals = index.split_counts()
+            counts = {UNANNOTATED: [totals.get(split, 0) for split in range(len(SPLITS))]}
+            return _summary(subproject_path, counts, 0, 0, started, incremental)
+
+        strata = image_strata(annotations)
+        frequency = Counter(strata.values())
+
+        counts = {}
+        if incremental:
+            # Existing assignments are kept; they only feed the per-stratum balance.
+            rows = []
+            for folder, name, split in index.image_names(with_split=True):
+                if split is None:
+                    rows.append((folder, name))
+                else:
+                    stratum = strata.get(f"{folder}/{name}", UNANNOTATED)
+                    counts.setdefault(stratum, [0] * len(SPLITS))[split] += 1
+        else:
+            rows = index.image_names()
+        keys, sizes, unit_strata = _group_units(rows, strata, group_by_folder, frequency)
+        units = len(keys)
+
+        folders = []
+        if incremental and group_by_folder:
+            # New images in a folder that already has a split simply join it.
+            existing = index.folder_splits()
+            kept = [member for member, key in enumerate(keys) if key not in existing]
+            for member, key in enumerate(keys):
+                if key in existing:
+                    counts.setdefault(unit_strata[member], [0] * len(SPLITS))[existing[key]] += sizes[member]
+                    folders.append((existing[key], key))
+            keys, sizes, unit_strata = ([values[member] for member in kept] for values in (keys, sizes, unit_strata))
+
+        if incremental:
+            assignment = _fill(keys, sizes, unit_strata, ratios, seed, counts)
+        else:
+            assignment, counts = _cut(keys, sizes, unit_strata, ratios, seed)
+
+        if group_by_folder:
+            folders.extend(zip(assignment, keys))
+            images = []
+        else:
+            images = [(folder, name, split) for (folder, name), split in zip(rows, assignment)]
+        index.set_splits(images, folders, replace=not incremental)
+        index.set_state('split_config', config)
+        return _summary(subproject_path, counts, len(rows), units, started, incremental)
+    finally:
+        if own_annotations:
+            annotations.close()
+        if own_index:
+            index.close()
+
+
+def _summary(subproject_path, counts, assigned, units, started, incremental) -> dict:
+    totals = [sum(column) for column in zip(*counts.values())] or [0] * len(SPLITS)
+    summary = {
+        'counts': dict(zip(SPLITS, totals)),
+        'assigned': assigned,
+        'units': units,
+        'seconds': time.monotonic() - started
+    }
+    log("SPLIT", f"{'Updated' if incremental else 'Computed'} splits for {subproject_path}: {summary['counts']}, "
+                 f"{assigned} images assigned in {summary['seconds']:.2f}s")
+    return summary
@@ -0,0 +1,225 @@
+import os
+import math
+import time
+import sqlite3
+from collections import Counter
+
+from app.utils.annotations import ANNOTATIONS_FILENAME
+from app.utils.image_index import INDEX_FILENAME, ImageIndex
+from app.utils.logger import debug, log
+
+
+STATS_VERSION = 1
+SIZE_BINS = 14
+ASPECT_LIMIT = 8
+
+
+def annotation_stamp(annotations_path) -> str:
+    try:
+        stat = os.stat(annotations_path)
+    except FileNotFoundError:
+        return f"{STATS_VERSION}:missing"
+    return f"{STATS_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def size_bin(w, h) -> int:
+    # log2 of the box side: bin 0 is up to 2px, bin 13 is 8192px and larger
+    side = math.sqrt(w * h)
+    return 0 if side < 2 else min(SIZE_BINS - 1, int(math.log2(side)))
+
+
+def aspect_bin(w, h) -> int:
+    # Half-octave steps of w / h, so bin 0 is square and +-2 is 2:1 / 1:2
+    return max(-ASPECT_LIMIT, min(ASPECT_LIMIT, round(2 * math.log2(w / h))))
+
+
+def _folder(image) -> str:
+    return image.split('/', 1)[0] if '/' in image else ""
+
+
+def _contributions(boxes, sign, folders, classes, class_images, histograms, image):
+    if not boxes:
+        return
+    folder = folders.setdefault(_folder(image), [0, 0])
+    folder[0] += sign
+    folder[1] += sign * len(boxes)
+
+    for class_id in {box[0] for box in boxes}:
+        class_images[class_id] += sign
+    for class_id, _, _, w, h, _ in boxes:
+        classes[class_id] += sign
+        if w > 0 and h > 0:
+            histograms[('size', size_bin(w, h))] += sign
+            histograms[('aspect', aspect_bin(w, h))] += sign
+
+
+# Aggregates live next to the image index so opening the statistics only reads a
+# few small tables. Saves of the annotation store apply per-image deltas; when the
+# stored stamp does not match the annotation file the aggregates are rebuilt.
+class SubprojectStats:
+    def __init__(self, subproject_path):
+        self.subproject_path = subproject_path
+        self.annotations_path = os.path.join(subproject_path, ANNOTATIONS_FILENAME)
+
+        self._conn = sqlite3.connect(os.path.join(subproject_path, INDEX_FILENAME), timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_folders ("
+                "folder TEXT PRIMARY KEY, annotated INTEGER NOT NULL, boxes INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_classes ("
+                "class_id INTEGER PRIMARY KEY, instances INTEGER NOT NULL, images INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_histograms ("
+                "kind TEXT NOT NULL, bin INTEGER NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (kind, bin)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS stats_state (key TEXT PRIMARY KEY, value TEXT)")
+
+    def close(self):
+        self._conn.close()
+
+    def stamp(self):
+        row = self._conn.execute("SELECT value FROM stats_state WHERE key = 'annotations'").fetchone()
+        return None if row is None else row[0]
+
+    def is_current(self) -> bool:
+        return self.stamp() == annotation_stamp(self.annotations_path)
+
+    def rebuild(self, annotations, stamp):
+        started = time.monotonic()
+        folders = {}
+        for image, count in annotations.box_counts().items():
+            if count:
+                folder = folders.setdefault(_folder(image), [0, 0])
+                folder[0] += 1
+                folder[1] += count
+
+        class_column = annotations.column('class')
+        classes = Counter(class_column)
+        class_images = Counter(class_id for _, class_id in set(zip(annotations.column('image'), class_column)))
+
+        histograms = Counter()
+        for w, h in zip(annotations.column('w'), annotations.column('h')):
+            if w > 0 and h > 0:
+                histograms[('size', size_bin(w, h))] += 1
+                histograms[('aspect', aspect_bin(w, h))] += 1
+
+        with self._conn:
+            for table in ("stats_folders", "stats_classes", "stats_histograms"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.executemany("INSERT INTO stats_folders (folder, annotated, boxes) VALUES (?, ?, ?)",
+                                   [(folder, annotated, boxes) for folder, (annotated, boxes) in folders.items()])
+            self._conn.executemany("INSERT INTO stats_classes (class_id, instances, images) VALUES (?, ?, ?)",
+                                   [(class_id, count, class_images[class_id]) for class_id, count in classes.items()])
+            self._conn.executemany("INSERT INTO stats_histograms (kind, bin, count) VALUES (?, ?, ?)",
+                                   [(kind, index, count) for (kind, index), count in histograms.items()])
+            self._set_stamp(stamp)
+        log("STATS", f"Rebuilt statistics for {self.subproject_path}: {sum(classes.values())} boxes "
+                     f"in {time.monotonic() - started:.2f}s")
+
+    def apply(self, changes, old_stamp, new_stamp) -> bool:
+        if self.stamp() != old_stamp:
+            debug("STATS", "Statistics for %s are stale, skipping %d changes", self.subproject_path, len(changes))
+            return False
+
+        folders, classes, class_images, histograms = {}, Counter(), Counter(), Counter()
+        for image, (old_boxes, new_boxes) in changes.items():
+            _contributions(old_boxes, -1, folders, classes, class_images, histograms, image)
+            _contributions(new_boxes, 1, folders, classes, class_images, histograms, image)
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO stats_folders (folder, annotated, boxes) VALUES (?, ?, ?) ON CONFLICT (folder) "
+                "DO UPDATE SET annotated = annotated + excluded.annotated, boxes = boxes + excluded.boxes",
+                [(folder, annotated, boxes) for folder, (annotated, boxes) in folders.items()])
+            self._conn.executemany(
+                "INSERT INTO stats_classes (class_id, instances, images) VALUES (?, ?, ?) ON CONFLICT (class_id) "
+                "DO UPDATE SET instances = instances + excluded.instances, images = images + excluded.images",
+                [(class_id, classes[class_id], class_images[class_id]) for class_id in classes.keys() | class_images])
+            self._conn.executemany(
+                "INSERT INTO stats_histograms (kind, bin, count) VALUES (?, ?, ?) ON CONFLICT (kind, bin) "
+                "DO UPDATE SET count = count + excluded.count",
+                [(kind, index, count) for (kind, index), count in histograms.items()])
+            self._conn.execute("DELETE FROM stats_folders WHERE annotated <= 0")
+            self._conn.execute("DELETE FROM stats_classes WHERE instances <= 0")
+            self._conn.execute("DELETE FROM stats_histograms WHERE count <= 0")
+            self._set_stamp(new_stamp)
+        return True
+
+    def _set_stamp(self, stamp):
+        self._conn.execute("INSERT OR REPLACE INTO stats_state (key, value) VALUES ('annotations', ?)", (stamp,))
+
+    def snapshot(self, class_names=(), index=None) -> dict:
+        own_index = index is None
+        index = index or ImageIndex(self.subproject_path)
+        try:
+            index.refresh()
+            images = dict(index.folder_counts())
+        finally:
+            if own_index:
+                index.close()
+
+        annotated = {folder: (count, boxes) for folder, count, boxes in
+                     self._conn.execute("SELECT folder, annotated, boxes FROM stats_folders")}
+        folders = []
+        for folder in sorted(images.keys() | annotated.keys()):
+            count, boxes = annotated.get(folder, (0, 0))
+            folders.append((folder, images.get(folder, 0), count, boxes))
+
+        classes = {}
+        for class_id, instances, image_count in self._conn.execute(
+                "SELECT class_id, instances, images FROM stats_classes ORDER BY class_id"):
+            name = class_names[class_id] if class_id < len(class_names) else f"#{class_id}"
+            classes[name] = (instances, image_count)
+
+        histograms = {'size': {}, 'aspect': {}}
+        for kind, index_bin, count in self._conn.execute("SELECT kind, bin, count FROM stats_histograms"):
+            histograms.setdefault(kind, {})[index_bin] = count
+
+        return {
+            'folders': folders,
+            'classes': classes,
+            'sizes': histograms['size'],
+            'aspects': histograms['aspect'],
+            'images': sum(images.values()),
+            'annotated': sum(count for _, _, count, _ in folders),
+            'boxes': sum(boxes for _, _, _, boxes in folders),
+            'current': self.is_current()
+        }
+
+
+def record_changes(subproject_path, changes, old_stamp, new_stamp):
+    if not changes or not os.path.exists(os.path.join(subproject_path, INDEX_FILENAME)):
+        return
+    try:
+        stats = SubprojectStats(subproject_path)
+        try:
+            stats.apply(changes, old_stamp, new_stamp)
+        finally:
+            stats.close()
+    except sqlite3.Error as e:
+        log("ERROR", f"Cannot update statistics for {subproject_path}: {str(e)}")
+
+
+def merge_snapshots(snapshots) -> dict:
+    # snapshots: (label, snapshot) pairs; folders are prefixed with their label
+    merged = {'folders': [], 'classes': {}, 'sizes': Counter(), 'aspects': Counter(),
+              'images': 0, 'annotated': 0, 'boxes': 0, 'current': True}
+    for label, snapshot in snapshots:
+        merged['folders'].extend((f"{label}/{folder}" if folder else label, *values)
+                                 for folder, *values in snapshot['folders'])
+        for name, (instances, images) in snapshot['classes'].items():
+            total_instances, total_images = merged['classes'].get(name, (0, 0))
+            merged['classes'][name] = (total_instances + instances, total_images + images)
+        merged['sizes'].update(snapshot['sizes'])
+        merged['aspects'].update(snapshot['aspects'])
+        for key in ('images', 'annotated', 'boxes'):
+            merged[key] += snapshot[key]
+        merged['current'] = merged['current'] and snapshot['current']
+    merged['sizes'], merged['aspects'] = dict(merged['sizes']), dict(merged['aspects'])
+    return merged
@@ -0,0 +1,59 @@
+import os
+
+from PySide6.QtCore import QObject, QSettings, Signal
+from PySide6.QtWidgets import QApplication
+
+from app.utils.logger import log
+
+
+STYLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "styles")
+THEMES = {
+    "light": ("Light", "style.css"),
+    "dark": ("Dark", "dark.css")
+}
+DEFAULT_THEME = "light"
+
+
+def set_state(widget, name, value):
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    widget.style().unpolish(widget)
+    widget.style().polish(widget)
+
+
+class ThemeManager(QObject):
+    themeChanged = Signal(str)
+
+    def __init__(self, app=None, parent=None):
+        super().__init__(parent)
+        self.app = app or QApplication.instance()
+        self.settings = QSettings("DeepTag", "DeepTag")
+        self._stylesheets = {}
+        self.current = None
+
+    def themes(self) -> list[tuple[str, str]]:
+        return [(name, label) for name, (label, _) in THEMES.items()]
+
+    def stylesheet(self, name) -> str:
+        if name not in self._stylesheets:
+            path = os.path.join(STYLES_DIR, THEMES[name][1])
+            with open(path, 'r', encoding='utf-8') as f:
+                self._stylesheets[name] = f.read()
+            log("STYLE", f"Loaded {len(self._stylesheets[name])} characters of CSS from {path}")
+        return self._stylesheets[name]
+
+    def saved_theme(self) -> str:
+        name = os.environ.get("DEEPTAG_THEME") or self.settings.value("theme", DEFAULT_THEME)
+        return name if name in THEMES else DEFAULT_THEME
+
+    def apply(self, name=None):
+        name = name or self.saved_theme()
+        if name == self.current:
+            return
+
+        self.app.setStyleSheet(self.stylesheet(name))
+        self.current = name
+        self.settings.setValue("theme", name)
+        log("STYLE", f"Applied theme: {name}")
+        self.themeChanged.emit(name)
@@ -0,0 +1,301 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import Qt, QCoreApplication, QObject, QRunnable, QThread, QThreadPool, QTimer, Signal
+from PySide6.QtGui import QImage, QImageReader
+
+from app.utils.logger import log
+
+
+THUMBNAIL_SIZE = 200
+THUMBNAIL_CACHE_DIR = os.path.join(".cache", "thumbnails")
+THUMBNAIL_CACHE_BUDGET = int(os.environ.get("DEEPTAG_THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024
+THUMBNAIL_QUEUE_LIMIT = 512
+THUMBNAIL_MEMORY_BUDGET = 64 * 1024 * 1024
+THUMBNAIL_SAVE_DELAY_MS = 5000
+
+
+class ThumbnailCache:
+    def __init__(self, subproject_path, size=THUMBNAIL_SIZE, budget=THUMBNAIL_CACHE_BUDGET):
+        self.cache_dir = os.path.join(subproject_path, THUMBNAIL_CACHE_DIR)
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.size = size
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('size') != self.size:
+                raise ValueError(f"thumbnail size changed to {self.size}")
+            for key, ext, nbytes in index.get('entries', []):
+                self._entries[key] = (ext, nbytes)
+                self._total_bytes += nbytes
+        except FileNotFoundError:
+            self._rebuild_index()
+        except Exception as e:
+            log("CACHE", f"Rebuilding thumbnail index {self.index_path}: {str(e)}")
+            self._rebuild_index()
+
+    def _rebuild_index(self):
+        self._entries.clear()
+        self._total_bytes = 0
+
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            key, ext = os.path.splitext(entry.name)
+            if entry.is_file() and ext in ('.jpg', '.png'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, key, ext, stat.st_size))
+
+        for _, key, ext, nbytes in sorted(files):
+            self._entries[key] = (ext, nbytes)
+            self._total_bytes += nbytes
+
+        self._dirty = True
+        self._evict()
+
+    def _key(self, path):
+        stat = os.stat(path)
+        raw = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{self.size}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, path) -> QImage:
+        key = self._key(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._dirty = True
+
+        if entry is not None:
+            image = QImage(os.path.join(self.cache_dir, key + entry[0]))
+            if not image.isNull():
+                with self._lock:
+                    self.hits += 1
+                return image
+            self._discard(key)
+
+        with self._lock:
+            self.misses += 1
+
+        image = self.render(path, self.size)
+        if not image.isNull():
+            self._store(key, image)
+        return image
+
+    @staticmethod
+    def render(path, size) -> QImage:
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+
+        source_size = reader.size()
+        if source_size.isValid() and (source_size.width() > size or source_size.height() > size):
+            reader.setScaledSize(source_size.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio))
+
+        image = reader.read()
+        if image.isNull():
+            return image
+
+        if image.width() > size or image.height() > size:
+            image = image.scaled(size, size,
+                                 Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        return image
+
+    def _store(self, key, image):
+        ext = '.png' if image.hasAlphaChannel() else '.jpg'
+        file_path = os.path.join(self.cache_dir, key + ext)
+        if not image.save(file_path, quality=90):
+            log("ERROR", "Failed to write thumbnail %s", file_path)
+            return
+
+        nbytes = os.path.getsize(file_path)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[key] = (ext, nbytes)
+            self._total_bytes += nbytes
+            self._dirty = True
+            self._evict()
+
+    def _discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self._total_bytes -= entry[1]
+            self._dirty = True
+        self._remove_file(key + entry[0])
+
+    def _evict(self):
+        while self._total_bytes > self.budget and self._entries:
+            key, (ext, nbytes) = self._entries.popitem(last=False)
+            self._total_bytes -= nbytes
+            self._remove_file(key + ext)
+
+    def _remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            index = {
+                'size': self.size,
+                'entries': [[key, ext, nbytes] for key, (ext, nbytes) in self._entries.items()]
+            }
+            self._dirty = False
+
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'budget': self.budget
+            }
+
+
+class _ThumbnailSignals(QObject):
+    loaded = Signal(int, int, QImage)
+    failed = Signal(int, int, str)
+
+
+class _ThumbnailTask(QRunnable):
+    def __init__(self, cache, path, index, generation, cancelled, signals):
+        super().__init__()
+        self.cache = cache
+        self.path = path
+        self.index = index
+        self.generation = generation
+        self.cancelled = cancelled
+        self.signals = signals
+
+    def run(self):
+        if self.cancelled.is_set():
+            return
+        try:
+            image = self.cache.get(self.path)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, self.index, str(e))
+            return
+
+        if self.cancelled.is_set():
+            return
+        if image.isNull():
+            self.signals.failed.emit(self.generation, self.index, "unsupported or corrupt file")
+        else:
+            self.signals.loaded.emit(self.generation, self.index, image)
+
+
+class ThumbnailLoader(QObject):
+    loaded = Signal(int, QImage)
+    failed = Signal(int, str)
+    finished = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, QThread.idealThreadCount() - 1))
+
+        self._cache = None
+        self._queue = OrderedDict()
+        self._running = set()
+        self._generation = 0
+        self._cancelled = threading.Event()
+
+        self._signals = _ThumbnailSignals()
+        self._signals.loaded.connect(self._on_loaded)
+        self._signals.failed.connect(self._on_failed)
+
+        # The cache index is rewritten whole, so it is saved a while after scrolling stops, not per drain.
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(THUMBNAIL_SAVE_DELAY_MS)
+        self._save_timer.timeout.connect(self._save)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self._save)
+
+    def start(self, cache):
+        self.cancel()
+        self._generation += 1
+        self._cancelled = threading.Event()
+        self._cache = cache
+
+    def request(self, index, path):
+        if self._cache is None or index in self._running:
+            return
+        if index in self._queue:
+            self._queue.move_to_end(index)
+            return
+
+        self._queue[index] = path
+        if len(self._queue) > THUMBNAIL_QUEUE_LIMIT:
+            self._queue.popitem(last=False)
+        self._submit()
+
+    def cancel(self):
+        if self._cache is None:
+            return
+        self._cancelled.set()
+        self._queue.clear()
+        self._running.clear()
+        self._save()
+        self._cache = None
+
+    def _submit(self):
+        while len(self._running) < self.pool.maxThreadCount() and self._queue:
+            index, path = self._queue.popitem(last=True)
+            self._running.add(index)
+            self.pool.start(_ThumbnailTask(self._cache, path, index, self._generation,
+                                           self._cancelled, self._signals))
+
+    def _on_loaded(self, generation, index, image):
+        if generation != self._generation or self._cache is None:
+            return
+        self.loaded.emit(index, image)
+        self._task_done(index)
+
+    def _on_failed(self, generation, index, error):
+        if generation != self._generation or self._cache is None:
+            return
+        self.failed.emit(index, error)
+        self._task_done(index)
+
+    def _task_done(self, index):
+        self._running.discard(index)
+        self._submit()
+        if not self._running and not self._queue:
+            self._save_timer.start()
+            self.finished.emit()
+
+    def _save(self):
+        self._save_timer.stop()
+        if self._cache is not None:
+            self._cache.save()
@@ -0,0 +1,215 @@
+import struct
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QRect
+from PySide6.QtGui import QImage, QPainter
+
+
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+TYPE_SHORT = 3
+TYPE_LONG = 4
+
+TAG_WIDTH = 256
+TAG_HEIGHT = 257
+TAG_BITS = 258
+TAG_COMPRESSION = 259
+TAG_STRIP_OFFSETS = 273
+TAG_ORIENTATION = 274
+TAG_SAMPLES = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_PLANAR = 284
+TAG_TILE_WIDTH = 322
+TAG_TILE_LENGTH = 323
+TAG_TILE_OFFSETS = 324
+TAG_TILE_BYTE_COUNTS = 325
+
+# Tags a single strip or tile needs to be decoded on its own: sample layout, photometric
+# interpretation, fill order, predictor, color map, extra and sample formats, JPEG tables and YCbCr.
+DECODE_TAGS = {258, 259, 262, 266, 277, 284, 317, 320, 338, 339, 347, 530, 531, 532}
+COMPRESSION_OLD_JPEG = 6
+
+CHUNK_DECODE_LIMIT = 64 * 1024 * 1024
+CHUNK_CACHE_BUDGET = 64 * 1024 * 1024
+
+
+class TiffLayout:
+    # Strip or tile layout of the first image of a TIFF file. Each strip or tile is decoded by
+    # wrapping it in a one-chunk TIFF of its own, so Qt's TIFF reader never sees the whole image.
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(8)
+            if header[:4] == b"II*\x00":
+                self.order = "<"
+            elif header[:4] == b"MM\x00*":
+                self.order = ">"
+            else:
+                raise ValueError("not a classic TIFF file")
+            self.entries = self._read_ifd(f, struct.unpack(self.order + "I", header[4:8])[0])
+
+        self.width = self.value(TAG_WIDTH)
+        self.height = self.value(TAG_HEIGHT)
+        samples = self.value(TAG_SAMPLES, 1)
+        if self.value(TAG_PLANAR, 1) != 1 and samples > 1:
+            raise ValueError("planar TIFF layout")
+        if self.value(TAG_ORIENTATION, 1) != 1:
+            raise ValueError("rotated TIFF orientation")
+        if self.value(TAG_COMPRESSION, 1) == COMPRESSION_OLD_JPEG:
+            raise ValueError("old-style JPEG compression")
+
+        self.tiled = TAG_TILE_OFFSETS in self.entries
+        if self.tiled:
+            self.chunk_width = self.value(TAG_TILE_WIDTH)
+            self.chunk_height = self.value(TAG_TILE_LENGTH)
+            self.offsets = self.values(TAG_TILE_OFFSETS)
+            self.byte_counts = self.values(TAG_TILE_BYTE_COUNTS)
+        else:
+            self.chunk_width = self.width
+            self.chunk_height = min(self.value(TAG_ROWS_PER_STRIP, self.height), self.height)
+            self.offsets = self.values(TAG_STRIP_OFFSETS)
+            self.byte_counts = self.values(TAG_STRIP_BYTE_COUNTS)
+        self.across = -(-self.width // self.chunk_width)
+        self.down = -(-self.height // self.chunk_height)
+        if len(self.offsets) < self.across * self.down or len(self.byte_counts) < len(self.offsets):
+            raise ValueError("missing strip or tile offsets")
+
+        # Decoded chunks are at most 4 bytes per pixel, as Qt converts them to 32-bit images.
+        self.chunk_bytes = self.chunk_width * self.chunk_height * max(4, sum(self.values(TAG_BITS, (8,))) // 8)
+        if self.chunk_bytes > CHUNK_DECODE_LIMIT:
+            raise ValueError(f"{self.chunk_width}x{self.chunk_height} strips or tiles are too large")
+
+    def _read_ifd(self, f, offset):
+        f.seek(offset)
+        count = struct.unpack(self.order + "H", f.read(2))[0]
+        data = f.read(count * 12)
+        entries = {}
+        for index in range(count):
+            tag, field_type, length = struct.unpack_from(self.order + "HHI", data, index * 12)
+            if field_type not in TYPE_SIZES:
+                continue
+            nbytes = TYPE_SIZES[field_type] * length
+            raw = data[index * 12 + 8:index * 12 + 8 + nbytes]
+            if nbytes > 4:
+                f.seek(struct.unpack_from(self.order + "I", data, index * 12 + 8)[0])
+                raw = f.read(nbytes)
+            entries[tag] = (field_type, length, raw)
+        return entries
+
+    def values(self, tag, default=None):
+        if tag not in self.entries:
+            if default is None:
+                raise ValueError(f"TIFF tag {tag} is missing")
+            return default
+        field_type, length, raw = self.entries[tag]
+        if field_type not in (TYPE_SHORT, TYPE_LONG, 1):
+            raise ValueError(f"TIFF tag {tag} is not an integer")
+        code = {1: "B", TYPE_SHORT: "H", TYPE_LONG: "I"}[field_type]
+        return struct.unpack(f"{self.order}{length}{code}", raw)
+
+    def value(self, tag, default=None):
+        return self.values(tag, None if default is None else (default,))[0]
+
+    def chunk_rect(self, index) -> QRect:
+        x, y = index % self.across * self.chunk_width, index // self.across * self.chunk_height
+        if self.tiled:
+            return QRect(x, y, self.chunk_width, self.chunk_height)
+        return QRect(x, y, self.width, min(self.chunk_height, self.height - y))
+
+    def chunks_in(self, rect) -> list[int]:
+        first_col, last_col = rect.left() // self.chunk_width, min(self.across - 1, rect.right() // self.chunk_width)
+        first_row, last_row = rect.top() // self.chunk_height, min(self.down - 1, rect.bottom() // self.chunk_height)
+        return [row * self.across + col for row in range(first_row, last_row + 1)
+                for col in range(first_col, last_col + 1)]
+
+    def chunk_file(self, index, data) -> bytes:
+        # A one-chunk TIFF: header, IFD, out-of-line values, then the compressed chunk.
+        rect = self.chunk_rect(index)
+        entries = {tag: entry for tag, entry in self.entries.items() if tag in DECODE_TAGS}
+        entries[TAG_WIDTH] = self._long(rect.width())
+        entries[TAG_HEIGHT] = self._long(rect.height())
+        if self.tiled:
+            entries[TAG_TILE_WIDTH] = self._long(self.chunk_width)
+            entries[TAG_TILE_LENGTH] = self._long(self.chunk_height)
+            offsets_tag, counts_tag = TAG_TILE_OFFSETS, TAG_TILE_BYTE_COUNTS
+        else:
+            entries[TAG_ROWS_PER_STRIP] = self._long(rect.height())
+            offsets_tag, counts_tag = TAG_STRIP_OFFSETS, TAG_STRIP_BYTE_COUNTS
+        entries[counts_tag] = self._long(len(data))
+        entries[offsets_tag] = self._long(0)
+
+        values_at = 8 + 2 + len(entries) * 12 + 4
+        ifd, values = bytearray(struct.pack(self.order + "H", len(entries))), bytearray()
+        for tag in sorted(entries):
+            field_type, length, raw = entries[tag]
+            if len(raw) > 4:
+                field = struct.pack(self.order + "I", values_at + len(values))
+                values += raw + b"\x00" * (len(raw) & 1)
+            else:
+                field = raw.ljust(4, b"\x00")
+            ifd += struct.pack(self.order + "HHI", tag, field_type, length) + field
+        ifd += b"\x00\x00\x00\x00"
+
+        data_at = values_at + len(values)
+        # The offset field of the offsets entry, after the entry count and the tag, type and count.
+        position = 2 + sorted(entries).index(offsets_tag) * 12 + 8
+        ifd[position:position + 4] = struct.pack(self.order + "I", data_at)
+        header = (b"II*\x00" if self.order == "<" else b"MM\x00*") + struct.pack(self.order + "I", 8)
+        return header + bytes(ifd) + bytes(values) + data
+
+    def _long(self, value):
+        return TYPE_LONG, 1, struct.pack(self.order + "I", value)
+
+
+class TiffRegions:
+    # Reads rectangles of a strip or tile TIFF by decoding only the chunks they overlap.
+    # Decoded chunks are kept in a small LRU, as neighbouring reads share strips.
+    def __init__(self, path):
+        self.layout = TiffLayout(path)
+        self.width, self.height = self.layout.width, self.layout.height
+        self.budget = max(CHUNK_CACHE_BUDGET, 3 * self.layout.chunk_bytes)
+        self._chunks = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def read(self, rect) -> QImage:
+        image = QImage(rect.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(0)
+        painter = QPainter(image)
+        try:
+            for index in self.layout.chunks_in(rect):
+                chunk_rect = self.layout.chunk_rect(index)
+                painter.drawImage(chunk_rect.topLeft() - rect.topLeft(), self._chunk(index))
+        finally:
+            painter.end()
+        return image
+
+    def release(self):
+        with self._lock:
+            self._chunks.clear()
+            self._bytes = 0
+
+    def _chunk(self, index) -> QImage:
+        with self._lock:
+            chunk = self._chunks.get(index)
+            if chunk is not None:
+                self._chunks.move_to_end(index)
+                return chunk
+
+        # Decoded outside the lock so tile workers reading other chunks are not held up.
+        with open(self.layout.path, 'rb') as f:
+            f.seek(self.layout.offsets[index])
+            data = f.read(self.layout.byte_counts[index])
+        chunk = QImage.fromData(self.layout.chunk_file(index, data), "TIFF")
+        if chunk.isNull():
+            raise ValueError(f"cannot decode TIFF chunk {index}")
+
+        with self._lock:
+            if index not in self._chunks:
+                self._chunks[index] = chunk
+                self._bytes += chunk.sizeInBytes()
+            while self._bytes > self.budget and len(self._chunks) > 1:
+                _, evicted = self._chunks.popitem(last=False)
+                self._bytes -= evicted.sizeInBytes()
+        return chunk
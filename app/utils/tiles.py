@@ -0,0 +1,349 @@
+import os
+import math
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import Qt, QObject, QRect, QRunnable, QSize, QThread, QThreadPool, Signal
+from PySide6.QtGui import QImage, QImageIOHandler, QImageReader, QPainter, QPixmap
+
+from app.utils.logger import log
+from app.utils.tiffregions import TiffRegions
+
+
+TILE_SIZE = 512
+TILE_MEMORY_BUDGET = int(os.environ.get("DEEPTAG_TILE_CACHE_MB", "192")) * 1024 * 1024
+LEVEL_IMAGE_BUDGET = 256 * 1024 * 1024
+OVERVIEW_BUDGET = 64 * 1024 * 1024
+OVERVIEW_CACHE_DIR = os.path.join(".cache", "overviews")
+REGION_BLOCK = 2048
+REGION_MIN_ROWS = 256
+
+# Passes over a whole large image run one at a time, whoever asks for them.
+_full_pass = threading.Lock()
+
+
+class TiledImage:
+    # Level L is the image scaled down by 2**L, cut into TILE_SIZE tiles. Tiles come from:
+    # - clipped, scaled reads of the file for formats that support them (JPEG);
+    # - region reads of strip and tile TIFFs (TiffRegions) below the overview level, and the
+    #   overview (the finest level within OVERVIEW_BUDGET, built in one streamed pass and kept
+    #   in cache_dir) for the coarser ones;
+    # - otherwise one decoded image per level. Qt decodes those files whole before scaling, so
+    #   memory follows the full image size; their finest level is capped by LEVEL_IMAGE_BUDGET.
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        reader = QImageReader(path)
+        size = reader.size()
+        if not size.isValid():
+            raise ValueError(reader.errorString() or "unsupported or corrupt file")
+
+        transformation = reader.transformation()
+        self.rotated = bool(transformation & QImageIOHandler.Transformation.TransformationRotate90)
+        if self.rotated:
+            size.transpose()
+        self.width, self.height = size.width(), size.height()
+
+        self.clip_reads = transformation == QImageIOHandler.Transformation.TransformationNone and \
+            reader.supportsOption(QImageIOHandler.ImageOption.ClipRect)
+
+        self.levels = 1
+        while max(self.width, self.height) > TILE_SIZE << (self.levels - 1):
+            self.levels += 1
+
+        self.regions = None
+        if not self.clip_reads and bytes(reader.format()) in (b"tif", b"tiff") and \
+                self._level_bytes(0) > OVERVIEW_BUDGET:
+            try:
+                self.regions = TiffRegions(path)
+            except (OSError, ValueError, struct.error) as e:
+                log("CANVAS", f"Reading {path} whole: {e}")
+
+        self.finest_level = 0
+        self.overview_level = 0
+        if self.regions is not None:
+            while self.overview_level < self.levels - 1 and \
+                    self._level_bytes(self.overview_level) > OVERVIEW_BUDGET:
+                self.overview_level += 1
+        elif not self.clip_reads:
+            while self.finest_level < self.levels - 1 and self._level_bytes(self.finest_level) > LEVEL_IMAGE_BUDGET:
+                self.finest_level += 1
+
+        self._level_images = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        return "clipped" if self.clip_reads else "regions" if self.regions is not None else "buffered"
+
+    @property
+    def needs_full_pass(self) -> bool:
+        # Whether showing the whole image means reading all of a large file first.
+        if self.regions is not None:
+            overview_path = self._overview_path()
+            return overview_path is None or not os.path.exists(overview_path)
+        return not self.clip_reads and self._level_bytes(0) > OVERVIEW_BUDGET
+
+    def fit_zoom(self, width, height) -> float:
+        return min(width / self.width, height / self.height)
+
+    def level_for_zoom(self, zoom) -> int:
+        level = int(math.floor(math.log2(1 / zoom))) if zoom < 1 else 0
+        return max(self.finest_level, min(self.levels - 1, level))
+
+    def level_size(self, level) -> tuple[int, int]:
+        return -(-self.width >> level), -(-self.height >> level)
+
+    def _level_bytes(self, level):
+        width, height = self.level_size(level)
+        return width * height * 4
+
+    def grid(self, level) -> tuple[int, int]:
+        width, height = self.level_size(level)
+        return -(-width // TILE_SIZE), -(-height // TILE_SIZE)
+
+    def tile_rect(self, level, col, row) -> QRect:
+        width, height = self.level_size(level)
+        x, y = col * TILE_SIZE, row * TILE_SIZE
+        return QRect(x, y, min(TILE_SIZE, width - x), min(TILE_SIZE, height - y))
+
+    def render(self, level, col, row) -> QImage:
+        rect = self.tile_rect(level, col, row)
+        if self.regions is not None and level < self.overview_level:
+            return self._downsample(level, rect)
+        if not self.clip_reads:
+            return self._level_image(level).copy(rect)
+
+        scale = 1 << level
+        source = QRect(rect.x() * scale, rect.y() * scale,
+                       min(rect.width() * scale, self.width - rect.x() * scale),
+                       min(rect.height() * scale, self.height - rect.y() * scale))
+        reader = QImageReader(self.path)
+        reader.setClipRect(source)
+        reader.setScaledSize(rect.size())
+        image = reader.read()
+        if image.isNull():
+            raise ValueError(reader.errorString() or "unsupported or corrupt file")
+        return image
+
+    def release(self):
+        with self._lock:
+            self._level_images.clear()
+        if self.regions is not None:
+            self.regions.release()
+
+    def _downsample(self, level, rect) -> QImage:
+        # Reads the source behind a rectangle of the level one block at a time, so memory stays
+        # within a block whatever the level. Strips span the image width, so blocks of a striped
+        # file are bands of whole rows; tiled files use square blocks.
+        scale = 1 << level
+        source = QRect(rect.x() * scale, rect.y() * scale, rect.width() * scale, rect.height() * scale)
+        source = source.intersected(QRect(0, 0, self.width, self.height))
+        layout = self.regions.layout
+        if layout.tiled:
+            block_width = block_height = max(REGION_BLOCK, scale)
+        else:
+            block_width = -(-self.width // scale) * scale
+            block_height = -(-max(layout.chunk_height, REGION_MIN_ROWS) // scale) * scale
+
+        image = QImage(rect.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(0)
+        painter = QPainter(image)
+        try:
+            for y in range(source.top() // block_height * block_height, source.bottom() + 1, block_height):
+                for x in range(source.left() // block_width * block_width, source.right() + 1, block_width):
+                    block = QRect(x, y, block_width, block_height).intersected(source)
+                    pixels = self.regions.read(block)
+                    if scale > 1:
+                        pixels = pixels.scaled(-(-block.width() // scale), -(-block.height() // scale),
+                                               Qt.AspectRatioMode.IgnoreAspectRatio,
+                                               Qt.TransformationMode.SmoothTransformation)
+                    painter.drawImage(block.x() // scale - rect.x(), block.y() // scale - rect.y(), pixels)
+        finally:
+            painter.end()
+        return image
+
+    def _overview_path(self):
+        if self.cache_dir is None:
+            return None
+        stat = os.stat(self.path)
+        raw = f"{os.path.abspath(self.path)}|{stat.st_size}|{stat.st_mtime_ns}|{self.overview_level}"
+        return os.path.join(self.cache_dir, hashlib.sha1(raw.encode('utf-8')).hexdigest() + ".png")
+
+    def _overview(self) -> QImage:
+        overview_path = self._overview_path()
+        if overview_path is not None:
+            image = QImage(overview_path)
+            if not image.isNull():
+                return image
+
+        with _full_pass:
+            width, height = self.level_size(self.overview_level)
+            image = self._downsample(self.overview_level, QRect(0, 0, width, height))
+            self.regions.release()
+        log("CANVAS", f"Built the {width}x{height} overview of {self.path}")
+        if overview_path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Written under a temporary name, so a partial file is never read back.
+            tmp_path = overview_path + ".tmp.png"
+            if image.save(tmp_path):
+                os.replace(tmp_path, overview_path)
+        return image
+
+    def _level_image(self, level) -> QImage:
+        with self._lock:
+            image = self._level_images.get(level)
+            if image is not None:
+                self._level_images.move_to_end(level)
+                return image
+
+            width, height = self.level_size(level)
+            if self.regions is not None:
+                image = self._level_images.get(self.overview_level)
+                if image is None:
+                    image = self._overview()
+                    self._level_images[self.overview_level] = image
+                if level != self.overview_level:
+                    image = image.scaled(width, height, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                         Qt.TransformationMode.SmoothTransformation)
+            else:
+                reader = QImageReader(self.path)
+                reader.setAutoTransform(True)
+                reader.setScaledSize(QSize(height, width) if self.rotated else QSize(width, height))
+                if self._level_bytes(0) > OVERVIEW_BUDGET:
+                    with _full_pass:
+                        image = reader.read()
+                else:
+                    image = reader.read()
+                if image.isNull():
+                    raise ValueError(reader.errorString() or "unsupported or corrupt file")
+
+            self._level_images[level] = image
+            total = sum(cached.sizeInBytes() for cached in self._level_images.values())
+            while total > LEVEL_IMAGE_BUDGET and len(self._level_images) > 1:
+                _, evicted = self._level_images.popitem(last=False)
+                total -= evicted.sizeInBytes()
+            return image
+
+
+class TileCache:
+    def __init__(self, budget=TILE_MEMORY_BUDGET):
+        self.budget = budget
+        self._tiles = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def peek(self, key):
+        return self._tiles.get(key)
+
+    def __contains__(self, key):
+        return key in self._tiles
+
+    def put(self, key, tile):
+        if key in self._tiles:
+            self._bytes -= self._size(self._tiles.pop(key))
+        self._tiles[key] = tile
+        self._bytes += self._size(tile)
+        while self._bytes > self.budget and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self._bytes -= self._size(evicted)
+
+    @staticmethod
+    def _size(tile):
+        return tile.width() * tile.height() * tile.depth() // 8
+
+    def stats(self) -> dict:
+        return {'entries': len(self._tiles), 'bytes': self._bytes, 'budget': self.budget}
+
+
+class _TileSignals(QObject):
+    loaded = Signal(int, object, QImage)
+    failed = Signal(int, object, str)
+
+
+class _TileTask(QRunnable):
+    def __init__(self, image, key, generation, signals):
+        super().__init__()
+        self.image = image
+        self.key = key
+        self.generation = generation
+        self.signals = signals
+
+    def run(self):
+        _, level, col, row = self.key
+        try:
+            tile = self.image.render(level, col, row)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, self.key, str(e))
+            return
+        self.signals.loaded.emit(self.generation, self.key, tile)
+
+
+class TileLoader(QObject):
+    loaded = Signal(object, QPixmap)
+    failed = Signal(object, str)
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, QThread.idealThreadCount() - 1))
+
+        self._image = None
+        self._queue = OrderedDict()
+        self._running = set()
+        self._failed = set()
+        self._generation = 0
+
+        self._signals = _TileSignals()
+        self._signals.loaded.connect(self._on_loaded)
+        self._signals.failed.connect(self._on_failed)
+
+    def request(self, image, keys):
+        if image is not self._image:
+            self.cancel()
+            self._image = image
+
+        # Only the tiles that are visible right now are worth decoding, in the given order.
+        self._queue = OrderedDict((key, None) for key in keys
+                                  if key not in self._running and key not in self._failed and key not in self.cache)
+        self._submit()
+
+    def cancel(self):
+        self._generation += 1
+        self._image = None
+        self._queue.clear()
+        self._running.clear()
+        self._failed.clear()
+
+    def _submit(self):
+        while len(self._running) < self.pool.maxThreadCount() and self._queue:
+            key, _ = self._queue.popitem(last=False)
+            self._running.add(key)
+            self.pool.start(_TileTask(self._image, key, self._generation, self._signals))
+
+    def _on_loaded(self, generation, key, image):
+        if generation != self._generation:
+            return
+        self._running.discard(key)
+        pixmap = QPixmap.fromImage(image)
+        self.cache.put(key, pixmap)
+        self.loaded.emit(key, pixmap)
+        self._submit()
+
+    def _on_failed(self, generation, key, error):
+        if generation != self._generation:
+            return
+        self._running.discard(key)
+        if not self._failed:
+            log("ERROR", "Error rendering tile %s of %s: %s", key[1:], key[0], error)
+        self._failed.add(key)
+        self.failed.emit(key, error)
+        self._submit()
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+
+from app.utils.logger import log
+
+
+DEFAULT_TRACE_PATH = "deeptag-trace.json"
+
+_origin_ns = time.perf_counter_ns()
+_events = []
+_thread_names = {}
+_path = None
+_enabled = False
+
+
+class _Span:
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        _record('X', self.name, self.category, self.start, self.args, dur=(end - self.start) // 1000)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    @property
+    def args(self):
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _record(phase, name, category, start_ns, args, **fields):
+    tid = threading.get_native_id()
+    if tid not in _thread_names:
+        _thread_names[tid] = threading.current_thread().name
+    event = {'name': name, 'cat': category, 'ph': phase, 'ts': (start_ns - _origin_ns) // 1000,
+             'pid': os.getpid(), 'tid': tid, **fields}
+    if args:
+        event['args'] = args
+    _events.append(event)
+
+
+def enable(path=None):
+    global _enabled, _path
+    if _enabled:
+        return
+    _path = path or DEFAULT_TRACE_PATH
+    _enabled = True
+    atexit.register(save)
+    log("TRACE", f"Tracing enabled, writing to {_path} at exit")
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name, category="app", **args):
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def instant(name, category="app", **args):
+    if _enabled:
+        _record('i', name, category, time.perf_counter_ns(), args, s='p')
+
+
+def traced(name=None, category="app"):
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(label, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def save(path=None):
+    path = path or _path or DEFAULT_TRACE_PATH
+    events = list(_events)
+    pid = os.getpid()
+    metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': 'DeepTag'}}]
+    metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}}
+                 for tid, thread_name in list(_thread_names.items())]
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
+    os.replace(tmp_path, path)
+    log("TRACE", f"Wrote {len(events)} trace events to {path}")
+
+
+def _configure():
+    value = os.environ.get("DEEPTAG_TRACE", "")
+    if value and value != "0":
+        enable(None if value == "1" else value)
+
+
+_configure()
@@ -0,0 +1,189 @@
+import os
+import sys
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal
+
+from app.utils.logger import log
+from app.utils.meta_store import DATA_DIR
+
+
+DEBOUNCE_MS = 200
+POLL_INTERVAL_MS = 2000
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'fuse.sshfs', '9p', 'afs', 'ncpfs'}
+IGNORED_SUFFIXES = ('.db', '.db-wal', '.db-shm', '.db-journal', '.tmp')
+
+
+def is_network_path(path) -> bool:
+    if not sys.platform.startswith('linux'):
+        return False
+    path = os.path.realpath(path)
+    best_mount, best_type = "", ""
+    try:
+        with open("/proc/mounts", 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount_point = parts[1].replace("\\040", " ")
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) > len(best_mount):
+                    best_mount, best_type = mount_point, parts[2]
+    except OSError:
+        return False
+    return best_type in NETWORK_FILESYSTEMS
+
+
+class ChangeTracker(QObject):
+    projectsChanged = Signal()
+    projectChanged = Signal(str)
+    subprojectChanged = Signal(str, str)
+    folderChanged = Signal(str, str, str)
+
+    def __init__(self, data_dir=DATA_DIR, parent=None):
+        super().__init__(parent)
+        self.data_dir = data_dir
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        self._snapshots = {}
+        self._dirty = set()
+
+        self.polling = os.environ.get("DEEPTAG_WATCH_POLL") == "1" or is_network_path(self.data_dir)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_path_changed)
+        self.watcher.fileChanged.connect(self._on_path_changed)
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(DEBOUNCE_MS)
+        self._debounce.timeout.connect(self._flush)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL_MS)
+        self._poll_timer.timeout.connect(self._poll)
+
+        self._sync_watches()
+        if self.polling:
+            self._poll_timer.start()
+        log("WATCH", f"Tracking {len(self._snapshots)} paths under {self.data_dir} "
+                     f"({'polling' if self.polling else 'file system events'})")
+
+    def _tracked_paths(self) -> set[str]:
+        paths = {self.data_dir}
+        for project in self._subdirs(self.data_dir):
+            project_path = os.path.join(self.data_dir, project)
+            subprojects_path = os.path.join(project_path, 'subprojects')
+            paths.update((project_path, os.path.join(project_path, 'meta.json'), subprojects_path))
+
+            for subproject in self._subdirs(subprojects_path):
+                subproject_path = os.path.join(subprojects_path, subproject)
+                images_path = os.path.join(subproject_path, 'images')
+                paths.update((subproject_path, os.path.join(subproject_path, 'meta.json'), images_path))
+                paths.update(os.path.join(images_path, folder) for folder in self._subdirs(images_path))
+
+        return {path for path in paths if os.path.exists(path)}
+
+    @staticmethod
+    def _subdirs(path) -> list[str]:
+        try:
+            return [entry.name for entry in os.scandir(path) if entry.is_dir() and not entry.name.startswith('.')]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _snapshot(path, previous=None):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        if not os.path.isdir(path):
+            return stat.st_mtime_ns, stat.st_size, None
+        if previous is not None and previous[0] == stat.st_mtime_ns:
+            return previous
+
+        names = frozenset(name for name in os.listdir(path)
+                          if not name.startswith('.') and not name.endswith(IGNORED_SUFFIXES))
+        return stat.st_mtime_ns, stat.st_size, names
+
+    def _changed(self, path) -> bool:
+        previous = self._snapshots.get(path)
+        current = self._snapshot(path, previous)
+        if current is None:
+            self._snapshots.pop(path, None)
+            return previous is not None
+        self._snapshots[path] = current
+
+        if previous is None:
+            return True
+        if current[2] is None:
+            return current[:2] != previous[:2]
+        return current[2] != previous[2]
+
+    def _sync_watches(self):
+        wanted = self._tracked_paths()
+        current = set(self._snapshots)
+
+        for path in current - wanted:
+            self._snapshots.pop(path, None)
+        for path in wanted - current:
+            self._snapshots[path] = self._snapshot(path)
+
+        if self.polling:
+            return
+
+        watched = set(self.watcher.directories()) | set(self.watcher.files())
+        if watched - wanted:
+            self.watcher.removePaths(list(watched - wanted))
+        if wanted - watched:
+            failed = self.watcher.addPaths(list(wanted - watched))
+            if failed:
+                log("WATCH", f"Could not watch {len(failed)} paths, falling back to polling")
+                self.polling = True
+                self._poll_timer.start()
+
+    def _on_path_changed(self, path):
+        self._dirty.add(path)
+        self._debounce.start()
+
+    def _poll(self):
+        for path in list(self._snapshots):
+            if self._changed(path):
+                self._dirty.add(path)
+        if self._dirty:
+            self._flush()
+
+    def _flush(self):
+        dirty, self._dirty = self._dirty, set()
+        if not self.polling:
+            for path in dirty:
+                if os.path.isfile(path):
+                    self.watcher.removePath(path)
+                    self.watcher.addPath(path)
+            dirty = {path for path in dirty if self._changed(path)}
+        if not dirty:
+            return
+
+        projects, subprojects, folders = set(), set(), set()
+        rescan = False
+        for path in dirty:
+            parts = os.path.relpath(path, self.data_dir).split(os.sep)
+            if parts == ['.']:
+                rescan = True
+            elif len(parts) <= 2:
+                projects.add(parts[0])
+            elif len(parts) == 3 or (len(parts) == 4 and parts[3] == 'meta.json'):
+                subprojects.add((parts[0], parts[2]))
+            else:
+                folders.add((parts[0], parts[2], parts[4] if len(parts) > 4 else ""))
+
+        self._sync_watches()
+
+        if rescan:
+            self.projectsChanged.emit()
+        for project in sorted(projects):
+            self.projectChanged.emit(project)
+        for project, subproject in sorted(subprojects):
+            self.subprojectChanged.emit(project, subproject)
+        for project, subproject, folder in sorted(folders):
+            self.folderChanged.emit(project, subproject, folder)
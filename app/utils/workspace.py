@@ -0,0 +1,124 @@
+import os
+
+from app.utils.annotations import ANNOTATIONS_FILENAME, AnnotationStore
+from app.utils.logger import log
+from app.utils.meta_store import open_meta_store
+
+
+# Project, subproject and class operations without Qt, shared by the GUI
+# repository and the command line. Project listings and class lists are
+# cached until invalidated.
+class Workspace:
+    def __init__(self, store=None):
+        self.store = store if store is not None else open_meta_store()
+
+        self._projects = None
+        self._classes = {}
+
+    def load(self):
+        if self._projects is None:
+            self._projects = {os.path.basename(p['path']): p for p in self.store.list_projects()}
+            log("REPO", f"Loaded {len(self._projects)} projects")
+
+    def invalidate(self):
+        self._projects = None
+        self._classes.clear()
+
+    def invalidate_project(self, name) -> bool:
+        # Returns whether the project appeared or disappeared.
+        self.load()
+        project = self.store.get_project(name)
+        known = name in self._projects
+
+        if project is None:
+            self._projects.pop(name, None)
+        else:
+            self._projects[name] = project
+        for key in [key for key in self._classes if key[0] == name]:
+            del self._classes[key]
+
+        if known != (project is not None):
+            self._projects = dict(sorted(self._projects.items()))
+            return True
+        return False
+
+    def invalidate_subproject(self, project_name, subproject_name):
+        self._classes.pop((project_name, subproject_name), None)
+
+    def projects(self) -> list[dict]:
+        self.load()
+        return list(self._projects.values())
+
+    def project(self, name):
+        self.load()
+        return self._projects.get(name)
+
+    def subprojects(self, project_name) -> list[dict]:
+        project = self.project(project_name)
+        if project is None:
+            return []
+
+        subprojects = []
+        for name in project['subprojects']:
+            path = self.subproject_path(project_name, name)
+            subprojects.append({'name': name, 'path': path, 'exists': os.path.isdir(path)})
+        return subprojects
+
+    def subproject_path(self, project_name, subproject_name):
+        project = self.project(project_name)
+        if project is None:
+            return None
+        return os.path.join(project['path'], 'subprojects', subproject_name)
+
+    def classes(self, project_name, subproject_name) -> list[str]:
+        key = (project_name, subproject_name)
+        if key not in self._classes:
+            self._classes[key] = self.store.list_classes(project_name, subproject_name)
+        return list(self._classes[key])
+
+    def create_project(self, name):
+        self.store.create_project(name)
+        self.invalidate_project(name)
+
+    def rename_project(self, old_name, new_name):
+        self.store.rename_project(old_name, new_name)
+        self.invalidate_project(old_name)
+        self.invalidate_project(new_name)
+
+    def remove_project(self, name):
+        self.store.remove_project(name)
+        self.invalidate_project(name)
+
+    def create_subproject(self, project_name, subproject_name):
+        self.store.create_subproject(project_name, subproject_name)
+        self.invalidate_project(project_name)
+
+    def rename_subproject(self, project_name, old_name, new_name):
+        self.store.rename_subproject(project_name, old_name, new_name)
+        self.invalidate_project(project_name)
+
+    def remove_subproject(self, project_name, subproject_name):
+        self.store.remove_subproject(project_name, subproject_name)
+        self.invalidate_project(project_name)
+
+    def add_class(self, project_name, subproject_name, class_name):
+        self.store.add_class(project_name, subproject_name, class_name)
+        self.invalidate_subproject(project_name, subproject_name)
+
+    def rename_class(self, project_name, subproject_name, old_name, new_name):
+        self.store.rename_class(project_name, subproject_name, old_name, new_name)
+        self.invalidate_subproject(project_name, subproject_name)
+
+    def remove_class(self, project_name, subproject_name, class_name):
+        classes = self.classes(project_name, subproject_name)
+        self.store.remove_class(project_name, subproject_name, class_name)
+
+        subproject_path = self.subproject_path(project_name, subproject_name)
+        if class_name in classes and subproject_path and \
+                os.path.exists(os.path.join(subproject_path, ANNOTATIONS_FILENAME)):
+            annotations = AnnotationStore(subproject_path)
+            try:
+                annotations.remove_class(classes.index(class_name))
+            finally:
+                annotations.close()
+        self.invalidate_subproject(project_name, subproject_name)
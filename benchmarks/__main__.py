@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import argparse
+
+from app.utils import logger
+from benchmarks.compare import DEFAULT_MIN_DELTA, DEFAULT_THRESHOLD, compare, format_rows
+from benchmarks.generate import IMAGE_FORMATS
+
+
+DATASET_FILENAME = "dataset.json"
+
+
+def _size(value):
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value}")
+    return width, height
+
+
+def command_generate(args):
+    from benchmarks.generate import generate
+
+    manifest = generate(os.path.join(args.workdir, "data"), args.projects, args.subprojects, args.folders,
+                        args.images, args.sizes, args.formats, args.classes, args.boxes, args.seed)
+    with open(os.path.join(args.workdir, DATASET_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Generated {manifest['images']} images ({manifest['bytes'] / (1024 * 1024):.1f} MB) and "
+          f"{manifest['boxes']} boxes in {args.workdir} in {manifest['seconds']:.1f}s")
+    return 0
+
+
+def command_run(args):
+    from benchmarks.run import run
+
+    dataset = None
+    manifest_path = os.path.join(args.workdir, DATASET_FILENAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            dataset = json.load(f)
+
+    output = os.path.abspath(args.output) if args.output else None
+    results = run(args.workdir, args.repeat, args.warmup, args.filter, dataset)
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"Results written to {output}")
+    else:
+        print(text)
+    failed = [name for name, result in results['results'].items() if 'error' in result]
+    return 1 if failed else 0
+
+
+def command_compare(args):
+    with open(args.base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    rows = compare(base, current, args.threshold / 100, args.min_delta / 1000)
+    print("\n".join(format_rows(rows)))
+    regressions = [row['name'] for row in rows if row['status'] == 'regression']
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="DeepTag performance benchmarks")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print log messages")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("generate", help="generate a synthetic data/ tree")
+    command.add_argument("workdir", help="folder the data/ tree is created in")
+    command.add_argument("--projects", type=int, default=2)
+    command.add_argument("--subprojects", type=int, default=2, help="subprojects per project")
+    command.add_argument("--folders", type=int, default=4, help="image folders per subproject")
+    command.add_argument("--images", type=int, default=100, help="images per folder")
+    command.add_argument("--sizes", type=_size, nargs="+", default=[(640, 480)], metavar="WxH")
+    command.add_argument("--formats", nargs="+", choices=IMAGE_FORMATS, default=['png'])
+    command.add_argument("--classes", type=int, default=5)
+    command.add_argument("--boxes", type=int, default=3, help="average boxes per annotated image")
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(handler=command_generate)
+
+    command = commands.add_parser("run", help="time the benchmark cases against a generated tree")
+    command.add_argument("workdir", help="folder containing the generated data/ tree")
+    command.add_argument("-o", "--output", help="write results JSON here instead of stdout")
+    command.add_argument("--repeat", type=int, default=5)
+    command.add_argument("--warmup", type=int, default=1)
+    command.add_argument("--filter", nargs="+", metavar="NAME", help="only run cases whose name contains NAME")
+    command.set_defaults(handler=command_run)
+
+    command = commands.add_parser("compare", help="compare two result files and flag regressions")
+    command.add_argument("base")
+    command.add_argument("current")
+    command.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD * 100,
+                         help="relative change in percent that counts (default: 10)")
+    command.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA * 1000,
+                         help="absolute change in ms that counts (default: 1)")
+    command.set_defaults(handler=command_compare)
+
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        logger.set_level(logger.WARNING)
+    try:
+        return args.handler(args)
+    finally:
+        logger.flush()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_MIN_DELTA = 0.001
+
+
+def compare(base, current, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA) -> list[dict]:
+    # A change counts only when the median moves by more than the relative threshold
+    # and by more than min_delta seconds, so tiny cases do not flag on noise.
+    rows = []
+    for name in sorted(base['results'].keys() | current['results'].keys()):
+        old, new = base['results'].get(name), current['results'].get(name)
+        if not old or not new or 'median' not in old or 'median' not in new:
+            rows.append({'name': name, 'status': 'missing', 'base': old and old.get('median'),
+                         'current': new and new.get('median'), 'change': None})
+            continue
+
+        delta = new['median'] - old['median']
+        change = delta / old['median'] if old['median'] else 0.0
+        status = 'same'
+        if abs(delta) > min_delta and abs(change) > threshold:
+            status = 'regression' if delta > 0 else 'improvement'
+        rows.append({'name': name, 'status': status, 'base': old['median'], 'current': new['median'],
+                     'change': change})
+    return rows
+
+
+def format_rows(rows) -> list[str]:
+    lines = [f"{'BENCHMARK':40} {'BASE ms':>12} {'CURRENT ms':>12} {'CHANGE':>9}  STATUS"]
+    for row in rows:
+        base = f"{row['base'] * 1000:.2f}" if row['base'] is not None else "-"
+        current = f"{row['current'] * 1000:.2f}" if row['current'] is not None else "-"
+        change = f"{row['change'] * 100:+.1f}%" if row['change'] is not None else "-"
+        lines.append(f"{row['name']:40} {base:>12} {current:>12} {change:>9}  {row['status']}")
+    return lines
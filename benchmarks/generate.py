@@ -0,0 +1,141 @@
+import os
+import time
+import zlib
+import random
+import struct
+
+from app.utils.annotations import AnnotationStore
+from app.utils.meta_store import open_meta_store
+from app.utils.workspace import Workspace
+
+
+IMAGE_FORMATS = ('png', 'bmp', 'jpg')
+ANNOTATED_SHARE = 0.7
+
+
+def _png(width, height, seed):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rnd = random.Random(seed)
+    row = bytes([0]) + bytes(rnd.randrange(256) for _ in range(min(width, 64) * 3)) * (width // 64 + 1)
+    pixels = b"".join(row[:1 + width * 3] for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(pixels, 6)) + chunk(b"IEND", b""))
+
+
+def _bmp(width, height, seed):
+    stride = (width * 3 + 3) & ~3
+    rnd = random.Random(seed)
+    row = bytes(rnd.randrange(256) for _ in range(stride))
+    pixels = row * height
+    header = struct.pack("<2sIHHI", b"BM", 54 + len(pixels), 0, 0, 54)
+    info = struct.pack("<IiiHHIIiiII", 40, width, height, 1, 24, 0, len(pixels), 2835, 2835, 0, 0)
+    return header + info + pixels
+
+
+def _jpg(width, height, seed):
+    # There is no JPEG encoder in the standard library, so JPEG templates need Qt.
+    try:
+        from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+        from PySide6.QtGui import QColor, QImage
+    except ImportError:
+        raise ValueError("Generating JPEG images requires PySide6")
+
+    rnd = random.Random(seed)
+    image = QImage(width, height, QImage.Format.Format_RGB888)
+    image.fill(QColor(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "JPG", 85)
+    return bytes(data)
+
+
+ENCODERS = {'png': _png, 'bmp': _bmp, 'jpg': _jpg}
+
+
+def write_images(folder, count, sizes, formats, seed=0, templates=None) -> int:
+    # Every file gets a unique trailer after the image data, which decoders ignore,
+    # so content deduplication sees distinct files.
+    templates = {} if templates is None else templates
+    os.makedirs(folder, exist_ok=True)
+    written = 0
+    for index in range(count):
+        fmt = formats[index % len(formats)]
+        width, height = sizes[index % len(sizes)]
+        key = (fmt, width, height)
+        if key not in templates:
+            templates[key] = ENCODERS[fmt](width, height, seed)
+        data = templates[key] + f"deeptag-benchmark:{seed}:{folder}:{index}".encode('utf-8')
+        with open(os.path.join(folder, f"img_{index:06d}.{fmt}"), 'wb') as f:
+            f.write(data)
+        written += len(data)
+    return written
+
+
+def generate(data_dir, projects=2, subprojects=2, folders=4, images=100, sizes=((640, 480),), formats=('png',),
+             classes=5, boxes=3, seed=0) -> dict:
+    for fmt in formats:
+        if fmt not in ENCODERS:
+            raise ValueError(f"Unknown image format: {fmt}")
+
+    started = time.monotonic()
+    rnd = random.Random(seed)
+    workspace = Workspace(open_meta_store(data_dir))
+    class_names = [f"class_{index}" for index in range(classes)]
+    templates = {}
+    totals = {'images': 0, 'bytes': 0, 'boxes': 0}
+
+    for project_index in range(projects):
+        project = f"project_{project_index:02d}"
+        if workspace.project(project) is None:
+            workspace.create_project(project)
+        for subproject_index in range(subprojects):
+            subproject = f"subproject_{subproject_index:02d}"
+            if subproject not in workspace.project(project)['subprojects']:
+                workspace.create_subproject(project, subproject)
+            existing = workspace.classes(project, subproject)
+            for class_name in class_names:
+                if class_name not in existing:
+                    workspace.add_class(project, subproject, class_name)
+
+            path = workspace.subproject_path(project, subproject)
+            annotations = AnnotationStore(path)
+            try:
+                for folder_index in range(folders):
+                    folder = f"folder_{folder_index:03d}"
+                    totals['bytes'] += write_images(os.path.join(path, 'images', folder), images, sizes, formats,
+                                                    seed, templates)
+                    totals['images'] += images
+                    for index in range(images):
+                        if rnd.random() >= ANNOTATED_SHARE:
+                            continue
+                        width, height = sizes[index % len(sizes)]
+                        image_boxes = []
+                        for _ in range(rnd.randint(1, max(1, boxes * 2 - 1))):
+                            w, h = rnd.uniform(4, width / 2), rnd.uniform(4, height / 2)
+                            image_boxes.append((rnd.randrange(classes), rnd.uniform(0, width - w),
+                                                rnd.uniform(0, height - h), w, h, 0))
+                        annotations.set_boxes(f"{folder}/img_{index:06d}.{formats[index % len(formats)]}",
+                                              image_boxes)
+                        totals['boxes'] += len(image_boxes)
+            finally:
+                annotations.close()
+
+    if hasattr(workspace.store, 'flush'):
+        workspace.store.flush()
+
+    return {
+        'projects': projects,
+        'subprojects': subprojects,
+        'folders': folders,
+        'images_per_folder': images,
+        'sizes': [list(size) for size in sizes],
+        'formats': list(formats),
+        'classes': classes,
+        'boxes_per_image': boxes,
+        'seed': seed,
+        **totals,
+        'seconds': round(time.monotonic() - started, 3)
+    }
@@ -0,0 +1,292 @@
+import os
+import sys
+import time
+import shutil
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+
+from benchmarks.generate import write_images
+
+
+RESULTS_VERSION = 1
+IMPORT_SOURCE_IMAGES = 500
+CASES = []
+
+
+def benchmark(name, qt=False, setup=None):
+    def register(function):
+        CASES.append((name, function, setup, qt))
+        return function
+    return register
+
+
+class Context:
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self.data_dir = os.path.join(workdir, "data")
+        self.scratch = os.path.join(workdir, "scratch")
+        self._workspace = None
+        self._app = None
+        self._window = None
+
+    @property
+    def workspace(self):
+        if self._workspace is None:
+            from app.utils.meta_store import open_meta_store
+            from app.utils.workspace import Workspace
+            self._workspace = Workspace(open_meta_store(self.data_dir))
+        return self._workspace
+
+    def first_subproject(self):
+        for project in self.workspace.projects():
+            project_dir = os.path.basename(project['path'])
+            for subproject in self.workspace.subprojects(project_dir):
+                if subproject['exists']:
+                    return project, subproject
+        raise RuntimeError(f"No subprojects in {self.data_dir}, generate a dataset first")
+
+    def first_folder(self, subproject):
+        images_dir = os.path.join(subproject['path'], 'images')
+        return sorted(entry.name for entry in os.scandir(images_dir) if entry.is_dir())[0]
+
+    def import_source(self):
+        source = os.path.join(self.scratch, "import_source")
+        if not os.path.isdir(source):
+            write_images(source, IMPORT_SOURCE_IMAGES, ((640, 480),), ('png',))
+        return source
+
+    def application(self):
+        if self._app is None:
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+            from PySide6.QtWidgets import QApplication
+            self._app = QApplication.instance() or QApplication([])
+        return self._app
+
+    @property
+    def window(self):
+        if self._window is None:
+            from app.build import MainWindow
+            self.application()
+            self._window = MainWindow()
+            self._window.show()
+            self.process_events()
+        return self._window
+
+    def process_events(self):
+        self._app.processEvents()
+
+    def page(self, page_id):
+        page = self.window.get_page(page_id)
+        self.window.switch_page(page_id)
+        self.process_events()
+        return page
+
+    def select_subproject(self, page):
+        project, subproject = self.first_subproject()
+        page.project_combo.setCurrentIndex(page.project_combo.findText(project['name']))
+        page.subproject_combo.setCurrentIndex(page.subproject_combo.findText(subproject['name']))
+        self.process_events()
+        return subproject
+
+
+def _remove_index(ctx):
+    _, subproject = ctx.first_subproject()
+    for name in os.listdir(subproject['path']):
+        if name.startswith("index.db"):
+            os.remove(os.path.join(subproject['path'], name))
+
+
+@benchmark("workspace.projects")
+def _workspace_projects(ctx):
+    from app.utils.meta_store import open_meta_store
+    from app.utils.workspace import Workspace
+    workspace = Workspace(open_meta_store(ctx.data_dir))
+    for project in workspace.projects():
+        workspace.subprojects(os.path.basename(project['path']))
+
+
+@benchmark("index.refresh.cold", setup=_remove_index)
+def _index_refresh_cold(ctx):
+    from app.utils.image_index import ImageIndex
+    index = ImageIndex(ctx.first_subproject()[1]['path'])
+    index.refresh()
+    index.close()
+
+
+@benchmark("index.refresh.warm")
+def _index_refresh_warm(ctx):
+    from app.utils.image_index import ImageIndex
+    index = ImageIndex(ctx.first_subproject()[1]['path'])
+    index.refresh()
+    index.close()
+
+
+def _clear_scratch_target(ctx):
+    shutil.rmtree(os.path.join(ctx.scratch, "target"), ignore_errors=True)
+    shutil.rmtree(os.path.join(ctx.scratch, "export"), ignore_errors=True)
+    ctx.import_source()
+
+
+@benchmark("import.copy", setup=_clear_scratch_target)
+def _import_copy(ctx):
+    from app.utils.importer import ImportJob
+    ImportJob(ctx.import_source(), os.path.join(ctx.scratch, "target"), 'copy').run()
+
+
+@benchmark("stats.rebuild")
+def _stats_rebuild(ctx):
+    from app.utils.annotations import AnnotationStore
+    from app.utils.stats import SubprojectStats, annotation_stamp
+    path = ctx.first_subproject()[1]['path']
+    stats = SubprojectStats(path)
+    annotations = AnnotationStore(path)
+    stats.rebuild(annotations, annotation_stamp(stats.annotations_path))
+    annotations.close()
+    stats.close()
+
+
+@benchmark("splits.assign")
+def _splits_assign(ctx):
+    from app.utils.splits import assign_splits
+    assign_splits(ctx.first_subproject()[1]['path'], reset=True)
+
+
+@benchmark("export.yolo", setup=_clear_scratch_target)
+def _export_yolo(ctx):
+    from app.utils.exporter import ExportJob
+    project, subproject = ctx.first_subproject()
+    classes = ctx.workspace.classes(os.path.basename(project['path']), subproject['name'])
+    ExportJob(subproject['path'], classes, os.path.join(ctx.scratch, "export"), 'yolo', 'link').run()
+
+
+@benchmark("window.create", qt=True)
+def _window_create(ctx):
+    from app.build import MainWindow
+    ctx.application()
+    window = MainWindow()
+    window.show()
+    ctx.process_events()
+    window.close()
+    window.deleteLater()
+    ctx.process_events()
+
+
+def _invalidate_projects(ctx):
+    ctx.window.repository.workspace.invalidate()
+
+
+@benchmark("annotate._scan_projects", qt=True, setup=_invalidate_projects)
+def _annotate_scan_projects(ctx):
+    ctx.window.get_page("markup")._scan_projects()
+
+
+@benchmark("projects.load_projects", qt=True, setup=_invalidate_projects)
+def _projects_load_projects(ctx):
+    ctx.window.get_page("projects").load_projects()
+    ctx.process_events()
+
+
+def _select_subproject(ctx):
+    page = ctx.page("markup")
+    subproject = ctx.select_subproject(page)
+    page.current_folder = ctx.first_folder(subproject)
+    page._clear_allocate_blocks()
+
+
+@benchmark("annotate._update_allocate_blocks", qt=True, setup=_select_subproject)
+def _annotate_update_allocate_blocks(ctx):
+    ctx.window.get_page("markup")._update_allocate_blocks()
+    ctx.process_events()
+
+
+@benchmark("annotate._populate_image_view", qt=True, setup=_select_subproject)
+def _annotate_populate_image_view(ctx):
+    ctx.window.get_page("markup")._populate_image_view()
+    ctx.process_events()
+
+
+@benchmark("page.switch", qt=True)
+def _page_switch(ctx):
+    from app.build import PAGES
+    for page_id in PAGES:
+        ctx.window.switch_page(page_id)
+        ctx.process_events()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        return None
+
+
+def _qt_available():
+    try:
+        import PySide6
+        return None
+    except ImportError as e:
+        return str(e)
+
+
+def _report(line):
+    print(line, file=sys.stderr)
+
+
+def run(workdir, repeat=5, warmup=1, selected=None, dataset=None, report=_report) -> dict:
+    workdir = os.path.abspath(workdir)
+    os.makedirs(os.path.join(workdir, "scratch"), exist_ok=True)
+    # The application resolves data/ relative to the working directory.
+    os.chdir(workdir)
+    ctx = Context(workdir)
+    qt_missing = _qt_available()
+
+    results = {}
+    for name, function, setup, qt in CASES:
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        if qt and qt_missing:
+            results[name] = {'skipped': f"PySide6 is not available: {qt_missing}"}
+            report(f"{name:40} skipped")
+            continue
+
+        runs = []
+        try:
+            for iteration in range(warmup + repeat):
+                if setup is not None:
+                    setup(ctx)
+                started = time.perf_counter()
+                function(ctx)
+                elapsed = time.perf_counter() - started
+                if iteration >= warmup:
+                    runs.append(elapsed)
+        except Exception as e:
+            results[name] = {'error': f"{type(e).__name__}: {e}"}
+            report(f"{name:40} error: {e}")
+            continue
+
+        results[name] = {
+            'runs': runs,
+            'min': min(runs),
+            'median': statistics.median(runs),
+            'mean': statistics.fmean(runs),
+            'max': max(runs),
+            'stdev': statistics.stdev(runs) if len(runs) > 1 else 0.0
+        }
+        report(f"{name:40} median {results[name]['median'] * 1000:10.2f} ms   "
+               f"min {results[name]['min'] * 1000:10.2f} ms")
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeat': repeat,
+        'warmup': warmup,
+        'dataset': dataset,
+        'results': results
+    }
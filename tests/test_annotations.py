@@ -0,0 +1,97 @@
+import sys
+from array import array
+
+from app.utils.annotations import (AnnotationStore, ANNOTATIONS_FILENAME, COLUMNS, HEADER, MAGIC, VERSION,
+                                   _BYTE_ORDERS, _padded)
+
+
+BOXES = {
+    'a/1.jpg': [(0, 0.5, 0.5, 0.25, 0.25, 0), (2, 0.125, 0.75, 0.5, 0.125, 1)],
+    'a/2.jpg': [(1, 0.25, 0.25, 0.5, 0.5, 4)],
+    'b/1.jpg': [(2, 0.0, 0.0, 1.0, 1.0, 2), (2, 0.5, 0.5, 0.5, 0.5, 0), (0, 0.75, 0.25, 0.125, 0.25, 0)]
+}
+
+
+def _saved_store(path):
+    store = AnnotationStore(str(path))
+    for image, boxes in BOXES.items():
+        store.set_boxes(image, boxes)
+    store.save()
+    store.close()
+    return AnnotationStore(str(path))
+
+
+def test_round_trip(tmp_path):
+    store = _saved_store(tmp_path)
+    try:
+        assert store.images() == sorted(BOXES)
+        assert len(store) == sum(len(boxes) for boxes in BOXES.values())
+        for image, boxes in BOXES.items():
+            assert store.boxes(image) == boxes
+        assert store.box_counts() == {image: len(boxes) for image, boxes in BOXES.items()}
+        assert store.row_range('a/2.jpg') == (2, 3)
+        assert list(store.column('image')) == [0, 0, 1, 2, 2, 2]
+    finally:
+        store.close()
+
+
+def test_edits_after_reload(tmp_path):
+    store = _saved_store(tmp_path)
+    store.set_boxes('a/2.jpg', [(3, 0.5, 0.5, 0.5, 0.5, 0)] * 2)
+    store.set_boxes('c/1.jpg', [(1, 0.25, 0.25, 0.25, 0.25, 0)])
+    store.remove_image('a/1.jpg')
+    store.close()
+
+    store = AnnotationStore(str(tmp_path))
+    try:
+        assert store.images() == ['a/2.jpg', 'b/1.jpg', 'c/1.jpg']
+        assert store.boxes('a/1.jpg') == []
+        assert store.boxes('a/2.jpg') == [(3, 0.5, 0.5, 0.5, 0.5, 0)] * 2
+        assert store.boxes('b/1.jpg') == BOXES['b/1.jpg']
+        assert store.boxes('c/1.jpg') == [(1, 0.25, 0.25, 0.25, 0.25, 0)]
+    finally:
+        store.close()
+
+
+def test_remove_class_shifts_later_ids(tmp_path):
+    store = _saved_store(tmp_path)
+    store.remove_class(1)
+    store.close()
+
+    store = AnnotationStore(str(tmp_path))
+    try:
+        assert 'a/2.jpg' not in store.images()
+        assert [box[0] for box in store.boxes('a/1.jpg')] == [0, 1]
+        assert [box[0] for box in store.boxes('b/1.jpg')] == [1, 1, 0]
+    finally:
+        store.close()
+
+
+def test_foreign_byte_order(tmp_path):
+    # A file written on a machine of the other byte order is swapped on load.
+    names = sorted(BOXES)
+    rows = [(image_id, *box) for image_id, name in enumerate(names) for box in BOXES[name]]
+    offsets = array('Q', [0])
+    for name in names:
+        offsets.append(offsets[-1] + len(BOXES[name]))
+    names_blob = '\n'.join(names).encode('utf-8')
+
+    foreign = 'big' if sys.byteorder == 'little' else 'little'
+    parts = [HEADER.pack(MAGIC, VERSION, _BYTE_ORDERS[foreign], 0, len(rows), len(names), len(names_blob))]
+    for position, (_, code) in enumerate(COLUMNS):
+        column = array(code, [row[position] for row in rows])
+        column.byteswap()
+        data = column.tobytes()
+        parts.append(data + b"\0" * (_padded(len(data)) - len(data)))
+    offsets.byteswap()
+    parts.append(offsets.tobytes())
+    parts.append(names_blob)
+    (tmp_path / ANNOTATIONS_FILENAME).write_bytes(b"".join(parts))
+
+    store = AnnotationStore(str(tmp_path))
+    try:
+        assert store.images() == names
+        for image, boxes in BOXES.items():
+            assert store.boxes(image) == boxes
+    finally:
+        store.close()
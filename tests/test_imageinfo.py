@@ -0,0 +1,113 @@
+import struct
+import zlib
+
+from app.utils.imageinfo import (TAG_BITS, TAG_DATETIME, TAG_DATETIME_ORIGINAL, TAG_EXIF_IFD, TAG_HEIGHT,
+                                 TAG_ORIENTATION, TAG_SAMPLES, TAG_WIDTH, oriented_size, probe, probe_many)
+
+
+SHORT, LONG, ASCII = 3, 4, 2
+TAKEN = "2024:05:06 07:08:09"
+
+
+def _tiff(order, entries, sub_entries=()):
+    # A TIFF header and IFD, with values over 4 bytes stored after it. sub_entries go to an EXIF IFD.
+    prefix = b"II*\x00" if order == "<" else b"MM\x00*"
+    codes = {SHORT: "H", LONG: "I", ASCII: "s"}
+
+    def ifd(entries, offset):
+        entries = sorted(entries)
+        values_at = offset + 2 + len(entries) * 12 + 4
+        table, values = struct.pack(order + "H", len(entries)), b""
+        for tag, field_type, value in entries:
+            if field_type == ASCII:
+                raw, count = value.encode('ascii') + b"\x00", len(value) + 1
+            else:
+                value = value if isinstance(value, tuple) else (value,)
+                raw, count = struct.pack(f"{order}{len(value)}{codes[field_type]}", *value), len(value)
+            if len(raw) > 4:
+                field = struct.pack(order + "I", values_at + len(values))
+                values += raw + b"\x00" * (len(raw) & 1)
+            else:
+                field = raw.ljust(4, b"\x00")
+            table += struct.pack(order + "HHI", tag, field_type, count) + field
+        return table + b"\x00\x00\x00\x00" + values
+
+    entries = list(entries)
+    if sub_entries:
+        # The EXIF IFD pointer is fixed up once the size of the first IFD is known.
+        entries.append((TAG_EXIF_IFD, LONG, 0))
+        first = ifd(entries, 8)
+        entries[-1] = (TAG_EXIF_IFD, LONG, 8 + len(first))
+        first = ifd(entries, 8)
+        return prefix + struct.pack(order + "I", 8) + first + ifd(sub_entries, 8 + len(first))
+    return prefix + struct.pack(order + "I", 8) + ifd(entries, 8)
+
+
+def _exif(orientation, order="<"):
+    return _tiff(order, [(TAG_ORIENTATION, SHORT, orientation)], [(TAG_DATETIME_ORIGINAL, ASCII, TAKEN)])
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def _riff(chunks):
+    body = b"WEBP" + b"".join(struct.pack("<4sI", kind, len(data)) + data + b"\x00" * (len(data) & 1)
+                             for kind, data in chunks)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_png(tmp_path):
+    header = struct.pack(">IIBBBBB", 640, 480, 8, 6, 0, 0, 0)
+    data = (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header) + _png_chunk(b"eXIf", _exif(6)) +
+            _png_chunk(b"IDAT", zlib.compress(b"")) + _png_chunk(b"IEND", b""))
+    assert probe(_write(tmp_path, "a.png", data)) == ('png', 640, 480, 32, 6, "2024-05-06 07:08:09")
+
+
+def test_jpeg_reads_sof_after_exif(tmp_path):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    exif = b"Exif\x00\x00" + _exif(8, order=">")
+    app1 = b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif
+    dqt = b"\xff\xdb" + struct.pack(">H", 67) + b"\x00" * 65
+    sof = b"\xff\xc0" + struct.pack(">HBHHB", 17, 8, 1080, 1920, 3) + b"\x00" * 9
+    data = b"\xff\xd8" + app0 + app1 + dqt + sof + b"\xff\xda\x00\x02" + b"\xff\xd9"
+    assert probe(_write(tmp_path, "a.jpg", data)) == ('jpeg', 1920, 1080, 24, 8, "2024-05-06 07:08:09")
+
+
+def test_webp_variants(tmp_path):
+    lossy = b"\x00\x00\x00\x9d\x01\x2a" + struct.pack("<HH", 300, 200) + b"\x00" * 8
+    assert probe(_write(tmp_path, "lossy.webp", _riff([(b"VP8 ", lossy)]))) == ('webp', 300, 200, 24, 1, None)
+
+    bits = (300 - 1) | (200 - 1) << 14 | 1 << 28
+    lossless = b"\x2f" + bits.to_bytes(4, 'little') + b"\x00" * 8
+    assert probe(_write(tmp_path, "lossless.webp", _riff([(b"VP8L", lossless)]))) == ('webp', 300, 200, 32, 1, None)
+
+    # Extended files keep their EXIF chunk after the image data.
+    extended = bytes([0x08 | 0x10, 0, 0, 0]) + (4000 - 1).to_bytes(3, 'little') + (3000 - 1).to_bytes(3, 'little')
+    data = _riff([(b"VP8X", extended), (b"VP8 ", lossy), (b"EXIF", _exif(5))])
+    assert probe(_write(tmp_path, "extended.webp", data)) == ('webp', 4000, 3000, 32, 5, "2024-05-06 07:08:09")
+
+
+def test_tiff_both_byte_orders(tmp_path):
+    for order, name in (("<", "little.tif"), (">", "big.tif")):
+        data = _tiff(order, [(TAG_WIDTH, LONG, 70000), (TAG_HEIGHT, SHORT, 500), (TAG_BITS, SHORT, (8, 8, 8)),
+                             (TAG_SAMPLES, SHORT, 3), (TAG_ORIENTATION, SHORT, 7), (TAG_DATETIME, ASCII, TAKEN)])
+        assert probe(_write(tmp_path, name, data)) == ('tiff', 70000, 500, 24, 7, "2024-05-06 07:08:09")
+
+
+def test_unknown_and_truncated(tmp_path):
+    truncated = b"\xff\xd8\xff\xe1\x00\x10Exif"
+    paths = [_write(tmp_path, "a.txt", b"not an image"), _write(tmp_path, "b.jpg", truncated),
+             str(tmp_path / "missing.png")]
+    assert list(probe_many(paths)) == [None, None, None]
+
+
+def test_oriented_size():
+    assert oriented_size(640, 480, 1) == (640, 480)
+    assert oriented_size(640, 480, 6) == (480, 640)
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from app.utils.phash import CHUNK_BITS, HASH_BITS, INDEX_CHUNKS, duplicates_to_drop, find_duplicates
+
+
+def _flip(value, rng, distance):
+    # Flips distance bits spread as evenly as possible over the chunks, the hardest case for
+    # the index: no chunk then differs by fewer than distance // INDEX_CHUNKS bits.
+    for bit in range(distance):
+        chunk = bit % INDEX_CHUNKS
+        value ^= 1 << (chunk * CHUNK_BITS + (bit // INDEX_CHUNKS * 5 + rng.randrange(5)) % CHUNK_BITS)
+    return value
+
+
+def _brute_force(hashes, distance):
+    parent = list(range(len(hashes)))
+
+    def find(node):
+        while parent[node] != node:
+            node = parent[node]
+        return node
+
+    for a in range(len(hashes)):
+        for b in range(a + 1, len(hashes)):
+            if (hashes[a] ^ hashes[b]).bit_count() <= distance:
+                parent[find(b)] = find(a)
+    groups = {}
+    for node in range(len(hashes)):
+        groups.setdefault(find(node), []).append(node)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+
+@pytest.mark.parametrize('distance', [0, 3, 4, 7, 10])
+def test_recall_matches_brute_force(distance):
+    rng = random.Random(distance)
+    hashes = []
+    for _ in range(150):
+        base = rng.getrandbits(HASH_BITS)
+        hashes.append(base)
+        for _ in range(rng.randrange(3)):
+            hashes.append(_flip(base, rng, rng.randrange(distance + 1)))
+        if rng.random() < 0.2:
+            hashes.append(_flip(base, rng, distance + 1 + rng.randrange(3)))
+    rng.shuffle(hashes)
+
+    assert sorted(find_duplicates(hashes, distance)) == _brute_force(hashes, distance)
+
+
+def test_spread_differences_are_found():
+    base = 0x0123456789ABCDEF
+    near = _flip(base, random.Random(1), 7)
+    assert [(near ^ base) >> shift & 0xFFFF for shift in range(0, 64, 16)].count(0) == 0
+    assert find_duplicates([base, near], 7) == [[0, 1]]
+    assert find_duplicates([base, near], 6) == []
+
+
+def test_exact_duplicates_collapse():
+    assert find_duplicates([5, 1 << 40, 5, 5, 1 << 40, 9 << 20], 0) == [[0, 2, 3], [1, 4]]
+
+
+def test_duplicates_to_drop_keeps_annotated():
+    groups = [[('a', '1.jpg'), ('a', '2.jpg'), ('b', '1.jpg')], [('c', '1.jpg'), ('c', '2.jpg')]]
+    drop = duplicates_to_drop(groups, {'a/2.jpg', 'b/1.jpg'})
+    assert drop == {('a', '1.jpg'), ('c', '2.jpg')}
@@ -0,0 +1,87 @@
+from app.utils.annotations import AnnotationStore
+from app.utils.image_index import ImageIndex
+from app.utils.splits import SPLITS, UNANNOTATED, _cut, _fill, assign_splits
+
+
+def _add_images(subproject, folder, count, start=0):
+    path = subproject / 'images' / folder
+    path.mkdir(parents=True, exist_ok=True)
+    for number in range(start, start + count):
+        (path / f"{number:04d}.jpg").write_bytes(b"")
+
+
+def _splits(subproject):
+    index = ImageIndex(str(subproject))
+    try:
+        return {f"{folder}/{name}": split for folder, name, split in index.image_names(with_split=True)}
+    finally:
+        index.close()
+
+
+def test_cut_is_seeded():
+    keys = [f"f/{number}.jpg" for number in range(200)]
+    strata = [UNANNOTATED] * len(keys)
+    first, counts = _cut(keys, None, strata, (0.8, 0.1, 0.1), seed=1)
+    assert _cut(keys, None, strata, (0.8, 0.1, 0.1), seed=1)[0] == first
+    assert _cut(keys, None, strata, (0.8, 0.1, 0.1), seed=2)[0] != first
+    assert counts == {UNANNOTATED: [160, 20, 20]}
+
+
+def test_cut_spreads_every_stratum():
+    keys = [f"f/{number}.jpg" for number in range(300)]
+    strata = [number % 3 for number in range(len(keys))]
+    assignment, counts = _cut(keys, None, strata, (0.8, 0.1, 0.1), seed=0)
+    for stratum in range(3):
+        assert counts[stratum] == [80, 10, 10]
+        assert sorted(split for split, unit in zip(assignment, strata) if unit == stratum) == \
+            [0] * 80 + [1] * 10 + [2] * 10
+
+
+def test_fill_balances_towards_ratios():
+    counts = {UNANNOTATED: [80, 0, 10]}
+    keys = [f"f/{number}.jpg" for number in range(20)]
+    assignment = _fill(keys, None, [UNANNOTATED] * len(keys), (0.8, 0.1, 0.1), 0, counts)
+    assert counts == {UNANNOTATED: [88, 11, 11]}
+    assert [assignment.count(split) for split in range(len(SPLITS))] == [8, 11, 1]
+
+
+def test_assign_splits_is_stable_under_additions(tmp_path):
+    for folder in ('a', 'b'):
+        _add_images(tmp_path, folder, 50)
+
+    summary = assign_splits(str(tmp_path), seed=3, group_by_folder=False)
+    assert summary['assigned'] == 100
+    assert sum(summary['counts'].values()) == 100
+    before = _splits(tmp_path)
+    assert None not in before.values()
+
+    # The same seed from scratch gives the same splits.
+    assign_splits(str(tmp_path), seed=3, group_by_folder=False, reset=True)
+    assert _splits(tmp_path) == before
+
+    _add_images(tmp_path, 'a', 30, start=50)
+    _add_images(tmp_path, 'c', 20)
+    summary = assign_splits(str(tmp_path), seed=3, group_by_folder=False)
+    assert summary['assigned'] == 50
+    after = _splits(tmp_path)
+    assert {key: after[key] for key in before} == before
+    assert None not in after.values()
+    totals = [list(after.values()).count(split) for split in range(len(SPLITS))]
+    assert abs(totals[0] - 120) <= 2 and abs(totals[1] - 15) <= 2 and abs(totals[2] - 15) <= 2
+
+
+def test_assign_splits_keeps_folders_together(tmp_path):
+    for number in range(10):
+        _add_images(tmp_path, f"folder{number}", 5)
+    annotations = AnnotationStore(str(tmp_path))
+    annotations.set_boxes('folder0/0000.jpg', [(0, 0.5, 0.5, 0.1, 0.1, 0)])
+    annotations.close()
+
+    assign_splits(str(tmp_path), seed=0)
+    _add_images(tmp_path, 'folder0', 5, start=5)
+    _add_images(tmp_path, 'folder10', 5)
+    assign_splits(str(tmp_path), seed=0)
+
+    splits = _splits(tmp_path)
+    for number in range(11):
+        assert len({split for key, split in splits.items() if key.startswith(f"folder{number}/")}) == 1